@@ -1,102 +1,1862 @@
+import base64
+import click
+import csv
+import gzip
+import hashlib
+import itertools
+import json
+import math
+import mimetypes
+import re
 import secrets
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, send_from_directory, \
-    abort
-from werkzeug.security import generate_password_hash, check_password_hash
+import select
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from flask import Flask, Request, render_template, request, redirect, url_for, session, flash, jsonify, send_file, \
+    abort, g, has_app_context, has_request_context, before_render_template, template_rendered
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
 import psycopg2
-from psycopg2.extras import DictCursor
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN, POLL_OK, POLL_READ, POLL_WRITE, \
+    set_wait_callback
+from psycopg2.extras import DictCursor, Json, execute_values
 import os
+from datetime import datetime
 from dotenv import load_dotenv
-from urllib.parse import urlparse
-from PIL import Image
+from PIL import Image, ImageOps, features
 import io
+from urllib.parse import unquote
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from gevent import monkey as gevent_monkey
+    from gevent.socket import wait_read, wait_write
+except ImportError:
+    gevent_monkey = None
 
 # Load environment variables from .env file
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'jouw_supergeheime_sleutel_hier')
-app.config['UPLOAD_FOLDER'] = '/var/data/uploads'
+app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', '/var/data/uploads')
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 # Get the database URL from environment variables
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
 
-def get_db_connection():
-    conn = None
+# Groene threads: met `gunicorn -k gevent --worker-connections 1000 app:app`
+# bedient elke worker honderden verbindingen tegelijk, omdat wachten op
+# Postgres, bestanden en trage klanten de worker niet meer blokkeert. gunicorn
+# patcht de standaardbibliotheek (threading, socket, select, time.sleep) vóór
+# app.py geladen wordt; psycopg2 moet daarnaast via een wait callback op de
+# gevent-hub wachten. De pool hieronder blijft DB_POOL_MAX verbindingen per
+# worker en requests wachten coöperatief op een vrije verbinding. Niet
+# combineren met --preload: dan zijn locks en pool in de master al ongepatcht
+# aangemaakt.
+GROENE_THREADS = bool(gevent_monkey) and gevent_monkey.is_module_patched('socket')
+
+
+def _wacht_op_db_gevent(conn, timeout=None):
+    while True:
+        status = conn.poll()
+        if status == POLL_OK:
+            break
+        elif status == POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif status == POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f"Onverwachte poll-status: {status}")
+
+
+if GROENE_THREADS:
+    set_wait_callback(_wacht_op_db_gevent)
+
+# Connection pool per worker-proces. De pool wordt pas bij de eerste checkout
+# aangemaakt en na een fork (gunicorn) opnieuw opgebouwd. Let op: een verbinding
+# boven DB_POOL_MIN wordt bij het teruggeven gesloten (zo werkt psycopg2.pool),
+# zodat elk request boven dat aantal weer een nieuwe verbinding opent. Daarom
+# standaard DB_POOL_MIN = DB_POOL_MAX: alle verbindingen blijven open.
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', 10))
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', DB_POOL_MAX))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+DB_POOL_PING_NA = float(os.environ.get('DB_POOL_PING_NA', 30))
+
+# Optionele read replicas (spatie- of kommagescheiden URLs) voor de publieke
+# catalogusroutes; zie get_db_connection(alleen_lezen=True). Een replica die meer
+# dan DB_REPLICA_MAX_LAG seconden achterloopt of niet bereikbaar is, wordt een
+# tijd overgeslagen; zijn er geen bruikbare replicas, dan leest de primary.
+DATABASE_REPLICA_URLS = re.split(r'[\s,]+', os.environ.get('DATABASE_REPLICA_URLS', '').strip())
+DATABASE_REPLICA_URLS = [url for url in DATABASE_REPLICA_URLS if url]
+DB_REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 5))
+DB_REPLICA_LAG_CHECK = float(os.environ.get('DB_REPLICA_LAG_CHECK', 2))  # seconden tussen lag-metingen
+DB_REPLICA_TIMEOUT = float(os.environ.get('DB_REPLICA_TIMEOUT', 1))  # wachten op een vrije replicaverbinding
+DB_REPLICA_PAUZE = float(os.environ.get('DB_REPLICA_PAUZE', 30))  # overslaan na een fout of te veel lag
+# Zonder bericht van de primary gedurende zoveel seconden geldt de replicatie als
+# stilgevallen; ruim boven de keepalive van de primary (wal_sender_timeout / 2)
+DB_REPLICA_STIL = float(os.environ.get('DB_REPLICA_STIL', 45))
+
+_db_pool_lock = threading.Lock()
+
+
+class DbPool:
+    def __init__(self, naam, dsn, timeout):
+        self.naam = naam
+        self.dsn = dsn
+        self.timeout = timeout
+        self.pool = None
+        self.pid = None
+        self.slots = None
+        self.laatst_gebruikt = {}
+        self.stats = {'in_gebruik': 0, 'checkouts': 0, 'wachtend': 0, 'wachtmomenten': 0,
+                      'wachttijd_totaal': 0.0, 'timeouts': 0, 'verworpen': 0}
+        # Alleen voor replicas: gemeten lag en tot wanneer de replica overgeslagen wordt
+        self.lag = None
+        self.lag_gemeten_op = 0
+        self.gepauzeerd_tot = 0
+
+    def reset(self):
+        # Na een fork zijn de sockets van de ouder niet bruikbaar; niet sluiten (dat zou
+        # de verbinding van de ouder beëindigen), alleen de referenties loslaten.
+        self.pool = None
+        self.pid = None
+        self.slots = None
+        self.laatst_gebruikt.clear()
+        self.stats['in_gebruik'] = 0
+        self.lag = None
+        self.lag_gemeten_op = 0
+        self.gepauzeerd_tot = 0
+
+    def get(self):
+        if self.pool is not None and self.pid == os.getpid():
+            return self.pool
+
+        with _db_pool_lock:
+            if self.pid != os.getpid():
+                self.reset()
+            if self.pool is None:
+                self.pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, **_db_verbindings_parameters(self.dsn))
+                self.slots = threading.BoundedSemaphore(DB_POOL_MAX)
+                self.pid = os.getpid()
+        return self.pool
+
+    def statistieken(self):
+        with _db_pool_lock:
+            stats = dict(self.stats)
+        stats['min'] = DB_POOL_MIN
+        stats['max'] = DB_POOL_MAX
+        stats['gemiddelde_wachttijd'] = (stats['wachttijd_totaal'] / stats['checkouts']) if stats['checkouts'] else 0.0
+        return stats
+
+
+_db_primary = DbPool('primary', DATABASE_URL, DB_POOL_TIMEOUT)
+_db_replicas = [DbPool(f'replica{i}', url, DB_REPLICA_TIMEOUT) for i, url in enumerate(DATABASE_REPLICA_URLS, 1)]
+_db_replica_volgende = itertools.count()
+_db_uitgeleend = {}  # id(conn) -> DbPool
+
+
+def _db_verbindings_parameters(dsn=None):
+    # libpq parset de URL zelf (ook query-parameters zoals sslmode of host=/socket)
+    return dict(
+        dsn=dsn or DATABASE_URL,
+        client_encoding='UTF8',
+        connection_factory=GemetenConnection,
+        cursor_factory=GemetenCursor
+    )
+
+
+def _reset_db_pool():
+    for db_pool in [_db_primary] + _db_replicas:
+        db_pool.reset()
+    _db_uitgeleend.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_db_pool)
+
+
+def _verbinding_gezond(db_pool, conn):
+    if conn.closed or conn.get_transaction_status() == TRANSACTION_STATUS_UNKNOWN:
+        return False
+    # Alleen pingen als de verbinding een tijd ongebruikt in de pool lag
+    if time.monotonic() - db_pool.laatst_gebruikt.get(id(conn), 0) > DB_POOL_PING_NA:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+    return True
+
+
+def checkout_db_connection(db_pool=None):
+    db_pool = db_pool or _db_primary
+    pool = db_pool.get()
+    slots = db_pool.slots
+
+    start = time.monotonic()
+    if not slots.acquire(blocking=False):
+        with _db_pool_lock:
+            db_pool.stats['wachtend'] += 1
+            db_pool.stats['wachtmomenten'] += 1
+        verkregen = slots.acquire(timeout=db_pool.timeout)
+        with _db_pool_lock:
+            db_pool.stats['wachtend'] -= 1
+            db_pool.stats['wachttijd_totaal'] += time.monotonic() - start
+            if not verkregen:
+                db_pool.stats['timeouts'] += 1
+        if not verkregen:
+            raise PoolError("Geen vrije databaseverbinding binnen %s seconden" % db_pool.timeout)
+
     try:
-        result = urlparse(DATABASE_URL)
-        conn = psycopg2.connect(
-            host=result.hostname,
-            port=result.port,
-            database=result.path[1:],
-            user=result.username,
-            password=result.password,
-            client_encoding='UTF8',
-            cursor_factory=DictCursor
-        )
+        # Na een herstart van de database kunnen alle verbindingen in de pool dood
+        # zijn; als ze allemaal verworpen zijn, maakt getconn een nieuwe die ook
+        # gecontroleerd wordt
+        for _ in range(DB_POOL_MAX + 1):
+            conn = pool.getconn()
+            if _verbinding_gezond(db_pool, conn):
+                break
+            db_pool.laatst_gebruikt.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+            with _db_pool_lock:
+                db_pool.stats['verworpen'] += 1
+        else:
+            raise psycopg2.OperationalError("Geen gezonde databaseverbinding beschikbaar")
+    except Exception:
+        slots.release()
+        raise
+
+    with _db_pool_lock:
+        _db_uitgeleend[id(conn)] = db_pool
+        db_pool.stats['in_gebruik'] += 1
+        db_pool.stats['checkouts'] += 1
+    return conn
+
+
+def release_db_connection(conn):
+    if conn is None:
+        return
+    # Verbinding uit een ander (ouder-)proces hoort niet bij deze pool
+    with _db_pool_lock:
+        db_pool = _db_uitgeleend.pop(id(conn), None)
+        if db_pool is None:
+            return
+
+    kapot = conn.closed != 0
+    if not kapot and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            kapot = True
+
+    try:
+        db_pool.pool.putconn(conn, close=kapot)
+        # putconn sluit ook verbindingen boven DB_POOL_MIN; een gesloten verbinding
+        # mag geen tijdstempel achterlaten (id() kan hergebruikt worden)
+        if conn.closed:
+            db_pool.laatst_gebruikt.pop(id(conn), None)
+        else:
+            db_pool.laatst_gebruikt[id(conn)] = time.monotonic()
+    finally:
+        db_pool.slots.release()
+        with _db_pool_lock:
+            db_pool.stats['in_gebruik'] -= 1
+
+
+def _replica_lag(conn):
+    # Seconden achterstand; onbekend telt als te veel. Heeft de replica alles
+    # afgespeeld wat hij ontving, dan is hij bij, maar alleen als de WAL receiver
+    # nog streamt en recent iets van de primary hoorde (die stuurt ook bij een
+    # rustige primary keepalives): een gestopte replicatie laat receive = replay
+    # staan terwijl de replica steeds verder achterraakt. Zonder receiver (of
+    # zonder pg_read_all_stats, dan is status NULL) telt de leeftijd van de
+    # laatst afgespeelde transactie.
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT CASE
+                WHEN NOT pg_is_in_recovery() THEN 0
+                WHEN w.status IS DISTINCT FROM 'streaming' THEN replay_leeftijd
+                ELSE GREATEST(
+                    CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 ELSE replay_leeftijd END,
+                    CASE WHEN stilte > %s THEN stilte ELSE 0 END
+                )
+            END
+            FROM (
+                SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())::float8,
+                                'Infinity'::float8) AS replay_leeftijd
+            ) r
+            LEFT JOIN (
+                SELECT status, COALESCE(EXTRACT(EPOCH FROM now() - last_msg_receipt_time)::float8,
+                                        'Infinity'::float8) AS stilte
+                FROM pg_stat_wal_receiver
+            ) w ON TRUE
+        """, (DB_REPLICA_STIL,))
+        lag = cursor.fetchone()[0]
+    conn.rollback()
+    return lag
+
+
+def checkout_replica_connection():
+    # Round-robin over de bruikbare replicas; None als er geen is
+    if not _db_replicas:
+        return None
+    begin = next(_db_replica_volgende)
+    for i in range(len(_db_replicas)):
+        db_pool = _db_replicas[(begin + i) % len(_db_replicas)]
+        if db_pool.gepauzeerd_tot > time.monotonic():
+            continue
+        try:
+            conn = checkout_db_connection(db_pool)
+        except PoolError:
+            # Alleen druk (geen vrije verbinding binnen DB_REPLICA_TIMEOUT): de
+            # volgende replica proberen, of voor deze request de primary
+            continue
+        except Exception as e:
+            print(f"Replica {db_pool.naam} niet bruikbaar: {e}")
+            db_pool.gepauzeerd_tot = time.monotonic() + DB_REPLICA_PAUZE
+            continue
+
+        if time.monotonic() - db_pool.lag_gemeten_op > DB_REPLICA_LAG_CHECK:
+            try:
+                db_pool.lag = _replica_lag(conn)
+            except psycopg2.Error as e:
+                print(f"Lag van replica {db_pool.naam} niet te bepalen: {e}")
+                db_pool.lag = float('inf')
+            db_pool.lag_gemeten_op = time.monotonic()
+            if db_pool.lag > DB_REPLICA_MAX_LAG:
+                print(f"Replica {db_pool.naam} loopt {db_pool.lag:.1f} s achter; tijdelijk overgeslagen")
+                db_pool.gepauzeerd_tot = time.monotonic() + DB_REPLICA_PAUZE
+                release_db_connection(conn)
+                continue
         return conn
+    return None
+
+
+def replica_toegestaan():
+    # Na een wijziging in de catalogus leest de primary, tot elke bruikbare replica
+    # die wijziging zeker heeft: voor de beheerder die hem deed (via de sessie, ook
+    # op een andere worker) en voor iedereen (zodat de caches niets ouds opnemen)
+    nu = time.time()
+    if session.get('lees_primary_tot', 0) > nu:
+        return False
+    return nu - _catalogus_gewijzigd_op > DB_REPLICA_MAX_LAG + DB_REPLICA_LAG_CHECK
+
+
+def get_db_connection(alleen_lezen=False):
+    # Eén verbinding per request; teardown_appcontext geeft hem terug aan de pool.
+    # alleen_lezen: mag een replica zijn (alleen voor routes die niets schrijven);
+    # heeft de request al een primary-verbinding, dan wordt die gebruikt.
+    if has_app_context() and 'db_conn' in g:
+        if not alleen_lezen:
+            g.db_alleen_lezen = False
+        return g.db_conn
+
+    if alleen_lezen and has_request_context() and _db_replicas:
+        if 'db_replica_conn' in g:
+            return g.db_replica_conn
+        if replica_toegestaan():
+            conn = checkout_replica_connection()
+            if conn:
+                g.db_replica_conn = conn
+                return conn
+
+    try:
+        conn = checkout_db_connection()
     except Exception as e:
         print(f"Fout bij verbinden met database: {e}")
         return None
 
+    if has_app_context():
+        g.db_conn = conn
+        g.db_alleen_lezen = alleen_lezen
+    return conn
 
-def save_image(image_file, target_size=(800, 800), quality=85):
-    if not image_file:
-        return None
 
-    filename = secrets.token_hex(8) + ".jpg"
-    upload_dir = '/var/data/uploads'
-    os.makedirs(upload_dir, exist_ok=True)
-    filepath = os.path.join(upload_dir, filename)
+@contextmanager
+def db_verbinding():
+    # Voor gebruik buiten een request (CLI, achtergrondtaken): checkout + teruggeven
+    if has_app_context():
+        yield get_db_connection()
+        return
 
+    conn = checkout_db_connection()
+    try:
+        yield conn
+    finally:
+        release_db_connection(conn)
+
+
+@app.teardown_appcontext
+def sluit_db_verbinding(exception=None):
+    release_db_connection(g.pop('db_conn', None))
+    release_db_connection(g.pop('db_replica_conn', None))
+
+
+def geef_leesverbindingen_terug():
+    # Vóór het renderen: een request die alleen gelezen heeft, heeft de database
+    # niet meer nodig. Met groene threads renderen tientallen requests per worker
+    # tegelijk en zou de pool anders leeg zijn terwijl er niemand een query doet.
+    release_db_connection(g.pop('db_replica_conn', None))
+    if g.get('db_alleen_lezen'):
+        release_db_connection(g.pop('db_conn', None))
+
+
+def db_pool_stats():
+    return _db_primary.statistieken()
+
+
+def db_replica_stats():
+    replicas = []
+    for db_pool in _db_replicas:
+        stats = db_pool.statistieken()
+        stats['naam'] = db_pool.naam
+        stats['lag'] = db_pool.lag
+        stats['overgeslagen'] = db_pool.gepauzeerd_tot > time.monotonic()
+        replicas.append(stats)
+    return replicas
+
+
+# Instrumentatie: per request de tijd in de database (en het aantal queries), in
+# templates en in beeldverwerking, als Server-Timing header en als Prometheus-
+# metrics op /metrics. Let op: de metrics zijn per worker-proces, net als
+# /status/db-pool en /status/cache. Queries boven TRAGE_QUERY_MS worden gelogd.
+# Die drie endpoints zijn alleen voor het ingelogde beheer, of voor monitoring met
+# de header "Authorization: Bearer <MONITORING_TOKEN>" (leeg = geen token).
+TRAGE_QUERY_MS = float(os.environ.get('TRAGE_QUERY_MS', 200))
+MONITORING_TOKEN = os.environ.get('MONITORING_TOKEN', '')
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '1') == '1'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_metrics_lock = threading.Lock()
+_metrics = {'requests': {}, 'latency': {}, 'queries': 0, 'query_seconden': 0.0, 'trage_queries': 0,
+            'render_seconden': 0.0, 'afbeelding_seconden': 0.0}
+
+
+def normaliseer_sql(query):
+    # Literals en parameterlijsten eruit, zodat gelijke queries gelijk gelogd worden
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    query = re.sub(r"'(?:[^']|'')*'", '?', query)
+    query = re.sub(r'%s|\b\d+(?:\.\d+)?\b', '?', query)
+    query = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*', '(...)', query)
+    return ' '.join(query.split())
+
+
+def registreer_meting(soort, duur):
+    # soort: 'db', 'render' of 'afbeeldingen'
+    if has_request_context() and 'metingen' in g:
+        g.metingen[soort] += duur
+        if soort == 'db':
+            g.metingen['queries'] += 1
+    sleutel = {'db': 'query_seconden', 'render': 'render_seconden', 'afbeeldingen': 'afbeelding_seconden'}[soort]
+    with _metrics_lock:
+        _metrics[sleutel] += duur
+        if soort == 'db':
+            _metrics['queries'] += 1
+
+
+def registreer_query(query, duur):
+    registreer_meting('db', duur)
+    if duur * 1000 >= TRAGE_QUERY_MS:
+        with _metrics_lock:
+            _metrics['trage_queries'] += 1
+        route = request.endpoint if has_request_context() else 'cli'
+        print(f"Trage query ({duur * 1000:.0f} ms, {route}): {normaliseer_sql(query)}")
+
+
+@contextmanager
+def meet(soort):
+    start = time.perf_counter()
     try:
-        img = Image.open(image_file.stream)
+        yield
+    finally:
+        registreer_meting(soort, time.perf_counter() - start)
 
-        # Bestaande EXIF rotatie correctie
-        if hasattr(img, '_getexif'):
-            exif = img._getexif()
-            if exif:
-                orientation = exif.get(0x0112)
-                if orientation == 3:
-                    img = img.rotate(180, expand=True)
-                elif orientation == 6:
-                    img = img.rotate(270, expand=True)
-                elif orientation == 7:
-                    img = img.rotate(90, expand=True)
 
-        # Converteer naar RGB indien nodig
-        if img.mode in ('RGBA', 'P'):
-            img = img.convert('RGB')
+class GemetenCursor(DictCursor):
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            registreer_query(query, time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            registreer_query(query, time.perf_counter() - start)
+
+
+class GemetenConnection(psycopg2.extensions.connection):
+    # Ook conn.cursor(cursor_factory=DictCursor) levert een gemeten cursor op
+    def cursor(self, *args, **kwargs):
+        if kwargs.get('cursor_factory') in (None, DictCursor):
+            kwargs['cursor_factory'] = GemetenCursor
+        return super().cursor(*args, **kwargs)
+
+
+@app.before_request
+def start_meting():
+    g.metingen = {'start': time.perf_counter(), 'db': 0.0, 'queries': 0, 'render': 0.0, 'afbeeldingen': 0.0}
+
+
+@before_render_template.connect_via(app)
+def _start_render(sender, template, context, **extra):
+    geef_leesverbindingen_terug()
+    if 'metingen' in g:
+        g.metingen['render_start'] = time.perf_counter()
+
+
+@template_rendered.connect_via(app)
+def _einde_render(sender, template, context, **extra):
+    if 'metingen' in g and 'render_start' in g.metingen:
+        registreer_meting('render', time.perf_counter() - g.metingen.pop('render_start'))
+
+
+@app.after_request
+def rond_meting_af(response):
+    metingen = g.get('metingen')
+    if metingen is None:
+        return response
+    duur = time.perf_counter() - metingen['start']
+
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={metingen["db"] * 1000:.1f};desc="{metingen["queries"]} queries"',
+            f'render;dur={metingen["render"] * 1000:.1f}',
+            f'img;dur={metingen["afbeeldingen"] * 1000:.1f}',
+            f'total;dur={duur * 1000:.1f}',
+        ])
+
+    # Route-patroon als label (niet het pad), anders groeit het aantal series onbeperkt
+    route = request.url_rule.rule if request.url_rule else 'onbekend'
+    with _metrics_lock:
+        sleutel = (route, request.method, str(response.status_code))
+        _metrics['requests'][sleutel] = _metrics['requests'].get(sleutel, 0) + 1
+        histogram = _metrics['latency'].setdefault((route, request.method),
+                                                   {'buckets': [0] * len(LATENCY_BUCKETS), 'som': 0.0, 'aantal': 0})
+        for i, grens in enumerate(LATENCY_BUCKETS):
+            if duur <= grens:
+                histogram['buckets'][i] += 1
+        histogram['som'] += duur
+        histogram['aantal'] += 1
+    return response
+
+
+def _prometheus_labels(**labels):
+    return '{' + ','.join(f'{naam}="{str(waarde).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                          for naam, waarde in labels.items()) + '}'
+
+
+def monitoring_toegestaan():
+    if session.get('ingelogd'):
+        return True
+    autorisatie = request.authorization
+    return bool(MONITORING_TOKEN) and autorisatie is not None and autorisatie.type == 'bearer' \
+        and secrets.compare_digest((autorisatie.token or '').encode(), MONITORING_TOKEN.encode())
+
+
+@app.route('/metrics')
+def metrics():
+    if not monitoring_toegestaan():
+        abort(403)
+
+    with _metrics_lock:
+        requests_totaal = dict(_metrics['requests'])
+        latency = {sleutel: dict(h, buckets=list(h['buckets'])) for sleutel, h in _metrics['latency'].items()}
+        totalen = {k: v for k, v in _metrics.items() if k not in ('requests', 'latency')}
+
+    regels = ['# HELP http_request_duration_seconds Duur van requests per route.',
+              '# TYPE http_request_duration_seconds histogram']
+    for (route, methode), h in sorted(latency.items()):
+        for grens, aantal in zip(LATENCY_BUCKETS, h['buckets']):
+            regels.append(f"http_request_duration_seconds_bucket{_prometheus_labels(route=route, method=methode, le=grens)} {aantal}")
+        regels.append(f"http_request_duration_seconds_bucket{_prometheus_labels(route=route, method=methode, le='+Inf')} {h['aantal']}")
+        regels.append(f"http_request_duration_seconds_sum{_prometheus_labels(route=route, method=methode)} {h['som']}")
+        regels.append(f"http_request_duration_seconds_count{_prometheus_labels(route=route, method=methode)} {h['aantal']}")
+
+    regels += ['# HELP http_requests_total Aantal requests per route en status.', '# TYPE http_requests_total counter']
+    for (route, methode, status), aantal in sorted(requests_totaal.items()):
+        regels.append(f"http_requests_total{_prometheus_labels(route=route, method=methode, status=status)} {aantal}")
+
+    pool = db_pool_stats()
+    tellers = [
+        ('db_queries_total', 'counter', 'Uitgevoerde queries.', totalen['queries']),
+        ('db_query_seconds_total', 'counter', 'Totale querytijd.', totalen['query_seconden']),
+        ('db_slow_queries_total', 'counter', f'Queries trager dan {TRAGE_QUERY_MS:g} ms.', totalen['trage_queries']),
+        ('template_render_seconds_total', 'counter', 'Totale rendertijd van templates.', totalen['render_seconden']),
+        ('image_processing_seconds_total', 'counter', 'Totale tijd in beeldverwerking.', totalen['afbeelding_seconden']),
+        ('db_pool_in_use', 'gauge', 'Uitgeleende databaseverbindingen.', pool['in_gebruik']),
+        ('db_pool_waiting', 'gauge', 'Requests die op een verbinding wachten.', pool['wachtend']),
+        ('db_pool_timeouts_total', 'counter', 'Checkouts die niet op tijd een verbinding kregen.', pool['timeouts']),
+        ('catalogus_cache_hits_total', 'counter', 'Treffers in de catalogus-cache.', catalogus_cache.hits),
+        ('catalogus_cache_misses_total', 'counter', 'Missers in de catalogus-cache.', catalogus_cache.misses),
+        ('pagina_cache_hits_total', 'counter', 'Treffers in de paginacache.', pagina_cache.hits),
+        ('pagina_cache_misses_total', 'counter', 'Missers in de paginacache.', pagina_cache.misses),
+    ]
+    for naam, soort, uitleg, waarde in tellers:
+        regels += [f'# HELP {naam} {uitleg}', f'# TYPE {naam} {soort}', f'{naam} {waarde}']
+
+    replicas = db_replica_stats()
+    if replicas:
+        regels += ['# HELP db_replica_lag_seconds Laatst gemeten achterstand per replica.',
+                   '# TYPE db_replica_lag_seconds gauge']
+        regels += [f"db_replica_lag_seconds{_prometheus_labels(replica=r['naam'])} {r['lag']}"
+                   for r in replicas if r['lag'] is not None]
+        regels += ['# HELP db_replica_checkouts_total Verbindingen uitgegeven per replica.',
+                   '# TYPE db_replica_checkouts_total counter']
+        regels += [f"db_replica_checkouts_total{_prometheus_labels(replica=r['naam'])} {r['checkouts']}"
+                   for r in replicas]
+
+    return app.response_class('\n'.join(regels) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+# Schema-migraties: genummerde SQL-bestanden in migraties/, toegepast met
+# "flask migreer" en bijgehouden in schema_version. Een bestand dat begint met
+# "-- migreer: zonder transactie" (nodig voor CREATE INDEX CONCURRENTLY) wordt per
+# statement uitgevoerd, gesplitst op een ';' aan het eind van een regel.
+MIGRATIES_MAP = os.path.join(app.root_path, 'migraties')
+MIGRATIE_PATROON = re.compile(r'^(\d+)_\w+\.sql$')
+MIGRATIE_ZONDER_TRANSACTIE = '-- migreer: zonder transactie'
+MIGRATIE_LOCK = 7245301  # pg_advisory_lock: niet twee deploys tegelijk laten migreren
+
+
+def lees_migraties():
+    migraties = []
+    for naam in sorted(os.listdir(MIGRATIES_MAP)):
+        match = MIGRATIE_PATROON.match(naam)
+        if not match:
+            continue
+        with open(os.path.join(MIGRATIES_MAP, naam), encoding='utf-8') as f:
+            sql = f.read()
+        migraties.append({'versie': int(match.group(1)), 'naam': naam, 'sql': sql,
+                          'checksum': hashlib.sha1(sql.encode()).hexdigest()})
+    return migraties
+
+
+def pas_migratie_toe(conn, migratie):
+    cursor = conn.cursor()
+    if migratie['sql'].startswith(MIGRATIE_ZONDER_TRANSACTIE):
+        # Elk statement los (autocommit); de bestanden zijn idempotent, dus na een
+        # fout kan de migratie gewoon opnieuw
+        conn.autocommit = True
+        for statement in re.split(r';\s*$', migratie['sql'], flags=re.MULTILINE):
+            if re.sub(r'--[^\n]*', '', statement).strip():
+                cursor.execute(statement)
+    else:
+        conn.autocommit = False
+        cursor.execute(migratie['sql'])
+
+    cursor.execute(
+        "INSERT INTO schema_version (versie, naam, checksum) VALUES (%s, %s, %s)",
+        (migratie['versie'], migratie['naam'], migratie['checksum'])
+    )
+    conn.commit()
+    conn.autocommit = True
+
+
+@app.cli.command('migreer')
+@click.option('--status', 'alleen_status', is_flag=True, help='Alleen tonen welke migraties zijn toegepast.')
+@click.option('--tot', 'tot_versie', type=int, help='Niet verder migreren dan deze versie.')
+def migreer_command(alleen_status, tot_versie):
+    """Pas openstaande schema-migraties uit migraties/ toe."""
+    conn = psycopg2.connect(DATABASE_URL)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATIE_LOCK,))
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                versie       integer PRIMARY KEY,
+                naam         text NOT NULL,
+                checksum     text NOT NULL,
+                toegepast_op timestamptz NOT NULL DEFAULT now()
+            )
+        """)
+        cursor.execute("SELECT versie, checksum FROM schema_version")
+        toegepast = dict(cursor.fetchall())
+
+        for migratie in lees_migraties():
+            versie = migratie['versie']
+            if versie in toegepast:
+                if toegepast[versie] != migratie['checksum']:
+                    click.echo(f"Let op: {migratie['naam']} is gewijzigd nadat hij is toegepast", err=True)
+                if alleen_status:
+                    click.echo(f"[x] {migratie['naam']}")
+                continue
+            if alleen_status:
+                click.echo(f"[ ] {migratie['naam']}")
+                continue
+            if tot_versie is not None and versie > tot_versie:
+                break
+
+            click.echo(f"Toepassen: {migratie['naam']}")
+            try:
+                pas_migratie_toe(conn, migratie)
+            except psycopg2.Error as e:
+                conn.rollback()
+                raise click.ClickException(f"{migratie['naam']} mislukt: {e}")
+    finally:
+        conn.autocommit = True
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATIE_LOCK,))
+        conn.close()
+
+
+# In-process cache voor catalogusdata (categorie-overzichten en productdetails).
+# Begrensd (LRU) en met TTL; wijzigingen worden via Postgres NOTIFY aan alle
+# workers doorgegeven. Let op: LISTEN werkt niet via pgbouncer in transaction
+# mode, zet daarom CACHE_NOTIFY_URL op een directe verbinding als dat nodig is.
+CACHE_MAX_ITEMS = int(os.environ.get('CACHE_MAX_ITEMS', 1000))
+CACHE_TTL = float(os.environ.get('CACHE_TTL', 300))
+CACHE_KANAAL = 'catalogus_gewijzigd'
+CACHE_NOTIFY_URL = os.environ.get('CACHE_NOTIFY_URL', DATABASE_URL)
+
+
+class LRUCache:
+    # generatie telt elke invalidatie; set() met de generatie van vóór het lezen
+    # uit de database slaat over als er intussen iets geïnvalideerd is, zodat een
+    # trage lezer de cache niet opnieuw vult met data van vóór een wijziging
+    def __init__(self, max_items, ttl):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidaties = 0
+        self.overgeslagen = 0
+        self.generatie = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sleutel):
+        with self._lock:
+            item = self._items.get(sleutel)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._items[sleutel]
+                self.misses += 1
+                return None
+            self._items.move_to_end(sleutel)
+            self.hits += 1
+            return item[1]
+
+    def set(self, sleutel, waarde, generatie=None):
+        with self._lock:
+            if generatie is not None and generatie != self.generatie:
+                self.overgeslagen += 1
+                return
+            self._items[sleutel] = (time.monotonic() + self.ttl, waarde)
+            self._items.move_to_end(sleutel)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def invalideer(self, voorwaarde):
+        with self._lock:
+            self.generatie += 1
+            for sleutel in [s for s in self._items if voorwaarde(s)]:
+                del self._items[sleutel]
+                self.invalidaties += 1
+
+    def clear(self):
+        with self._lock:
+            self.generatie += 1
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'items': len(self._items), 'max_items': self.max_items, 'ttl': self.ttl,
+                    'hits': self.hits, 'misses': self.misses, 'invalidaties': self.invalidaties,
+                    'overgeslagen': self.overgeslagen}
+
+
+catalogus_cache = LRUCache(CACHE_MAX_ITEMS, CACHE_TTL)
+_cache_listener_pid = None
+_catalogus_gewijzigd_op = 0  # time.time() van de laatste invalidatie, zie replica_toegestaan
+
+
+def invalideer_catalogus(product_id, categorie_ids):
+    # Sleutels: ('categorie', categorie_id, ...) en ('product', product_id)
+    global _catalogus_gewijzigd_op
+    _catalogus_gewijzigd_op = time.time()
+    categorie_ids = {int(c) for c in categorie_ids if c is not None}
+
+    def geraakt(s):
+        return (s[0] == 'product' and s[1] == product_id) or (s[0] == 'categorie' and s[1] in categorie_ids)
+
+    catalogus_cache.invalideer(geraakt)
+    pagina_cache.invalideer(geraakt)
+
+
+def meld_catalogus_wijziging(cursor, product_id, categorie_ids):
+    # NOTIFY is transactioneel: de andere workers krijgen het bericht pas na de commit
+    payload = f"{product_id}:{','.join(str(c) for c in categorie_ids if c is not None)}"
+    cursor.execute("SELECT pg_notify(%s, %s)", (CACHE_KANAAL, payload))
+    if has_request_context():
+        # Read-your-own-writes: deze sessie leest voorlopig van de primary
+        session['lees_primary_tot'] = time.time() + DB_REPLICA_MAX_LAG + DB_REPLICA_LAG_CHECK
+
+
+def _verwerk_catalogus_melding(payload):
+    product_id, _, categorieen = payload.partition(':')
+    invalideer_catalogus(int(product_id), [c for c in categorieen.split(',') if c])
+
+
+def _luister_naar_catalogus_wijzigingen():
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(CACHE_NOTIFY_URL)
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {CACHE_KANAAL}; LISTEN {CATEGORIEEN_KANAAL}")
+            # Tijdens een onderbreking kunnen meldingen gemist zijn
+            catalogus_cache.clear()
+            pagina_cache.clear()
+            markeer_categorieen_verouderd()
+
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    melding = conn.notifies.pop(0)
+                    if melding.channel == CATEGORIEEN_KANAAL:
+                        markeer_categorieen_verouderd()
+                    else:
+                        _verwerk_catalogus_melding(melding.payload)
+        except Exception as e:
+            print(f"Fout in cache-listener, opnieuw verbinden: {e}")
+            catalogus_cache.clear()
+            pagina_cache.clear()
+            time.sleep(5)
+        finally:
+            if conn:
+                conn.close()
+
+
+def _start_cache_listener():
+    # Eén listener-thread per worker-proces, ook na een fork
+    global _cache_listener_pid
+    if _cache_listener_pid == os.getpid() or not CACHE_NOTIFY_URL:
+        return
+    with _db_pool_lock:
+        if _cache_listener_pid == os.getpid():
+            return
+        _cache_listener_pid = os.getpid()
+    threading.Thread(target=_luister_naar_catalogus_wijzigingen, name='cache-listener', daemon=True).start()
 
-        # Behoud aspect ratio bij resizen
-        img.thumbnail(target_size, Image.LANCZOS)
 
-        # Opslaan met compressie
-        img.save(filepath, 'JPEG', quality=quality, optimize=True)
+def cache_get(sleutel):
+    # Onthoudt de generatie voor cache_set, vóórdat de view uit de database leest
+    _start_cache_listener()
+    g.setdefault('cache_generaties', {})[sleutel] = catalogus_cache.generatie
+    return catalogus_cache.get(sleutel)
 
-        return filename  # Retourneer alleen de bestandsnaam
 
+def cache_set(sleutel, waarde):
+    catalogus_cache.set(sleutel, waarde, g.get('cache_generaties', {}).get(sleutel))
+
+
+# Gerenderde HTML van de publieke catalogus (overzicht en detail), voor bezoekers
+# die niet ingelogd zijn. Zelfde sleutelopbouw als catalogus_cache, zodat
+# invalideer_catalogus beide leegt; een herhaalde view raakt DB noch Jinja.
+PAGINA_CACHE_MAX_ITEMS = int(os.environ.get('PAGINA_CACHE_MAX_ITEMS', 500))
+pagina_cache = LRUCache(PAGINA_CACHE_MAX_ITEMS, CACHE_TTL)
+
+
+def pagina_cachebaar():
+    # Ingelogd (beheerknoppen) of met openstaande flash-berichten: altijd renderen
+    return not session.get('ingelogd') and '_flashes' not in session
+
+
+def pagina_response(html, etag):
+    response = app.response_class(html, mimetype='text/html')
+    response.set_etag(etag)
+    # Browser mag bewaren maar moet revalideren: een wijziging is zo direct zichtbaar
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+
+def cached_pagina(sleutel):
+    if not pagina_cachebaar():
+        return None
+    _start_cache_listener()
+    g.setdefault('pagina_generaties', {})[sleutel] = pagina_cache.generatie
+    pagina = pagina_cache.get(sleutel)
+    return pagina_response(*pagina) if pagina else None
+
+
+def bewaar_pagina(sleutel, html):
+    if not pagina_cachebaar():
+        return html
+    etag = hashlib.sha1(html.encode()).hexdigest()
+    pagina_cache.set(sleutel, (html, etag), g.get('pagina_generaties', {}).get(sleutel))
+    return pagina_response(html, etag)
+
+
+# Responsive afbeeldingen: per upload worden afgeleiden in meerdere breedtes en
+# formaten gemaakt (<basis>-<breedte>.<ext>). Het bestand <basis>.jpg blijft de
+# 800px-versie voor code en templates die alleen een enkele foto kennen.
+# <basis> is de hash van die verwerkte 800px-versie, in mappen ab/cd/<hash>:
+# dezelfde foto opnieuw uploaden levert dezelfde bestanden op (deduplicatie).
+# Het manifest bevat ook de afmetingen van de grootste variant (width/height
+# tegen layout shift), de dominante kleur en een placeholder van een paar pixels
+# als data-URI, die getoond worden tot de foto (lazy) geladen is.
+AFBEELDING_BREEDTES = (1600, 800, 400, 200)
+AFBEELDING_PLACEHOLDER_ZIJDE = 16
+AFBEELDING_MAX_PIXELS = int(os.environ.get('AFBEELDING_MAX_PIXELS', 50_000_000))
+# Foto's waarvan een bestand recenter geschreven of hergebruikt is, worden niet
+# opgeruimd: een upload die nog niet gecommit is, kan ernaar verwijzen
+AFBEELDING_GRACE_MINUTEN = int(os.environ.get('AFBEELDING_GRACE_MINUTEN', 60))
+AFBEELDING_FORMATEN = [('avif', 'AVIF', {'quality': 55}), ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+                       ('jpg', 'JPEG', {'optimize': True, 'progressive': True})]
+if not features.check('avif'):
+    AFBEELDING_FORMATEN = [f for f in AFBEELDING_FORMATEN if f[0] != 'avif']
+
+mimetypes.add_type('image/webp', '.webp')
+mimetypes.add_type('image/avif', '.avif')
+
+
+def laad_afbeelding(bron, max_zijde):
+    img = Image.open(bron)
+
+    # Alleen de header is gelezen; weiger extreem grote afbeeldingen vóór het decoderen
+    if img.width * img.height > AFBEELDING_MAX_PIXELS:
+        raise ValueError(f"Afbeelding is te groot ({img.width}x{img.height} pixels)")
+
+    schaal = max_zijde / max(img.size)
+    if schaal < 1:
+        # JPEG: libjpeg decodeert direct op 1/2, 1/4 of 1/8 schaal (nooit kleiner dan gevraagd)
+        img.draft('RGB', (math.ceil(img.width * schaal), math.ceil(img.height * schaal)))
+
+        # Andere formaten (of een draft die niet ver genoeg kwam): snel met een gehele
+        # factor verkleinen, met 2x marge zodat LANCZOS daarna de kwaliteit bepaalt
+        factor = max(img.size) // (max_zijde * 2)
+        if factor >= 2:
+            img = img.reduce(factor)
+
+    # EXIF rotatie correctie, alle 8 oriëntaties
+    img = ImageOps.exif_transpose(img)
+
+    # Converteer naar RGB indien nodig
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img
+
+
+def maak_placeholder(img):
+    # Dominante kleur (#rrggbb) en een JPEG van AFBEELDING_PLACEHOLDER_ZIJDE px als
+    # data-URI (een paar honderd bytes); de browser schaalt hem vanzelf wazig op
+    klein = img.convert('RGB')
+    klein.thumbnail((AFBEELDING_PLACEHOLDER_ZIJDE, AFBEELDING_PLACEHOLDER_ZIJDE), Image.BOX)
+
+    palet = klein.quantize(colors=4)
+    _, index = max(palet.getcolors())
+    rood, groen, blauw = palet.getpalette()[index * 3:index * 3 + 3]
+
+    buffer = io.BytesIO()
+    klein.save(buffer, 'JPEG', quality=40, optimize=True)
+    return (f"#{rood:02x}{groen:02x}{blauw:02x}",
+            "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode('ascii'))
+
+
+def maak_afgeleiden(bron, target_size=(800, 800), quality=85):
+    # bron is een pad of bestandsobject; schrijft alle varianten en geeft het manifest
+    # terug. Top-level functie zodat hij ook in een process pool draait.
+    upload_dir = app.config['UPLOAD_FOLDER']
+    os.makedirs(upload_dir, exist_ok=True)
+    # Eerst in een tijdelijke map op hetzelfde bestandssysteem, zodat os.replace atomair is
+    tijdelijk = tempfile.mkdtemp(prefix='.verwerken-', dir=upload_dir)
+
+    try:
+        img = laad_afbeelding(bron, max(AFBEELDING_BREEDTES))
+
+        # Eén keer decoderen; elke kleinere breedte wordt uit de vorige verkleind.
+        # Nooit opschalen: van de breedtes boven het origineel blijft alleen de
+        # kleinste over (op originele grootte), zodat er altijd een variant is.
+        breedtes = {}
+        afmetingen = None
+        for breedte, kleinere in zip(AFBEELDING_BREEDTES, AFBEELDING_BREEDTES[1:] + (0,)):
+            if kleinere >= max(img.size):
+                continue
+
+            # Behoud aspect ratio bij resizen
+            img.thumbnail((breedte, breedte), Image.LANCZOS)
+            afmetingen = afmetingen or img.size
+
+            # Opslaan met compressie, per formaat
+            for extensie, formaat, opties in AFBEELDING_FORMATEN:
+                pad = os.path.join(tijdelijk, f"{breedte}.{extensie}")
+                if formaat == 'JPEG':
+                    img.save(pad, formaat, quality=quality, **opties)
+                else:
+                    img.save(pad, formaat, **opties)
+            breedtes[str(breedte)] = img.width
+
+        # img is nu de kleinste variant
+        kleur, placeholder = maak_placeholder(img)
+
+        # Klassieke enkele foto: de grootste variant die binnen target_size valt
+        basis_breedte = max((int(b) for b in breedtes if int(b) <= max(target_size)), default=min(map(int, breedtes)))
+        with open(os.path.join(tijdelijk, f"{basis_breedte}.jpg"), 'rb') as f:
+            inhoud_hash = hashlib.sha256(f.read()).hexdigest()[:32]
+
+        basis = f"{inhoud_hash[:2]}/{inhoud_hash[2:4]}/{inhoud_hash}"
+        filename = basis + ".jpg"
+        filepath = os.path.join(upload_dir, filename)
+        doelmap = os.path.dirname(filepath)
+        os.makedirs(doelmap, exist_ok=True)
+
+        nieuw = not os.path.exists(filepath)
+        if nieuw:
+            for naam in os.listdir(tijdelijk):
+                os.replace(os.path.join(tijdelijk, naam), os.path.join(doelmap, f"{inhoud_hash}-{naam}"))
+            # <basis>.jpg als laatste: bestaat hij, dan bestaan alle varianten
+            try:
+                os.link(os.path.join(doelmap, f"{inhoud_hash}-{basis_breedte}.jpg"), filepath)
+            except FileExistsError:
+                nieuw = False
+        else:
+            # Bestond al: de mtime van élke variant verversen zodat de GC en
+            # ruim_afbeeldingen_op de foto niet net nu opruimen; een variant die
+            # toch ontbreekt, wordt uit deze verwerking teruggezet
+            for naam in os.listdir(tijdelijk):
+                doel = os.path.join(doelmap, f"{inhoud_hash}-{naam}")
+                try:
+                    os.utime(doel)
+                except FileNotFoundError:
+                    os.replace(os.path.join(tijdelijk, naam), doel)
+            os.utime(filepath)
+
+        return {
+            'bestand': filename,  # Pad relatief aan UPLOAD_FOLDER
+            'basis': basis,
+            'formaten': [f[0] for f in AFBEELDING_FORMATEN],
+            'breedtes': breedtes,
+            'breedte': afmetingen[0],
+            'hoogte': afmetingen[1],
+            'kleur': kleur,
+            'placeholder': placeholder,
+            'nieuw': nieuw,
+        }
+
+    finally:
+        shutil.rmtree(tijdelijk, ignore_errors=True)
+
+
+def save_image(image_file, target_size=(800, 800), quality=85):
+    if not image_file:
+        return None
+
+    try:
+        with meet('afbeeldingen'):
+            varianten = maak_afgeleiden(image_file.stream, target_size, quality)
     except Exception as e:
         print(f"Fout bij verwerken afbeelding: {e}")
         return None
+    varianten.pop('nieuw')
+    return varianten
+
+
+# Uploads: elk bestand uit een multipart-formulier wordt tijdens het inlezen
+# direct naar een tijdelijk bestand op schijf geschreven (ook kleine bestanden,
+# zodat de process pool het via het pad kan openen) en de limieten worden
+# bewaakt terwijl de body binnenkomt: MAX_CONTENT_LENGTH per request (Werkzeug
+# weigert al op de Content-Length header), UPLOAD_MAX_BESTAND per bestand, en
+# zodra de header van een foto binnen is AFBEELDING_MAX_PIXELS per foto en
+# UPLOAD_MAX_PIXELS voor alle foto's samen. Een overschrijding wordt een 413.
+UPLOAD_MAX_REQUEST = int(os.environ.get('UPLOAD_MAX_REQUEST', 200 * 1024 * 1024))
+UPLOAD_MAX_BESTAND = int(os.environ.get('UPLOAD_MAX_BESTAND', 25 * 1024 * 1024))
+UPLOAD_MAX_PIXELS = int(os.environ.get('UPLOAD_MAX_PIXELS', 400_000_000))
+UPLOAD_SPOOL_MAP = os.environ.get('UPLOAD_SPOOL_MAP') or None  # None: de standaard tempmap
+UPLOAD_HEADER_MAX = 512 * 1024  # na zoveel bytes zonder leesbare header: niet verder proberen
+
+app.config['MAX_CONTENT_LENGTH'] = UPLOAD_MAX_REQUEST
+
+
+def _mb(aantal_bytes):
+    return f"{aantal_bytes / (1024 * 1024):g} MB"
+
+
+class UploadSpool:
+    # Bestandsobject voor één bestandsdeel; FileStorage leest er na het parsen uit
+    def __init__(self, upload_request, filename, content_type):
+        self._bestand = tempfile.NamedTemporaryFile(prefix='upload-', dir=UPLOAD_SPOOL_MAP)
+        self.name = self._bestand.name
+        self.request = upload_request
+        self.filename = filename or ''
+        self.grootte = 0
+        self.is_foto = (content_type or mimetypes.guess_type(self.filename)[0] or '').startswith('image/')
+        self.pixels = None
+
+    def __getattr__(self, naam):
+        return getattr(self._bestand, naam)
+
+    def write(self, data):
+        self.grootte += len(data)
+        limiet = self.request.max_bestand_grootte
+        if limiet is not None and self.grootte > limiet:
+            raise RequestEntityTooLarge(f'"{self.filename}" is groter dan {_mb(limiet)}.')
+        self._bestand.write(data)
+        if self.is_foto and self.pixels is None:
+            self._controleer_afmetingen()
+        return len(data)
+
+    def _controleer_afmetingen(self):
+        # Image.open leest alleen de header; lukt dat nog niet, dan bij het volgende stuk opnieuw
+        self._bestand.flush()
+        try:
+            with Image.open(self.name) as img:
+                breedte, hoogte = img.size
+        except Image.DecompressionBombError:
+            raise RequestEntityTooLarge(f'"{self.filename}" heeft te veel pixels.')
+        except Exception:
+            if self.grootte > UPLOAD_HEADER_MAX:
+                # Geen (ondersteunde) afbeelding: dat meldt save_image straks zelf
+                self.is_foto = False
+            return
+
+        self.pixels = breedte * hoogte
+        if self.pixels > AFBEELDING_MAX_PIXELS:
+            raise RequestEntityTooLarge(f'"{self.filename}" is te groot ({breedte}x{hoogte} pixels).')
+        self.request.upload_pixels += self.pixels
+        if self.request.upload_pixels > UPLOAD_MAX_PIXELS:
+            raise RequestEntityTooLarge('De foto\'s hebben samen te veel pixels; upload ze in delen.')
+
+
+class UploadRequest(Request):
+    # Per request aan te passen (zie producten_importeren); None is geen limiet
+    max_bestand_grootte = UPLOAD_MAX_BESTAND
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_pixels = 0
+        self.upload_spools = []
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.max_bestand_grootte is not None and (content_length or 0) > self.max_bestand_grootte:
+            raise RequestEntityTooLarge(f'"{filename}" is groter dan {_mb(self.max_bestand_grootte)}.')
+        spool = UploadSpool(self, filename, content_type)
+        self.upload_spools.append(spool)
+        return spool
+
+    def close(self):
+        # Ook de spools van een upload die halverwege werd geweigerd
+        super().close()
+        for spool in self.upload_spools:
+            spool.close()
+
+
+app.request_class = UploadRequest
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_te_groot(e):
+    melding = e.description
+    if melding == RequestEntityTooLarge.description:
+        melding = f'De upload is groter dan {_mb(request.max_content_length)}.'
+    if request.path.startswith('/api/'):
+        return api_fout(melding, 413)
+    flash(f'Upload geweigerd: {melding}', 'error')
+    return redirect(request.url)
+
+
+# Meerdere uploads uit één request worden parallel verwerkt in een process pool
+# per worker-proces (na een fork opnieuw aangemaakt). Met groene threads gaat ook
+# een enkele upload via de pool: rekenen in de worker zelf zou alle andere
+# requests van die worker stilzetten.
+AFBEELDING_PROCESSEN = int(os.environ.get('AFBEELDING_PROCESSEN', os.cpu_count() or 1))
+_afbeelding_pool = None
+_afbeelding_pool_pid = None
+
+
+def _get_afbeelding_pool():
+    global _afbeelding_pool, _afbeelding_pool_pid
+    if _afbeelding_pool is None or _afbeelding_pool_pid != os.getpid():
+        _afbeelding_pool = ProcessPoolExecutor(max_workers=AFBEELDING_PROCESSEN)
+        _afbeelding_pool_pid = os.getpid()
+    return _afbeelding_pool
+
+
+def _maak_afgeleiden_uit_bytes(data, target_size, quality):
+    return maak_afgeleiden(io.BytesIO(data), target_size, quality)
+
+
+def afbeelding_paden(bestand):
+    # Alle bestanden die bij een <basis>.jpg horen (zonder de map te hoeven lezen)
+    basis = bestand[:-4] if bestand.endswith('.jpg') else bestand
+    paden = [bestand]
+    for breedte in AFBEELDING_BREEDTES:
+        for extensie in ('avif', 'webp', 'jpg'):
+            paden.append(f"{basis}-{breedte}.{extensie}")
+    return paden
+
+
+def verwijder_afgeleiden(bestand):
+    upload_dir = app.config['UPLOAD_FOLDER']
+    for pad in afbeelding_paden(bestand):
+        try:
+            os.remove(os.path.join(upload_dir, pad))
+        except FileNotFoundError:
+            pass
+
+
+def save_images(image_files, target_size=(800, 800), quality=85):
+    # Verwerkt alle bestanden tegelijk; resultaten in dezelfde volgorde als de invoer.
+    # Mislukt er één, dan worden de door deze aanroep nieuw geschreven varianten weer
+    # verwijderd (niet die van een al bestaande, gededupliceerde foto) en is het
+    # resultaat None (zoals bij save_image).
+    resultaten, fout = [], None
+    with meet('afbeeldingen'):
+        if not GROENE_THREADS and (len(image_files) <= 1 or AFBEELDING_PROCESSEN <= 1):
+            for f in image_files:
+                try:
+                    resultaten.append(maak_afgeleiden(f.stream, target_size, quality))
+                except Exception as e:
+                    fout = e
+                    break
+        else:
+            pool = _get_afbeelding_pool()
+            # Gespoolde uploads via hun pad: de bytes gaan dan niet door het geheugen
+            # van de worker en de pipe naar de pool
+            futures = [pool.submit(maak_afgeleiden, f.stream.name, target_size, quality)
+                       if isinstance(f.stream, UploadSpool) else
+                       pool.submit(_maak_afgeleiden_uit_bytes, f.stream.read(), target_size, quality)
+                       for f in image_files]
+            for future in futures:
+                try:
+                    resultaten.append(future.result())
+                except Exception as e:
+                    fout = fout or e
+
+    if fout:
+        print(f"Fout bij verwerken afbeelding: {fout}")
+        for varianten in resultaten:
+            if varianten['nieuw']:
+                verwijder_afgeleiden(varianten['bestand'])
+        return None
+
+    for varianten in resultaten:
+        varianten.pop('nieuw')
+    return resultaten
+
+
+def ongebruikte_afbeeldingen(cursor, bestanden):
+    # "Reference count" tegen product_kleuren: welke <basis>.jpg wordt door geen
+    # kleurvariant en geen openstaande afbeelding_taak meer gebruikt?
+    cursor.execute("""
+        SELECT b FROM unnest(%s::text[]) AS b
+        WHERE NOT EXISTS (SELECT 1 FROM product_kleuren WHERE foto = b)
+          AND NOT EXISTS (SELECT 1 FROM product_kleuren WHERE hover_foto = b)
+          AND NOT EXISTS (SELECT 1 FROM afbeelding_taken
+                          WHERE status <> 'klaar' AND (bestand = b OR vervangt = b))
+    """, (list(bestanden),))
+    return [rij[0] for rij in cursor.fetchall()]
+
+
+def afbeelding_recent(bestand, grens):
+    # Is een van de bestanden van deze foto na grens (time.time()) nog geschreven
+    # of hergebruikt (zie maak_afgeleiden)? Dan kan een nog niet gecommitte upload
+    # ernaar verwijzen.
+    upload_dir = app.config['UPLOAD_FOLDER']
+    for pad in afbeelding_paden(bestand):
+        try:
+            if os.stat(os.path.join(upload_dir, pad)).st_mtime > grens:
+                return True
+        except FileNotFoundError:
+            pass
+    return False
+
+
+def ruim_afbeeldingen_op(cursor, bestanden):
+    # Na de commit aanroepen met de foto's die uit product_kleuren zijn verdwenen.
+    # Recent gebruikte foto's blijven staan; die ruimt "flask afbeeldingen-gc" later op.
+    bestanden = {b for b in bestanden if b}
+    if not bestanden:
+        return
+    grens = time.time() - AFBEELDING_GRACE_MINUTEN * 60
+    try:
+        for bestand in ongebruikte_afbeeldingen(cursor, bestanden):
+            if not afbeelding_recent(bestand, grens):
+                verwijder_afgeleiden(bestand)
+    except Exception as e:
+        # Niet fataal: "flask afbeeldingen-gc" ruimt later alsnog op
+        print(f"Fout bij opruimen afbeeldingen: {e}")
+
+
+def afbeelding_bronnen(bestand, varianten=None):
+    # srcset per formaat voor <picture>/<img>; zonder manifest (oude uploads) alleen src
+    bronnen = {'src': url_for('serve_uploaded_file', filename=bestand)}
+    if varianten:
+        basis = varianten['basis']
+        for extensie in varianten['formaten']:
+            bronnen[extensie] = ', '.join(
+                url_for('serve_uploaded_file', filename=f"{basis}-{label}.{extensie}") + f" {breedte}w"
+                for label, breedte in varianten['breedtes'].items()
+            )
+    return bronnen
+
+
+app.jinja_env.globals['afbeelding_bronnen'] = afbeelding_bronnen
+# Transparante 1x1 GIF als src van een uitgestelde foto (zie templates/_afbeelding.html)
+app.jinja_env.globals['LEGE_AFBEELDING'] = 'data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7'
+
+
+# Asynchrone beeldverwerking: met AFBEELDINGEN_ASYNC=1 wordt een upload alleen
+# ruw weggeschreven en als taak in afbeelding_taken gezet (migraties/0006).
+# "flask verwerk-afbeeldingen" maakt de afgeleiden in een process pool. Een
+# kleurvariant is pas zichtbaar als er geen openstaande taak meer voor is.
+AFBEELDINGEN_ASYNC = os.environ.get('AFBEELDINGEN_ASYNC', '0') == '1'
+AFBEELDING_TAKEN_KANAAL = 'afbeelding_taken'
+AFBEELDING_MAX_POGINGEN = 3
+app.config['RUWE_UPLOAD_FOLDER'] = os.environ.get('RUWE_UPLOAD_FOLDER', '/var/data/uploads-raw')
+
+# Voorwaarde op een product_kleuren-rij "pk": beide foto's zijn verwerkt (staat ook
+# in ververs_product_overzicht, migraties/0008)
+KLEUR_KLAAR_SQL = """NOT EXISTS (
+    SELECT 1 FROM afbeelding_taken t
+    WHERE t.status <> 'klaar' AND t.product_id = pk.product_id AND t.bestand IN (pk.foto, pk.hover_foto)
+)"""
+
+
+def plaats_uploads(cursor, product_id, uploads):
+    # uploads: lijst van (image_file, oude_foto, oude_varianten). Geeft per upload
+    # (bestand, varianten, taak_id) voor product_kleuren terug, of None als er één
+    # mislukt. Asynchroon blijft een vervangen foto zichtbaar tot de nieuwe klaar is;
+    # de aanroeper koppelt de taak daarna met koppel_afbeelding_taken aan zijn cel.
+    if not uploads:
+        return []
+
+    if not AFBEELDINGEN_ASYNC:
+        resultaten = save_images([image_file for image_file, _, _ in uploads])
+        return [(varianten['bestand'], varianten, None) for varianten in resultaten] if resultaten else None
+
+    ruwe_map = app.config['RUWE_UPLOAD_FOLDER']
+    os.makedirs(ruwe_map, exist_ok=True)
+    resultaten = []
+    for image_file, oude_foto, oude_varianten in uploads:
+        basis = secrets.token_hex(8)
+        bron = basis + os.path.splitext(image_file.filename or '')[1].lower()
+        with meet('afbeeldingen'):
+            image_file.save(os.path.join(ruwe_map, bron))
+
+        cursor.execute(
+            "INSERT INTO afbeelding_taken (product_id, bron, bestand, vervangt) VALUES (%s, %s, %s, %s) RETURNING id",
+            (product_id, bron, basis + '.jpg', oude_foto or None)
+        )
+        taak_id = cursor.fetchone()[0]
+        resultaten.append((oude_foto, oude_varianten, taak_id) if oude_foto else (basis + '.jpg', None, taak_id))
+
+    cursor.execute("SELECT pg_notify(%s, '')", (AFBEELDING_TAKEN_KANAAL,))
+    return resultaten
+
+
+def koppel_afbeelding_taken(cursor, koppelingen):
+    # koppelingen: lijst van (taak_id, kleur_id, kolom); taak_id None (synchroon) wordt overgeslagen
+    koppelingen = [koppeling for koppeling in koppelingen if koppeling[0] is not None]
+    if koppelingen:
+        execute_values(cursor, """
+            UPDATE afbeelding_taken t SET kleur_id = k.kleur_id, kolom = k.kolom
+            FROM (VALUES %s) AS k (id, kleur_id, kolom)
+            WHERE t.id = k.id
+        """, koppelingen)
+
+
+def claim_afbeelding_taken(conn, aantal):
+    # SKIP LOCKED: meerdere workers kunnen naast elkaar taken claimen. Taken die
+    # te lang "bezig" staan (gecrashte worker) worden opnieuw opgepakt.
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE afbeelding_taken
+        SET status = 'bezig', pogingen = pogingen + 1, bijgewerkt_op = now()
+        WHERE id IN (
+            SELECT id FROM afbeelding_taken
+            WHERE status = 'wachtend'
+               OR (status = 'bezig' AND bijgewerkt_op < now() - interval '10 minutes')
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, product_id, kleur_id, kolom, bron, bestand, vervangt, pogingen
+    """, (aantal,))
+    taken = [dict(taak) for taak in cursor.fetchall()]
+    conn.commit()
+    return taken
+
+
+def rond_afbeelding_taak_af(conn, taak, varianten):
+    # taak['bestand'] is een tijdelijke naam; de definitieve (hash-)naam is pas nu bekend
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        UPDATE afbeelding_taken
+        SET status = 'klaar', bestand = %s, foutmelding = NULL, bijgewerkt_op = now()
+        WHERE id = %s
+        """,
+        (varianten['bestand'], taak['id'])
+    )
+    # Alleen de cel waarvoor de taak is aangemaakt, en alleen als daar nog de foto
+    # staat die hij vervangt (anders is de kleur intussen opnieuw bewerkt)
+    huidig = taak['vervangt'] or taak['bestand']
+    if taak['kleur_id'] is not None:
+        kolom = taak['kolom']
+        cursor.execute(
+            f"UPDATE product_kleuren SET {kolom} = %s, {kolom}_varianten = %s WHERE id = %s AND {kolom} = %s",
+            (varianten['bestand'], Json(varianten), taak['kleur_id'], huidig)
+        )
+    else:
+        # Taak van vóór migraties/0010, zonder doelcel
+        for kolom in ('foto', 'hover_foto'):
+            cursor.execute(
+                f"UPDATE product_kleuren SET {kolom} = %s, {kolom}_varianten = %s WHERE product_id = %s AND {kolom} = %s",
+                (varianten['bestand'], Json(varianten), taak['product_id'], huidig)
+            )
+    cursor.execute("SELECT categorie_id FROM producten WHERE id = %s", (taak['product_id'],))
+    product = cursor.fetchone()
+    categorie_ids = [product[0]] if product else []
+    meld_catalogus_wijziging(cursor, taak['product_id'], categorie_ids)
+    conn.commit()
+    invalideer_catalogus(taak['product_id'], categorie_ids)
+    ruim_afbeeldingen_op(cursor, [taak['vervangt']])
+    conn.commit()
+
+    bron = os.path.join(app.config['RUWE_UPLOAD_FOLDER'], taak['bron'])
+    if os.path.exists(bron):
+        os.remove(bron)
+
+
+def markeer_afbeelding_taak_mislukt(conn, taak, fout):
+    status = 'mislukt' if taak['pogingen'] >= AFBEELDING_MAX_POGINGEN else 'wachtend'
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE afbeelding_taken SET status = %s, foutmelding = %s, bijgewerkt_op = now() WHERE id = %s",
+        (status, str(fout), taak['id'])
+    )
+    conn.commit()
+
+
+def _verwerk_afbeelding_taak(bron):
+    varianten = maak_afgeleiden(os.path.join(app.config['RUWE_UPLOAD_FOLDER'], bron))
+    varianten.pop('nieuw')
+    return varianten
+
+
+@app.cli.command('verwerk-afbeeldingen')
+@click.option('--processen', default=os.cpu_count() or 1, show_default=True, help='Aantal worker-processen.')
+@click.option('--eenmalig', is_flag=True, help='Stop zodra de wachtrij leeg is.')
+def verwerk_afbeeldingen_command(processen, eenmalig):
+    """Verwerk openstaande afbeelding_taken in een process pool."""
+    wekker = psycopg2.connect(DATABASE_URL)
+    wekker.autocommit = True
+    wekker.cursor().execute(f"LISTEN {AFBEELDING_TAKEN_KANAAL}")
+
+    with ProcessPoolExecutor(max_workers=processen) as executor, db_verbinding() as conn:
+        while True:
+            taken = claim_afbeelding_taken(conn, processen * 2)
+            if not taken:
+                if eenmalig:
+                    break
+                # Wachten op een NOTIFY van een nieuwe upload (of elke 30s opnieuw kijken)
+                select.select([wekker], [], [], 30)
+                wekker.poll()
+                wekker.notifies.clear()
+                continue
+
+            futures = {executor.submit(_verwerk_afbeelding_taak, t['bron']): t for t in taken}
+            for future in as_completed(futures):
+                taak = futures[future]
+                try:
+                    varianten = future.result()
+                    rond_afbeelding_taak_af(conn, taak, varianten)
+                    click.echo(f"Taak {taak['id']} klaar: {varianten['bestand']}")
+                except Exception as e:
+                    conn.rollback()
+                    print(f"Fout bij verwerken afbeelding_taak {taak['id']}: {e}")
+                    markeer_afbeelding_taak_mislukt(conn, taak, e)
+
+    wekker.close()
+
+
+# <basis>-<breedte>.<ext> en <basis>.jpg horen allebei bij de foto <basis>.jpg
+AFGELEIDE_PATROON = re.compile(r'^(.+?)(?:-\d+)?\.(?:jpg|webp|avif)$')
+
+
+def ongebruikte_bronnen(cursor, bronnen):
+    cursor.execute("""
+        SELECT b FROM unnest(%s::text[]) AS b
+        WHERE NOT EXISTS (SELECT 1 FROM afbeelding_taken WHERE bron = b AND status <> 'klaar')
+    """, (list(bronnen),))
+    return [rij[0] for rij in cursor.fetchall()]
+
+
+def _scan_mappen(map_, relatief=''):
+    # Map voor map door de (geshardde) map lopen: per map de lijst (pad, mtime).
+    # Alle bestanden van één foto staan in dezelfde map. Tijdelijke verwerkmappen overslaan.
+    bestanden, submappen = [], []
+    with os.scandir(os.path.join(map_, relatief)) as entries:
+        for entry in entries:
+            pad = os.path.join(relatief, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                if not entry.name.startswith('.verwerken-'):
+                    submappen.append(pad)
+            elif entry.is_file(follow_symlinks=False):
+                bestanden.append((pad, entry.stat(follow_symlinks=False).st_mtime))
+    yield bestanden
+    for submap in submappen:
+        yield from _scan_mappen(map_, submap)
+
+
+def _scan_bestanden(map_):
+    for bestanden in _scan_mappen(map_):
+        yield from bestanden
+
+
+def _verwijder_batch(cursor, map_, batch, ongebruikt, dry_run):
+    # batch: lijst van (pad, sleutel); ongebruikt(cursor, sleutels) filtert op verwijzingen
+    weg = set(ongebruikt(cursor, {sleutel for _, sleutel in batch}))
+    aantal = 0
+    for pad, sleutel in batch:
+        if sleutel not in weg:
+            continue
+        if dry_run:
+            click.echo(f"Zou verwijderen: {pad}")
+        else:
+            try:
+                os.remove(os.path.join(map_, pad))
+            except FileNotFoundError:
+                pass
+        aantal += 1
+    return aantal
+
+
+def _gc_map(cursor, map_, sleutel_van, ongebruikt, grens, batch_grootte, dry_run):
+    if not os.path.isdir(map_):
+        return 0
+    aantal, batch = 0, []
+    for bestanden in _scan_mappen(map_):
+        per_sleutel = {}
+        for pad, mtime in bestanden:
+            sleutel = sleutel_van(pad)
+            if sleutel:
+                per_sleutel.setdefault(sleutel, []).append((pad, mtime))
+        for sleutel, paden in per_sleutel.items():
+            # Per foto beslissen: is één bestand recent (een upload die nog niet
+            # gecommit is, of een hergebruik), dan blijft de hele set staan
+            if max(mtime for _, mtime in paden) > grens:
+                continue
+            batch.extend((pad, sleutel) for pad, _ in paden)
+            if len(batch) >= batch_grootte:
+                aantal += _verwijder_batch(cursor, map_, batch, ongebruikt, dry_run)
+                batch = []
+    if batch:
+        aantal += _verwijder_batch(cursor, map_, batch, ongebruikt, dry_run)
+    return aantal
+
+
+def _foto_van_pad(pad):
+    match = AFGELEIDE_PATROON.match(pad)
+    return match.group(1) + '.jpg' if match else None
+
+
+@app.cli.command('afbeeldingen-gc')
+@click.option('--grace-minuten', default=AFBEELDING_GRACE_MINUTEN, show_default=True,
+              help='Bestanden die recenter gewijzigd zijn overslaan.')
+@click.option('--batch', 'batch_grootte', default=1000, show_default=True, help='Bestanden per databasequery.')
+@click.option('--dry-run', is_flag=True, help='Alleen tonen wat verwijderd zou worden.')
+def afbeeldingen_gc_command(grace_minuten, batch_grootte, dry_run):
+    """Verwijder afbeeldingen waar geen product_kleuren of afbeelding_taak meer naar verwijst."""
+    grens = time.time() - grace_minuten * 60
+    with db_verbinding() as conn:
+        cursor = conn.cursor()
+        verwijderd = _gc_map(cursor, app.config['UPLOAD_FOLDER'], _foto_van_pad,
+                             ongebruikte_afbeeldingen, grens, batch_grootte, dry_run)
+        verwijderd += _gc_map(cursor, app.config['RUWE_UPLOAD_FOLDER'], lambda pad: pad,
+                              ongebruikte_bronnen, grens, batch_grootte, dry_run)
+        conn.rollback()
 
+    click.echo(f"{verwijderd} bestand(en) {'te verwijderen' if dry_run else 'verwijderd'}.")
+
+
+# Placeholders achteraf: manifesten van vóór de placeholders krijgen alsnog
+# afmetingen, kleur en placeholder, berekend uit de bestaande varianten (de
+# foto's zelf veranderen niet). Uploads zonder manifest slaan we over.
+def _placeholder_voor_manifest(varianten):
+    labels = sorted(varianten['breedtes'], key=lambda label: varianten['breedtes'][label])
+    upload_dir = app.config['UPLOAD_FOLDER']
+    # Alleen de header van de grootste variant; de kleinste wordt echt gedecodeerd
+    with Image.open(os.path.join(upload_dir, f"{varianten['basis']}-{labels[-1]}.jpg")) as img:
+        breedte, hoogte = img.size
+    with Image.open(os.path.join(upload_dir, f"{varianten['basis']}-{labels[0]}.jpg")) as img:
+        kleur, placeholder = maak_placeholder(img)
+    return {'breedte': breedte, 'hoogte': hoogte, 'kleur': kleur, 'placeholder': placeholder}
+
+
+def _sla_placeholders_op(conn, aanvullingen):
+    # Per kolom een eigen UPDATE: een rij kan in beide kolommen een foto uit deze batch hebben
+    cursor = conn.cursor()
+    waarden = [(bestand, Json(extra)) for bestand, extra in aanvullingen]
+    for kolom in ('foto', 'hover_foto'):
+        execute_values(cursor, f"""
+            UPDATE product_kleuren pk
+            SET {kolom}_varianten = pk.{kolom}_varianten || v.extra
+            FROM (VALUES %s) AS v (bestand, extra)
+            WHERE pk.{kolom} = v.bestand AND pk.{kolom}_varianten IS NOT NULL
+        """, waarden, template="(%s, %s::jsonb)", page_size=len(waarden))
+    conn.commit()
+
+
+@app.cli.command('afbeeldingen-placeholders')
+@click.option('--processen', default=AFBEELDING_PROCESSEN, show_default=True, help='Aantal worker-processen.')
+@click.option('--batch', 'batch_grootte', default=200, show_default=True, help="Foto's per transactie.")
+def afbeeldingen_placeholders_command(processen, batch_grootte):
+    """Vul afmetingen, dominante kleur en placeholder aan in bestaande fotomanifesten."""
+    with db_verbinding() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT DISTINCT ON (bestand) bestand, varianten
+            FROM (
+                SELECT foto AS bestand, foto_varianten AS varianten FROM product_kleuren
+                UNION ALL
+                SELECT hover_foto, hover_foto_varianten FROM product_kleuren
+            ) fotos
+            WHERE bestand IS NOT NULL AND varianten IS NOT NULL AND NOT varianten ? 'placeholder'
+        """)
+        fotos = cursor.fetchall()
+        cursor.execute("""
+            SELECT count(*) FROM product_kleuren
+            WHERE (foto IS NOT NULL AND foto_varianten IS NULL)
+               OR (hover_foto IS NOT NULL AND hover_foto_varianten IS NULL)
+        """)
+        zonder_manifest = cursor.fetchone()[0]
+        conn.commit()
 
-# Helper functies
-def get_categorie_naam(categorie_id):
-    conn = get_db_connection()
-    if conn:
+        klaar, mislukt, aanvullingen = 0, 0, []
+        with ProcessPoolExecutor(max_workers=processen) as executor:
+            futures = {executor.submit(_placeholder_voor_manifest, varianten): bestand
+                       for bestand, varianten in fotos}
+            for future in as_completed(futures):
+                bestand = futures[future]
+                try:
+                    aanvullingen.append((bestand, future.result()))
+                except Exception as e:
+                    mislukt += 1
+                    print(f"Fout bij placeholder voor {bestand}: {e}")
+                    continue
+                if len(aanvullingen) >= batch_grootte:
+                    _sla_placeholders_op(conn, aanvullingen)
+                    klaar += len(aanvullingen)
+                    aanvullingen = []
+                    click.echo(f"{klaar}/{len(fotos)} foto's bijgewerkt")
+        if aanvullingen:
+            _sla_placeholders_op(conn, aanvullingen)
+            klaar += len(aanvullingen)
+
+    # De caches verlopen vanzelf (CACHE_TTL); tot dan tonen pagina's nog geen placeholder
+    click.echo(f"{klaar} foto's bijgewerkt, {mislukt} mislukt.")
+    if zonder_manifest:
+        click.echo(f"{zonder_manifest} kleurvariant(en) met oude uploads zonder manifest overgeslagen.")
+
+
+# Categorie-register: de handvol categorieën wordt één keer per worker geladen en
+# daarna uit het geheugen opgezocht (hoofdletterongevoelig). Wijzigingen komen
+# binnen via NOTIFY (zie migraties/0002); CATEGORIEEN_TTL is het vangnet.
+CATEGORIEEN_TTL = float(os.environ.get('CATEGORIEEN_TTL', 600))
+CATEGORIEEN_KANAAL = 'categorieen_gewijzigd'
+
+# Weergavenamen in het menu die afwijken van de naam in de database
+MENU_LABELS = {'Moeder-Dochter': 'Moeder/Dochter sets'}
+
+_categorie_register = {'lijst': [], 'op_id': {}, 'op_naam': {}, 'geldig_tot': 0}
+_categorie_lock = threading.Lock()
+
+
+def laad_categorieen(forceer=False):
+    global _categorie_register
+    _start_cache_listener()
+    if not forceer and _categorie_register['geldig_tot'] > time.monotonic():
+        return True
+
+    with _categorie_lock:
+        if not forceer and _categorie_register['geldig_tot'] > time.monotonic():
+            return True
         try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT naam FROM categorieen WHERE id = %s", (categorie_id,))
-            result = cursor.fetchone()
-            return result[0] if result else None
+            with db_verbinding() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT id, naam FROM categorieen ORDER BY id")
+                lijst = [{'id': rij[0], 'naam': rij[1]} for rij in cursor.fetchall()]
         except Exception as e:
-            print(f"Fout bij ophalen categorie naam: {e}")
-            return None
-        finally:
-            if conn:
-                conn.close()
-    return None
+            print(f"Fout bij laden categorieën: {e}")
+            return bool(_categorie_register['lijst'])
+
+        # In één keer vervangen, zodat lezers nooit een half register zien
+        _categorie_register = {
+            'lijst': lijst,
+            'op_id': {c['id']: c for c in lijst},
+            'op_naam': {c['naam'].casefold(): c for c in lijst},
+            'geldig_tot': time.monotonic() + CATEGORIEEN_TTL,
+        }
+    return True
+
+
+def markeer_categorieen_verouderd():
+    _categorie_register['geldig_tot'] = 0
+    # Het menu staat in elke gecachete pagina
+    pagina_cache.clear()
+
+
+def get_categorieen():
+    laad_categorieen()
+    return _categorie_register['lijst']
+
+
+def zoek_categorie(naam):
+    laad_categorieen()
+    return _categorie_register['op_naam'].get(naam.casefold())
+
+
+# Helper functies
+def get_categorie_naam(categorie_id):
+    laad_categorieen()
+    try:
+        categorie = _categorie_register['op_id'].get(int(categorie_id))
+    except (TypeError, ValueError):
+        return None
+    return categorie['naam'] if categorie else None
+
+
+@app.context_processor
+def inject_categorieen():
+    return {'menu_categorieen': [
+        {'naam': c['naam'], 'label': MENU_LABELS.get(c['naam'], c['naam'])} for c in get_categorieen()
+    ]}
+
+
+PRODUCTEN_PER_PAGINA = int(os.environ.get('PRODUCTEN_PER_PAGINA', 24))
+MAX_PRODUCTEN_PER_PAGINA = 100
+
+
+def escape_like(zoekterm):
+    return zoekterm.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def maak_cursor(product):
+    return f"{product['gemaakt_op'].isoformat()}_{product['id']}"
+
+
+def lees_cursor(waarde):
+    # Keyset-cursor "<gemaakt_op>_<id>"; ongeldige waarden betekenen: eerste pagina
+    if not waarde:
+        return None
+    try:
+        gemaakt_op, product_id = waarde.rsplit('_', 1)
+        return datetime.fromisoformat(gemaakt_op), int(product_id)
+    except ValueError:
+        return None
+
+
+def lees_paginagrootte(waarde):
+    try:
+        aantal = int(waarde)
+    except (TypeError, ValueError):
+        return PRODUCTEN_PER_PAGINA
+    return max(1, min(aantal, MAX_PRODUCTEN_PER_PAGINA))
+
+
+def get_producten_met_kleuren(cursor, categorie_id=None, zoekterm=None, na=None, limiet=None, ids=None):
+    # Eén range scan op product_overzicht (migraties/0008): per product staan de
+    # zichtbare kleuren al als JSON-array klaar, in dezelfde vorm als de losse
+    # product_kleuren rijen. Zoeken gebeurt in SQL (trigram-index op naam) en
+    # pagineren met een keyset op (gemaakt_op, id) zodat diepe pagina's even snel blijven.
+    voorwaarden = ["TRUE"]
+    parameters = []
+
+    if categorie_id is not None:
+        voorwaarden.append("o.categorie_id = %s")
+        parameters.append(categorie_id)
+
+    if ids is not None:
+        voorwaarden.append("o.product_id = ANY(%s)")
+        parameters.append(list(ids))
+
+    if zoekterm:
+        voorwaarden.append("o.naam ILIKE %s")
+        parameters.append(f"%{escape_like(zoekterm)}%")
+
+    if na:
+        voorwaarden.append("(o.gemaakt_op, o.product_id) < (%s, %s)")
+        parameters.extend(na)
+
+    limiet_sql = ""
+    if limiet:
+        # Eén extra rij ophalen om te weten of er nog een volgende pagina is
+        limiet_sql = "LIMIT %s"
+        parameters.append(limiet + 1)
+
+    cursor.execute(f"""
+        SELECT o.product_id AS id, o.naam, o.beschrijving, o.prijs, o.categorie_id, o.gemaakt_op,
+               o.categorie_naam, o.kleuren
+        FROM product_overzicht o
+        WHERE {' AND '.join(voorwaarden)}
+        ORDER BY o.gemaakt_op DESC, o.product_id DESC
+        {limiet_sql}
+    """, parameters)
+    producten_lijst = [dict(product) for product in cursor.fetchall()]
+
+    volgende = None
+    if limiet and len(producten_lijst) > limiet:
+        producten_lijst = producten_lijst[:limiet]
+        volgende = maak_cursor(producten_lijst[-1])
+    return producten_lijst, volgende
+
+
+def maak_prefix_tsquery(zoekterm):
+    # "gouden oorb" -> "gouden:* & oorb:*", zodat ook halve woorden (type-ahead) matchen
+    woorden = re.findall(r'\w+', zoekterm)
+    return ' & '.join(f"{woord}:*" for woord in woorden)
+
+
+def zoek_producten(cursor, zoekterm, pagina=1, per_pagina=PRODUCTEN_PER_PAGINA):
+    # Gerankt zoeken over alle categorieën in één query: treffers, eerste kleurfoto
+    # en het totaal aantal treffers (window-functie) komen in dezelfde round-trip.
+    tsquery = maak_prefix_tsquery(zoekterm)
+    if not tsquery:
+        return [], 0
+
+    cursor.execute(f"""
+        SELECT p.id, p.naam, p.beschrijving, p.prijs, c.naam AS categorie_naam,
+               ts_rank(p.zoek_vector, q) AS rang,
+               k.foto, k.hover_foto, k.foto_varianten, k.hover_foto_varianten,
+               count(*) OVER () AS totaal
+        FROM producten p
+        JOIN categorieen c ON c.id = p.categorie_id
+        CROSS JOIN to_tsquery('dutch', %s) q
+        JOIN LATERAL (
+            SELECT pk.foto, pk.hover_foto, pk.foto_varianten, pk.hover_foto_varianten
+            FROM product_kleuren pk
+            WHERE pk.product_id = p.id AND {KLEUR_KLAAR_SQL}
+            ORDER BY pk.volgorde, pk.id
+            LIMIT 1
+        ) k ON true
+        WHERE p.zoek_vector @@ q
+        ORDER BY rang DESC, p.id DESC
+        LIMIT %s OFFSET %s
+    """, (tsquery, per_pagina, (pagina - 1) * per_pagina))
+    resultaten = [dict(rij) for rij in cursor.fetchall()]
+    totaal = resultaten[0]['totaal'] if resultaten else 0
+    return resultaten, totaal
 
 
 # Routes
@@ -107,101 +1867,314 @@ def home():
 
 @app.route('/producten/<categorie>')
 def producten_per_categorie(categorie):
-    conn = get_db_connection()
-    producten_lijst = []
     zoekterm = request.args.get('q', '').strip().lower()  # <--- zoekterm ophalen
+    per_pagina = lees_paginagrootte(request.args.get('per_pagina'))
 
-    if conn:
-        try:
-            cursor = conn.cursor(cursor_factory=DictCursor)
+    if not laad_categorieen():
+        flash('Kon geen verbinding maken met de database', 'error')
+        return redirect(url_for('home'))
 
-            # Controleer of categorie bestaat
-            cursor.execute("SELECT id FROM categorieen WHERE naam ILIKE %s", (categorie,))
-            categorie_result = cursor.fetchone()
+    # Controleer of categorie bestaat
+    categorie_result = zoek_categorie(categorie)
+    if not categorie_result:
+        flash(f'Categorie "{categorie}" niet gevonden', 'error')
+        return redirect(url_for('home'))
 
-            if not categorie_result:
-                flash(f'Categorie "{categorie}" niet gevonden', 'error')
-                return redirect(url_for('home'))
+    categorie_id = categorie_result['id']
+
+    # Haal producten op, met alle kleurvarianten per product in dezelfde query
+    na = lees_cursor(request.args.get('na'))
+    sleutel = ('categorie', categorie_id, zoekterm, na, per_pagina)
+    pagina_sleutel = sleutel + ('html', categorie)
+    pagina = cached_pagina(pagina_sleutel)
+    if pagina:
+        return pagina
+    resultaat = cache_get(sleutel)
 
-            categorie_id = categorie_result['id']
-
-            # Haal producten op
-            cursor.execute("""
-                SELECT p.*, c.naam AS categorie_naam 
-                FROM producten p
-                JOIN categorieen c ON p.categorie_id = c.id
-                WHERE c.id = %s
-                ORDER BY p.gemaakt_op DESC
-            """, (categorie_id,))
-            producten_db = cursor.fetchall()
-
-            for product in producten_db:
-                cursor.execute("""
-                    SELECT * FROM product_kleuren 
-                    WHERE product_id = %s 
-                    ORDER BY id
-                """, (product['id'],))
-                kleuren = cursor.fetchall()
-
-                product_dict = dict(product)
-                product_dict['kleuren'] = kleuren
-                producten_lijst.append(product_dict)
-
-            # Filter op zoekterm
-            if zoekterm:
-                producten_lijst = [
-                    p for p in producten_lijst
-                    if zoekterm in p['naam'].lower()
-                ]
-
-            return render_template('producten.html',
-                                   producten=producten_lijst,
-                                   categorie=categorie,
-                                   zoekterm=zoekterm)  # zoekterm meegeven
+    if resultaat is None:
+        conn = get_db_connection(alleen_lezen=True)
+        if not conn:
+            flash('Kon geen verbinding maken met de database', 'error')
+            return redirect(url_for('home'))
 
+        try:
+            cursor = conn.cursor(cursor_factory=DictCursor)
+            resultaat = get_producten_met_kleuren(cursor, categorie_id, zoekterm=zoekterm, na=na,
+                                                  limiet=per_pagina)
+            cache_set(sleutel, resultaat)
         except Exception as e:
             print(f"Database error: {e}")
             flash('Er is een fout opgetreden bij het ophalen van producten', 'error')
             return redirect(url_for('home'))
-        finally:
-            if conn:
-                conn.close()
-
-    flash('Kon geen verbinding maken met de database', 'error')
-    return redirect(url_for('home'))
 
+    producten_lijst, volgende = resultaat
+    return bewaar_pagina(pagina_sleutel, render_template('producten.html',
+                                                         producten=producten_lijst,
+                                                         categorie=categorie,
+                                                         zoekterm=zoekterm,  # zoekterm meegeven
+                                                         volgende=volgende,
+                                                         per_pagina=per_pagina))
 
 
 @app.route('/producten/<categorie>/<int:product_id>')
 def product_detail(categorie, product_id):
-    conn = get_db_connection()
-    if not conn:
-        flash('Databaseverbinding mislukt', 'error')
-        return redirect(url_for('producten_per_categorie', categorie=categorie))
+    sleutel = ('product', product_id)
+    pagina_sleutel = sleutel + ('html', categorie)
+    pagina = cached_pagina(pagina_sleutel)
+    if pagina:
+        return pagina
+    resultaat = cache_get(sleutel)
+
+    if resultaat is None:
+        conn = get_db_connection(alleen_lezen=True)
+        if not conn:
+            flash('Databaseverbinding mislukt', 'error')
+            return redirect(url_for('producten_per_categorie', categorie=categorie))
 
-    try:
-        cursor = conn.cursor(cursor_factory=DictCursor)
-        cursor.execute("SELECT * FROM producten WHERE id = %s", (product_id,))
-        product = cursor.fetchone()
+        try:
+            cursor = conn.cursor(cursor_factory=DictCursor)
+            cursor.execute("SELECT * FROM producten WHERE id = %s", (product_id,))
+            product = cursor.fetchone()
+
+            if not product:
+                flash('Product niet gevonden', 'error')
+                return redirect(url_for('producten_per_categorie', categorie=categorie))
+
+            cursor.execute(f"""
+                SELECT * FROM product_kleuren pk
+                WHERE pk.product_id = %s AND {KLEUR_KLAAR_SQL}
+                ORDER BY pk.volgorde, pk.id
+            """, (product_id,))
+            kleuren = [dict(kleur) for kleur in cursor.fetchall()]
 
-        if not product:
-            flash('Product niet gevonden', 'error')
+            if not kleuren:
+                # Nog geen kleurvariant met verwerkte afbeeldingen
+                flash('Product niet gevonden', 'error')
+                return redirect(url_for('producten_per_categorie', categorie=categorie))
+
+            resultaat = (dict(product), kleuren)
+            cache_set(sleutel, resultaat)
+        except Exception as e:
+            print(f"FOUT bij ophalen product details: {str(e)}")
+            flash('Databasefout bij ophalen product details', 'error')
             return redirect(url_for('producten_per_categorie', categorie=categorie))
 
-        cursor.execute("SELECT * FROM product_kleuren WHERE product_id = %s ORDER BY id", (product_id,))
-        kleuren = cursor.fetchall()
+    product, kleuren = resultaat
+    return bewaar_pagina(pagina_sleutel, render_template('product_detail.html',
+                                                         product=product,
+                                                         kleuren=kleuren,
+                                                         categorie=categorie))
+
+
+def lees_zoekparameters():
+    zoekterm = request.args.get('q', '').strip()
+    try:
+        pagina = max(1, int(request.args.get('pagina', 1)))
+    except ValueError:
+        pagina = 1
+    return zoekterm, pagina, lees_paginagrootte(request.args.get('per_pagina'))
+
+
+@app.route('/zoeken')
+def zoeken():
+    zoekterm, pagina, per_pagina = lees_zoekparameters()
+    resultaten, totaal = [], 0
 
-        return render_template('product_detail.html',
-                               product=product,
-                               kleuren=kleuren,
-                               categorie=categorie)
+    if zoekterm:
+        conn = get_db_connection(alleen_lezen=True)
+        if not conn:
+            flash('Kon geen verbinding maken met de database', 'error')
+            return redirect(url_for('home'))
+        try:
+            resultaten, totaal = zoek_producten(conn.cursor(), zoekterm, pagina, per_pagina)
+        except Exception as e:
+            print(f"Fout bij zoeken: {e}")
+            flash('Er is een fout opgetreden bij het zoeken', 'error')
+
+    return render_template('zoeken.html',
+                           zoekterm=zoekterm,
+                           resultaten=resultaten,
+                           totaal=totaal,
+                           pagina=pagina,
+                           per_pagina=per_pagina)
+
+
+@app.route('/api/zoeken')
+def api_zoeken():
+    zoekterm, pagina, per_pagina = lees_zoekparameters()
+    if not zoekterm:
+        return jsonify({'resultaten': [], 'totaal': 0, 'pagina': pagina})
+
+    conn = get_db_connection(alleen_lezen=True)
+    if not conn:
+        return jsonify({'message': 'Databaseverbinding mislukt', 'category': 'error'}), 503
+
+    try:
+        resultaten, totaal = zoek_producten(conn.cursor(), zoekterm, pagina, per_pagina)
     except Exception as e:
-        print(f"FOUT bij ophalen product details: {str(e)}")
-        flash('Databasefout bij ophalen product details', 'error')
-        return redirect(url_for('producten_per_categorie', categorie=categorie))
-    finally:
-        if conn:
-            conn.close()
+        print(f"Fout bij zoeken: {e}")
+        return jsonify({'message': 'Er is een fout opgetreden bij het zoeken', 'category': 'error'}), 500
+
+    return jsonify({
+        'resultaten': [{
+            'id': r['id'],
+            'naam': r['naam'],
+            'prijs': float(r['prijs']),
+            'categorie': r['categorie_naam'],
+            'rang': r['rang'],
+            'url': url_for('product_detail', categorie=r['categorie_naam'], product_id=r['id']),
+            'foto': url_for('serve_uploaded_file', filename=r['foto']) if r['foto'] else None,
+        } for r in resultaten],
+        'totaal': totaal,
+        'pagina': pagina,
+        'per_pagina': per_pagina,
+    })
+
+
+# Read-only JSON API op dezelfde querylaag en caches als de HTML-pagina's.
+# ?velden=id,naam,... beperkt de velden per product; antwoorden krijgen een ETag
+# en worden gecomprimeerd (brotli als de module geïnstalleerd is, anders gzip).
+API_VELDEN = ('id', 'naam', 'beschrijving', 'prijs', 'categorie', 'gemaakt_op', 'url', 'kleuren')
+API_MAX_IDS = MAX_PRODUCTEN_PER_PAGINA
+API_MIN_COMPRESSIE = 1024
+
+
+def api_fout(melding, status):
+    return jsonify({'message': melding, 'category': 'error'}), status
+
+
+def api_response(data):
+    response = jsonify(data)
+    # Zwak: de bytes verschillen per Content-Encoding, de inhoud niet
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest(), weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+def lees_api_velden():
+    gevraagd = request.args.get('velden')
+    if not gevraagd:
+        return API_VELDEN
+    return tuple(veld for veld in gevraagd.split(',') if veld in API_VELDEN)
+
+
+def api_kleur(kleur):
+    return {
+        'id': kleur['id'],
+        'kleur_naam': kleur['kleur_naam'],
+        'foto': afbeelding_bronnen(kleur['foto'], kleur.get('foto_varianten')),
+        'hover_foto': afbeelding_bronnen(kleur['hover_foto'], kleur.get('hover_foto_varianten'))
+        if kleur['hover_foto'] else None,
+    }
+
+
+def api_product(product, velden):
+    waarden = {
+        'id': lambda: product['id'],
+        'naam': lambda: product['naam'],
+        'beschrijving': lambda: product['beschrijving'],
+        'prijs': lambda: float(product['prijs']),
+        'categorie': lambda: product['categorie_naam'],
+        'gemaakt_op': lambda: product['gemaakt_op'].isoformat() if product['gemaakt_op'] else None,
+        'url': lambda: url_for('product_detail', categorie=product['categorie_naam'], product_id=product['id']),
+        'kleuren': lambda: [api_kleur(kleur) for kleur in product['kleuren']],
+    }
+    return {veld: waarden[veld]() for veld in velden}
+
+
+@app.route('/api/categorieen')
+def api_categorieen():
+    if not laad_categorieen():
+        return api_fout('Databaseverbinding mislukt', 503)
+    return api_response({'categorieen': [{
+        'id': c['id'],
+        'naam': c['naam'],
+        'label': MENU_LABELS.get(c['naam'], c['naam']),
+        'url': url_for('producten_per_categorie', categorie=c['naam']),
+        'api': url_for('api_producten', categorie=c['naam']),
+    } for c in get_categorieen()]})
+
+
+@app.route('/api/producten')
+def api_producten():
+    velden = lees_api_velden()
+
+    if request.args.get('ids'):
+        try:
+            ids = list(dict.fromkeys(int(i) for i in request.args['ids'].split(',') if i.strip()))
+        except ValueError:
+            return api_fout('ids moet een lijst van getallen zijn', 400)
+        if len(ids) > API_MAX_IDS:
+            return api_fout(f'Maximaal {API_MAX_IDS} ids per verzoek', 400)
+
+        conn = get_db_connection(alleen_lezen=True)
+        if not conn:
+            return api_fout('Databaseverbinding mislukt', 503)
+        try:
+            producten_lijst, _ = get_producten_met_kleuren(conn.cursor(cursor_factory=DictCursor), ids=ids)
+        except Exception as e:
+            print(f"Fout bij ophalen producten (API): {e}")
+            return api_fout('Er is een fout opgetreden bij het ophalen van producten', 500)
+
+        # In de gevraagde volgorde; onbekende of nog niet zichtbare ids vallen weg
+        op_id = {p['id']: p for p in producten_lijst}
+        return api_response({'producten': [api_product(op_id[i], velden) for i in ids if i in op_id]})
+
+    if not request.args.get('categorie'):
+        return api_fout('Geef categorie of ids op', 400)
+    if not laad_categorieen():
+        return api_fout('Databaseverbinding mislukt', 503)
+    categorie = zoek_categorie(request.args['categorie'])
+    if not categorie:
+        return api_fout('Categorie niet gevonden', 404)
+
+    zoekterm = request.args.get('q', '').strip().lower()
+    per_pagina = lees_paginagrootte(request.args.get('per_pagina'))
+    na = lees_cursor(request.args.get('cursor'))
+
+    # Zelfde sleutel als producten_per_categorie: HTML en API delen de cache
+    sleutel = ('categorie', categorie['id'], zoekterm, na, per_pagina)
+    resultaat = cache_get(sleutel)
+    if resultaat is None:
+        conn = get_db_connection(alleen_lezen=True)
+        if not conn:
+            return api_fout('Databaseverbinding mislukt', 503)
+        try:
+            resultaat = get_producten_met_kleuren(conn.cursor(cursor_factory=DictCursor), categorie['id'],
+                                                  zoekterm=zoekterm, na=na, limiet=per_pagina)
+            cache_set(sleutel, resultaat)
+        except Exception as e:
+            print(f"Fout bij ophalen producten (API): {e}")
+            return api_fout('Er is een fout opgetreden bij het ophalen van producten', 500)
+
+    producten_lijst, volgende = resultaat
+    return api_response({
+        'producten': [api_product(p, velden) for p in producten_lijst],
+        'volgende': volgende,
+        'volgende_url': url_for('api_producten', categorie=categorie['naam'], q=zoekterm or None, cursor=volgende,
+                                per_pagina=per_pagina, velden=request.args.get('velden')) if volgende else None,
+        'per_pagina': per_pagina,
+    })
+
+
+@app.after_request
+def comprimeer_api(response):
+    # Alleen de API: HTML en afbeeldingen comprimeert de webserver (of zijn al gecomprimeerd)
+    if (not request.path.startswith('/api/') or response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+    data = response.get_data()
+    if len(data) < API_MIN_COMPRESSIE:
+        return response
+
+    if brotli and 'br' in request.accept_encodings:
+        response.set_data(brotli.compress(data, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif 'gzip' in request.accept_encodings:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
 
 
 @app.route('/producten/toevoegen', methods=['GET', 'POST'])
@@ -212,20 +2185,7 @@ def product_toevoegen():
     # Clear old flash messages
     session.pop('_flashes', None)
 
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM categorieen")
-            categorieen = cursor.fetchall()
-        except Exception as e:
-            print(f"Fout bij ophalen categorieën: {e}")
-            categorieen = []
-        finally:
-            if conn:
-                conn.close()
-    else:
-        categorieen = []
+    categorieen = get_categorieen()
 
     if request.method == 'POST':
         try:
@@ -267,20 +2227,38 @@ def product_toevoegen():
                 )
                 product_id = cursor.fetchone()[0]
 
+                # Alle foto's van alle kleurvarianten in één keer (parallel) verwerken
+                uploads = plaats_uploads(cursor, product_id,
+                                         [(f, None, None) for f in kleur_fotos + kleur_hover_fotos])
+                if not uploads:
+                    raise Exception("Afbeeldingen voor een kleurvariant konden niet worden opgeslagen.")
+
+                koppelingen = []
                 for i in range(len(kleur_namen)):
-                    kleur_foto_filename = save_image(kleur_fotos[i])
-                    kleur_hover_foto_filename = save_image(kleur_hover_fotos[i])
-
-                    if kleur_foto_filename and kleur_hover_foto_filename:
-                        cursor.execute(
-                            "INSERT INTO product_kleuren (product_id, kleur_naam, foto, hover_foto) VALUES (%s, %s, %s, %s)",
-                            (product_id, kleur_namen[i], kleur_foto_filename, kleur_hover_foto_filename)
-                        )
-                    else:
-                        raise Exception("Afbeeldingen voor een kleurvariant konden niet worden opgeslagen.")
+                    (foto, foto_varianten, foto_taak), (hover_foto, hover_foto_varianten, hover_foto_taak) = \
+                        uploads[i], uploads[len(kleur_namen) + i]
+                    cursor.execute(
+                        """
+                        INSERT INTO product_kleuren
+                            (product_id, volgorde, kleur_naam, foto, hover_foto, foto_varianten, hover_foto_varianten)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s)
+                        RETURNING id
+                        """,
+                        (product_id, i, kleur_namen[i], foto, hover_foto,
+                         Json(foto_varianten) if foto_varianten else None,
+                         Json(hover_foto_varianten) if hover_foto_varianten else None)
+                    )
+                    kleur_id = cursor.fetchone()[0]
+                    koppelingen += [(foto_taak, kleur_id, 'foto'), (hover_foto_taak, kleur_id, 'hover_foto')]
+                koppel_afbeelding_taken(cursor, koppelingen)
 
+                meld_catalogus_wijziging(cursor, product_id, [categorie_id])
                 conn.commit()
-                flash('Product succesvol toegevoegd!', 'success')
+                invalideer_catalogus(product_id, [categorie_id])
+                if AFBEELDINGEN_ASYNC:
+                    flash('Product toegevoegd! Het wordt zichtbaar zodra de afbeeldingen verwerkt zijn.', 'success')
+                else:
+                    flash('Product succesvol toegevoegd!', 'success')
                 return redirect(url_for('producten_per_categorie', categorie=get_categorie_naam(categorie_id)))
 
             except Exception as e:
@@ -288,10 +2266,9 @@ def product_toevoegen():
                 print(f"Databasefout: {e}")
                 flash(f'Databasefout: {str(e)}', 'error')
                 return redirect(url_for('product_toevoegen'))
-            finally:
-                if conn:
-                    conn.close()
 
+        except RequestEntityTooLarge:
+            raise  # Afgehandeld door upload_te_groot
         except Exception as e:
             print(f"Fout bij toevoegen product: {e}")
             flash(f'Fout bij toevoegen product: {str(e)}', 'error')
@@ -300,6 +2277,483 @@ def product_toevoegen():
     return render_template('product_toevoegen.html', categorieen=categorieen)
 
 
+# Bulkimport: een CSV-manifest (één regel per kleurvariant) plus een ZIP met de
+# foto's. Regels met dezelfde waarde in de kolom "product" vormen samen één
+# product (ze moeten aaneengesloten staan); zonder die kolom is elke regel een
+# product. De CSV wordt regel voor regel gelezen en de ZIP per foto uitgepakt in
+# de worker-processen, dus nooit in zijn geheel in het geheugen.
+IMPORT_KOLOMMEN = ('naam', 'prijs', 'categorie', 'kleur_naam', 'foto', 'hover_foto')
+IMPORT_BATCH = int(os.environ.get('IMPORT_BATCH', 500))
+IMPORT_MAX_REQUEST = int(os.environ.get('IMPORT_MAX_REQUEST', 2 * 1024 * 1024 * 1024))
+
+
+def _maak_afgeleiden_uit_zip(zip_pad, naam):
+    # Dezelfde limiet per bestand als bij een gewone upload. file_size komt uit de
+    # ZIP zelf, maar zipfile leest ook nooit meer dan dat: een lid dat zich kleiner
+    # voordoet dan hij uitpakt, kan het geheugen dus niet vullen. De foto wordt
+    # direct uit de ZIP gestreamd in plaats van eerst volledig ingelezen.
+    with zipfile.ZipFile(zip_pad) as archief:
+        grootte = archief.getinfo(naam).file_size
+        if grootte > UPLOAD_MAX_BESTAND:
+            raise ValueError(f"groter dan {_mb(UPLOAD_MAX_BESTAND)} ({_mb(grootte)})")
+        with archief.open(naam) as bestand:
+            varianten = maak_afgeleiden(bestand)
+    varianten.pop('nieuw')
+    return varianten
+
+
+def _lees_import_producten(csv_bestand, fouten):
+    # Generator van producten: {'regel', 'naam', ..., 'kleuren': [...]}; foute regels
+    # komen in fouten en laten het hele product vallen
+    lezer = csv.DictReader(csv_bestand)
+    ontbreekt = [kolom for kolom in IMPORT_KOLOMMEN if kolom not in (lezer.fieldnames or [])]
+    if ontbreekt:
+        raise ValueError(f"Kolommen ontbreken in de CSV: {', '.join(ontbreekt)}")
+
+    product, sleutel = None, object()
+    for rij in lezer:
+        regel = lezer.line_num
+        rij = {kolom: (waarde or '').strip() for kolom, waarde in rij.items() if kolom}
+        rij_sleutel = rij.get('product') or regel
+        if rij_sleutel != sleutel:
+            if product and product['geldig']:
+                yield product
+            sleutel = rij_sleutel
+            product = {'regel': regel, 'kleuren': [], 'geldig': True}
+            try:
+                categorie = zoek_categorie(rij['categorie']) or _categorie_register['op_id'].get(int(rij['categorie']))
+            except ValueError:
+                categorie = None
+            try:
+                if not rij['naam']:
+                    raise ValueError('naam is leeg')
+                if not categorie:
+                    raise ValueError(f"onbekende categorie '{rij['categorie']}'")
+                try:
+                    prijs = float(rij['prijs'].replace(',', '.'))
+                except ValueError:
+                    raise ValueError(f"ongeldige prijs '{rij['prijs']}'")
+                product.update(naam=rij['naam'], beschrijving=rij.get('beschrijving', ''),
+                               prijs=prijs, categorie_id=categorie['id'])
+            except ValueError as e:
+                fouten.append((regel, str(e)))
+                product['geldig'] = False
+
+        if not product['geldig']:
+            continue
+        if not rij['kleur_naam'] or not rij['foto'] or not rij['hover_foto']:
+            fouten.append((regel, 'kleur_naam, foto en hover_foto zijn verplicht'))
+            product['geldig'] = False
+            continue
+        product['kleuren'].append({'regel': regel, 'kleur_naam': rij['kleur_naam'],
+                                   'foto': rij['foto'], 'hover_foto': rij['hover_foto']})
+
+    if product and product['geldig']:
+        yield product
+
+
+def _verwerk_import_afbeeldingen(zip_pad, namen, afbeeldingen):
+    # Vult afbeeldingen[naam] met het manifest, of met een foutmelding (str)
+    namen = [naam for naam in dict.fromkeys(namen) if naam not in afbeeldingen]
+    if AFBEELDING_PROCESSEN <= 1:
+        for naam in namen:
+            try:
+                afbeeldingen[naam] = _maak_afgeleiden_uit_zip(zip_pad, naam)
+            except Exception as e:
+                afbeeldingen[naam] = f"{naam}: {e}"
+        return
+
+    futures = {_get_afbeelding_pool().submit(_maak_afgeleiden_uit_zip, zip_pad, naam): naam for naam in namen}
+    for future in as_completed(futures):
+        naam = futures[future]
+        try:
+            afbeeldingen[naam] = future.result()
+        except Exception as e:
+            afbeeldingen[naam] = f"{naam}: {e}"
+
+
+def _importeer_batch(conn, zip_pad, batch, afbeeldingen, fouten):
+    _verwerk_import_afbeeldingen(
+        zip_pad, [kleur[kolom] for product in batch for kleur in product['kleuren'] for kolom in ('foto', 'hover_foto')],
+        afbeeldingen
+    )
+
+    # Producten met een mislukte foto vallen af, met de melding op de betreffende regel
+    goed = []
+    for product in batch:
+        mislukt = [(kleur['regel'], afbeeldingen[kleur[kolom]]) for kleur in product['kleuren']
+                   for kolom in ('foto', 'hover_foto') if isinstance(afbeeldingen[kleur[kolom]], str)]
+        if mislukt:
+            fouten.extend(mislukt)
+        else:
+            goed.append(product)
+    if not goed:
+        return 0, 0
+
+    cursor = conn.cursor()
+    try:
+        product_ids = execute_values(
+            cursor,
+            "INSERT INTO producten (naam, beschrijving, prijs, categorie_id) VALUES %s RETURNING id",
+            [(p['naam'], p['beschrijving'], p['prijs'], p['categorie_id']) for p in goed],
+            page_size=len(goed), fetch=True
+        )
+        kleuren = []
+        for product, (product_id,) in zip(goed, product_ids):
+            for volgorde, kleur in enumerate(product['kleuren']):
+                foto, hover_foto = afbeeldingen[kleur['foto']], afbeeldingen[kleur['hover_foto']]
+                kleuren.append((product_id, volgorde, kleur['kleur_naam'], foto['bestand'], hover_foto['bestand'],
+                                Json(foto), Json(hover_foto)))
+        execute_values(
+            cursor,
+            """
+            INSERT INTO product_kleuren
+                (product_id, volgorde, kleur_naam, foto, hover_foto, foto_varianten, hover_foto_varianten)
+            VALUES %s
+            """,
+            kleuren, page_size=1000
+        )
+        categorie_ids = sorted({p['categorie_id'] for p in goed})
+        # Nieuwe producten staan nog in geen enkele cache; alleen de overzichten legen
+        meld_catalogus_wijziging(cursor, 0, categorie_ids)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        fouten.extend((p['regel'], f"databasefout: {e}") for p in goed)
+        return 0, 0
+
+    invalideer_catalogus(0, categorie_ids)
+    return len(goed), len(kleuren)
+
+
+def importeer_producten(csv_bestand, zip_pad, batch_grootte=IMPORT_BATCH, voortgang=None):
+    # Eén transactie per batch; geeft (aantal producten, aantal kleuren, fouten) terug
+    if not laad_categorieen():
+        raise ValueError('Kon de categorieën niet laden')
+
+    fouten, afbeeldingen = [], {}
+    totaal_producten = totaal_kleuren = 0
+    with zipfile.ZipFile(zip_pad) as archief:
+        in_zip = set(archief.namelist())
+
+    with db_verbinding() as conn:
+        batch = []
+        for product in _lees_import_producten(csv_bestand, fouten):
+            ontbrekend = [(kleur['regel'], f"{kleur[kolom]} staat niet in de ZIP") for kleur in product['kleuren']
+                          for kolom in ('foto', 'hover_foto') if kleur[kolom] not in in_zip]
+            if ontbrekend:
+                fouten.extend(ontbrekend)
+                continue
+            batch.append(product)
+            if len(batch) >= batch_grootte:
+                aantallen = _importeer_batch(conn, zip_pad, batch, afbeeldingen, fouten)
+                totaal_producten += aantallen[0]
+                totaal_kleuren += aantallen[1]
+                batch = []
+                if voortgang:
+                    voortgang(totaal_producten, len(fouten))
+        if batch:
+            aantallen = _importeer_batch(conn, zip_pad, batch, afbeeldingen, fouten)
+            totaal_producten += aantallen[0]
+            totaal_kleuren += aantallen[1]
+
+    return totaal_producten, totaal_kleuren, sorted(fouten)
+
+
+@app.cli.command('importeer-producten')
+@click.argument('csv_pad', type=click.Path(exists=True, dir_okay=False))
+@click.argument('zip_pad', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch', 'batch_grootte', default=IMPORT_BATCH, show_default=True,
+              help='Producten per transactie.')
+def importeer_producten_command(csv_pad, zip_pad, batch_grootte):
+    """Importeer producten uit een CSV-manifest en een ZIP met foto's."""
+    with open(csv_pad, encoding='utf-8-sig', newline='') as csv_bestand:
+        try:
+            producten, kleuren, fouten = importeer_producten(
+                csv_bestand, zip_pad, batch_grootte,
+                voortgang=lambda aantal, fout: click.echo(f"... {aantal} producten, {fout} fouten")
+            )
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+    for regel, melding in fouten:
+        click.echo(f"Regel {regel}: {melding}", err=True)
+    click.echo(f"{producten} producten en {kleuren} kleurvarianten geïmporteerd, {len(fouten)} fout(en).")
+
+
+# Een import via het beheer duurt al snel langer dan de gunicorn-timeout. Het
+# request zet de CSV en de ZIP daarom alleen in IMPORT_FOLDER en maakt een taak
+# in import_taken (migraties/0011); "flask verwerk-imports" voert hem uit.
+IMPORT_TAKEN_KANAAL = 'import_taken'
+app.config['IMPORT_FOLDER'] = os.environ.get('IMPORT_FOLDER', '/var/data/imports')
+
+
+def claim_import_taak(conn):
+    # Een afgebroken import (status 'bezig') wordt niet opnieuw opgepakt: de
+    # batches die al gecommit zijn, zouden dan dubbel worden geïmporteerd
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE import_taken
+        SET status = 'bezig', bijgewerkt_op = now()
+        WHERE id = (
+            SELECT id FROM import_taken
+            WHERE status = 'wachtend'
+            ORDER BY id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, manifest, fotos
+    """)
+    taak = cursor.fetchone()
+    conn.commit()
+    return dict(taak) if taak else None
+
+
+def voer_import_taak_uit(conn, taak):
+    # Voortgang en resultaat komen in import_taken; de bestanden worden daarna opgeruimd
+    cursor = conn.cursor()
+
+    def voortgang(aantal, _):
+        cursor.execute("UPDATE import_taken SET producten = %s, bijgewerkt_op = now() WHERE id = %s",
+                       (aantal, taak['id']))
+        conn.commit()
+
+    map_ = app.config['IMPORT_FOLDER']
+    try:
+        with open(os.path.join(map_, taak['manifest']), encoding='utf-8-sig', newline='') as csv_bestand:
+            producten, kleuren, fouten = importeer_producten(
+                csv_bestand, os.path.join(map_, taak['fotos']), voortgang=voortgang
+            )
+        cursor.execute(
+            """
+            UPDATE import_taken
+            SET status = 'klaar', producten = %s, kleuren = %s, fouten = %s, bijgewerkt_op = now()
+            WHERE id = %s
+            """,
+            (producten, kleuren, Json(fouten), taak['id'])
+        )
+        conn.commit()
+        return producten, kleuren, fouten
+    except Exception as e:
+        conn.rollback()
+        cursor.execute(
+            "UPDATE import_taken SET status = 'mislukt', foutmelding = %s, bijgewerkt_op = now() WHERE id = %s",
+            (str(e), taak['id'])
+        )
+        conn.commit()
+        raise
+    finally:
+        for bestand in (taak['manifest'], taak['fotos']):
+            pad = os.path.join(map_, bestand)
+            if os.path.exists(pad):
+                os.remove(pad)
+
+
+@app.cli.command('verwerk-imports')
+@click.option('--eenmalig', is_flag=True, help='Stop zodra de wachtrij leeg is.')
+def verwerk_imports_command(eenmalig):
+    """Voer de bulkimports uit die via het beheer zijn klaargezet."""
+    wekker = psycopg2.connect(DATABASE_URL)
+    wekker.autocommit = True
+    wekker.cursor().execute(f"LISTEN {IMPORT_TAKEN_KANAAL}")
+
+    with db_verbinding() as conn:
+        while True:
+            taak = claim_import_taak(conn)
+            if not taak:
+                if eenmalig:
+                    break
+                # Wachten op een NOTIFY van een nieuwe import (of elke 30s opnieuw kijken)
+                select.select([wekker], [], [], 30)
+                wekker.poll()
+                wekker.notifies.clear()
+                continue
+
+            try:
+                producten, kleuren, fouten = voer_import_taak_uit(conn, taak)
+                click.echo(f"Import {taak['id']} klaar: {producten} producten, {kleuren} kleurvarianten, "
+                           f"{len(fouten)} fout(en)")
+            except Exception as e:
+                print(f"Fout bij import_taak {taak['id']}: {e}")
+
+    wekker.close()
+
+
+@app.route('/producten/importeren', methods=['GET', 'POST'])
+def producten_importeren():
+    if 'ingelogd' not in session or not session['ingelogd']:
+        return redirect(url_for('beheren'))
+
+    if request.method == 'POST':
+        # Een ZIP met alle foto's is één groot bestand
+        request.max_content_length = IMPORT_MAX_REQUEST
+        request.max_bestand_grootte = None
+        manifest = request.files.get('manifest')
+        fotos = request.files.get('fotos')
+        if not manifest or not manifest.filename or not fotos or not fotos.filename:
+            flash('Kies een CSV-bestand en een ZIP met foto\'s', 'error')
+            return redirect(url_for('producten_importeren'))
+
+        map_ = app.config['IMPORT_FOLDER']
+        os.makedirs(map_, exist_ok=True)
+        basis = secrets.token_hex(8)
+        bestanden = {'manifest': basis + '.csv', 'fotos': basis + '.zip'}
+        manifest.save(os.path.join(map_, bestanden['manifest']))
+        fotos.save(os.path.join(map_, bestanden['fotos']))
+        if not zipfile.is_zipfile(os.path.join(map_, bestanden['fotos'])):
+            for bestand in bestanden.values():
+                os.remove(os.path.join(map_, bestand))
+            flash('Import mislukt: het fotobestand is geen geldige ZIP', 'error')
+            return redirect(url_for('producten_importeren'))
+
+        conn = get_db_connection()
+        if not conn:
+            flash('Databaseverbinding mislukt', 'error')
+            return redirect(url_for('producten_importeren'))
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO import_taken (manifest, fotos) VALUES (%s, %s) RETURNING id",
+                       (bestanden['manifest'], bestanden['fotos']))
+        taak_id = cursor.fetchone()[0]
+        cursor.execute("SELECT pg_notify(%s, '')", (IMPORT_TAKEN_KANAAL,))
+        conn.commit()
+        flash('De import wordt op de achtergrond uitgevoerd.', 'success')
+        return redirect(url_for('import_status', taak_id=taak_id))
+
+    return render_template('producten_importeren.html', taak=None)
+
+
+@app.route('/producten/importeren/<int:taak_id>')
+def import_status(taak_id):
+    if 'ingelogd' not in session or not session['ingelogd']:
+        return redirect(url_for('beheren'))
+
+    conn = get_db_connection()
+    if not conn:
+        flash('Databaseverbinding mislukt', 'error')
+        return redirect(url_for('producten_importeren'))
+
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, status, producten, kleuren, fouten, foutmelding, aangemaakt_op, bijgewerkt_op
+        FROM import_taken
+        WHERE id = %s
+    """, (taak_id,))
+    taak = cursor.fetchone()
+    if not taak:
+        flash('Import niet gevonden', 'error')
+        return redirect(url_for('producten_importeren'))
+    return render_template('producten_importeren.html', taak=taak)
+
+
+def lees_kleur_formulier():
+    # Eén dict per ingevulde kleurvariant, in formuliervolgorde. kleur_id is leeg
+    # voor een nieuwe variant; de bestandslijsten lopen per index gelijk op.
+    kleur_ids = request.form.getlist('kleur_id[]')
+    kleur_fotos = request.files.getlist('kleur_foto[]')
+    kleur_hover_fotos = request.files.getlist('kleur_hover_foto[]')
+
+    varianten = []
+    for i, kleur_naam in enumerate(request.form.getlist('kleur_naam[]')):
+        if not kleur_naam.strip():
+            continue
+        kleur_id = kleur_ids[i] if i < len(kleur_ids) else ''
+        varianten.append({
+            'id': int(kleur_id) if kleur_id.isdigit() else None,
+            'kleur_naam': kleur_naam,
+            'foto': kleur_fotos[i] if i < len(kleur_fotos) and kleur_fotos[i].filename else None,
+            'hover_foto': kleur_hover_fotos[i] if i < len(kleur_hover_fotos) and kleur_hover_fotos[i].filename else None,
+        })
+    return varianten
+
+
+def werk_kleuren_bij(cursor, product_id, varianten):
+    # Vergelijkt de ingestuurde varianten met de opgeslagen rijen en voert alleen de
+    # nodige UPDATE/INSERT/DELETE uit, samen in één round-trip. Bestaande ids blijven
+    # behouden. Geeft de foto's terug die niet meer gebruikt worden, of None als het
+    # opslaan van een nieuwe afbeelding mislukt. ValueError als een nieuwe variant
+    # niet allebei de foto's heeft.
+    cursor.execute(
+        """
+        SELECT id, volgorde, kleur_naam, foto, foto_varianten, hover_foto, hover_foto_varianten
+        FROM product_kleuren WHERE product_id = %s ORDER BY volgorde, id FOR UPDATE
+        """,
+        (product_id,)
+    )
+    opgeslagen = {rij[0]: dict(zip(('id', 'volgorde', 'kleur_naam', 'foto', 'foto_varianten', 'hover_foto',
+                                    'hover_foto_varianten'), rij)) for rij in cursor.fetchall()}
+
+    # Alle nieuwe foto's in één keer (parallel) verwerken
+    nieuw, behouden, uploads = [], {}, []
+    for volgorde, variant in enumerate(varianten):
+        oud = opgeslagen.get(variant['id'])
+        if oud is None or variant['id'] in behouden:
+            # Onbekend of dubbel id: als nieuwe variant behandelen
+            oud = {'id': None, 'volgorde': None, 'kleur_naam': None, 'foto': None, 'foto_varianten': None,
+                   'hover_foto': None, 'hover_foto_varianten': None}
+        if oud['id'] is None and not (variant['foto'] and variant['hover_foto']):
+            # Net als bij product_toevoegen: zonder beide foto's geen nieuwe variant
+            raise ValueError(f"Nieuwe kleurvariant '{variant['kleur_naam']}' heeft een foto en een hover-foto nodig.")
+        rij = dict(oud, kleur_naam=variant['kleur_naam'], volgorde=volgorde)
+        for kolom in ('foto', 'hover_foto'):
+            if variant[kolom]:
+                uploads.append((rij, kolom, (variant[kolom], oud[kolom], oud[f'{kolom}_varianten'])))
+        if rij['id'] is None:
+            nieuw.append(rij)
+        else:
+            behouden[rij['id']] = rij
+
+    resultaten = plaats_uploads(cursor, product_id, [upload for _, _, upload in uploads])
+    if resultaten is None:
+        return None
+    taken = []
+    for (rij, kolom, _), (bestand, varianten_manifest, taak_id) in zip(uploads, resultaten):
+        rij[kolom], rij[f'{kolom}_varianten'] = bestand, varianten_manifest
+        taken.append((taak_id, rij, kolom))
+
+    statements = []
+    verwijderd = [kleur_id for kleur_id in opgeslagen if kleur_id not in behouden]
+    if verwijderd:
+        statements.append(cursor.mogrify(
+            "DELETE FROM product_kleuren WHERE product_id = %s AND id = ANY(%s)", (product_id, verwijderd)
+        ))
+
+    velden = ('volgorde', 'kleur_naam', 'foto', 'hover_foto', 'foto_varianten', 'hover_foto_varianten')
+    for kleur_id, rij in behouden.items():
+        oud = opgeslagen[kleur_id]
+        gewijzigd = [veld for veld in velden if rij[veld] != oud[veld]]
+        if not gewijzigd:
+            continue
+        statements.append(cursor.mogrify(
+            "UPDATE product_kleuren SET " + ', '.join(f"{veld} = %s" for veld in gewijzigd) + " WHERE id = %s",
+            [Json(rij[veld]) if veld.endswith('_varianten') and rij[veld] else rij[veld] for veld in gewijzigd]
+            + [kleur_id]
+        ))
+
+    if nieuw:
+        # Als laatste statement, zodat RETURNING de nieuwe ids (in VALUES-volgorde) oplevert
+        statements.append(cursor.mogrify(
+            """
+            INSERT INTO product_kleuren
+                (product_id, volgorde, kleur_naam, foto, hover_foto, foto_varianten, hover_foto_varianten)
+            VALUES
+            """
+        ) + b', '.join(cursor.mogrify("(%s, %s, %s, %s, %s, %s, %s)", (
+            product_id, rij['volgorde'], rij['kleur_naam'], rij['foto'], rij['hover_foto'],
+            Json(rij['foto_varianten']) if rij['foto_varianten'] else None,
+            Json(rij['hover_foto_varianten']) if rij['hover_foto_varianten'] else None,
+        )) for rij in nieuw) + b' RETURNING id')
+
+    if statements:
+        cursor.execute(b';\n'.join(statements))
+    if nieuw:
+        for rij, (kleur_id,) in zip(nieuw, cursor.fetchall()):
+            rij['id'] = kleur_id
+    koppel_afbeelding_taken(cursor, [(taak_id, rij['id'], kolom) for taak_id, rij, kolom in taken])
+
+    in_gebruik = {rij[kolom] for rij in list(behouden.values()) + nieuw for kolom in ('foto', 'hover_foto')}
+    return {oud[kolom] for oud in opgeslagen.values() for kolom in ('foto', 'hover_foto')} - in_gebruik
+
+
 @app.route('/producten/bewerken/<int:product_id>', methods=['GET', 'POST'])
 def product_bewerken(product_id):
     if 'ingelogd' not in session or not session['ingelogd']:
@@ -324,12 +2778,11 @@ def product_bewerken(product_id):
                 return redirect(url_for('home'))
 
             # Haal alle kleuren op
-            cursor.execute("SELECT * FROM product_kleuren WHERE product_id = %s ORDER BY id", (product_id,))
+            cursor.execute("SELECT * FROM product_kleuren WHERE product_id = %s ORDER BY volgorde, id", (product_id,))
             kleuren = cursor.fetchall()
 
-            # Haal alle categorieën op
-            cursor.execute("SELECT * FROM categorieen")
-            categorieen = cursor.fetchall()
+            # Alle categorieën komen uit het register
+            categorieen = get_categorieen()
 
             return render_template('product_bewerken.html',
                                    product=product,
@@ -341,9 +2794,6 @@ def product_bewerken(product_id):
             print(f"FOUT bij ophalen product: {str(e)}")
             flash('Databasefout bij ophalen product', 'error')
             return redirect(url_for('home'))
-        finally:
-            if conn:
-                conn.close()
 
     # POST Request - Verwerk formulier
     if request.method == 'POST':
@@ -357,11 +2807,6 @@ def product_bewerken(product_id):
                 flash('Vul alle verplichte velden in', 'error')
                 return redirect(url_for('product_bewerken', product_id=product_id))
 
-            # Verwerk kleurvarianten
-            kleur_namen = request.form.getlist('kleur_naam[]')
-            kleur_fotos = request.files.getlist('kleur_foto[]')
-            kleur_hover_fotos = request.files.getlist('kleur_hover_foto[]')
-
             conn = get_db_connection()
             if not conn:
                 flash('Databaseverbinding mislukt', 'error')
@@ -372,43 +2817,28 @@ def product_bewerken(product_id):
 
                 # Update product basisinformatie
                 cursor.execute(
-                    "UPDATE producten SET naam = %s, beschrijving = %s, prijs = %s, categorie_id = %s WHERE id = %s",
+                    """
+                    UPDATE producten p
+                    SET naam = %s, beschrijving = %s, prijs = %s, categorie_id = %s
+                    FROM (SELECT id, categorie_id FROM producten WHERE id = %s) oud
+                    WHERE p.id = oud.id
+                    RETURNING oud.categorie_id
+                    """,
                     (naam, beschrijving, float(prijs), int(categorie_id), product_id)
                 )
+                oud = cursor.fetchone()
+                categorie_ids = [categorie_id, oud[0] if oud else None]
 
-                # Verwijder bestaande kleuren
-                cursor.execute("DELETE FROM product_kleuren WHERE product_id = %s", (product_id,))
-
-                # Voeg nieuwe kleurvarianten toe
-                for i, kleur_naam in enumerate(kleur_namen):
-                    if not kleur_naam.strip():
-                        continue
-
-                    # Verwerk afbeeldingen
-                    oude_foto = request.form.get(f'oude_foto_{i}', '')
-                    oude_hover_foto = request.form.get(f'oude_hover_foto_{i}', '')
-
-                    # Behandel kleur foto
-                    kleur_foto = oude_foto
-                    if i < len(kleur_fotos) and kleur_fotos[i] and kleur_fotos[i].filename:
-                        kleur_foto = save_image(kleur_fotos[i])
-                        if not kleur_foto:
-                            raise Exception(f"Kon kleurfoto {i + 1} niet opslaan")
-
-                    # Behandel hover foto
-                    kleur_hover_foto = oude_hover_foto
-                    if i < len(kleur_hover_fotos) and kleur_hover_fotos[i] and kleur_hover_fotos[i].filename:
-                        kleur_hover_foto = save_image(kleur_hover_fotos[i])
-                        if not kleur_hover_foto:
-                            raise Exception(f"Kon hoverfoto {i + 1} niet opslaan")
-
-                    # Voeg kleurvariant toe
-                    cursor.execute(
-                        "INSERT INTO product_kleuren (product_id, kleur_naam, foto, hover_foto) VALUES (%s, %s, %s, %s)",
-                        (product_id, kleur_naam, kleur_foto, kleur_hover_foto)
-                    )
+                # Alleen de gewijzigde kleurvarianten bijwerken; ids blijven behouden
+                oude_fotos = werk_kleuren_bij(cursor, product_id, lees_kleur_formulier())
+                if oude_fotos is None:
+                    raise Exception("Kon de nieuwe afbeeldingen niet opslaan")
 
+                meld_catalogus_wijziging(cursor, product_id, categorie_ids)
                 conn.commit()
+                invalideer_catalogus(product_id, categorie_ids)
+                # Vervangen of weggehaalde foto's opruimen als niets ze meer gebruikt
+                ruim_afbeeldingen_op(cursor, oude_fotos)
                 flash('Product succesvol bijgewerkt!', 'success')
                 return redirect(url_for('producten_per_categorie', categorie=get_categorie_naam(categorie_id)))
 
@@ -417,10 +2847,9 @@ def product_bewerken(product_id):
                 print(f"FOUT tijdens bewerken product: {str(e)}")
                 flash(f'Fout bij bijwerken product: {str(e)}', 'error')
                 return redirect(url_for('product_bewerken', product_id=product_id))
-            finally:
-                if conn:
-                    conn.close()
 
+        except RequestEntityTooLarge:
+            raise  # Afgehandeld door upload_te_groot
         except Exception as e:
             print(f"Fout bij bewerken product: {e}")
             flash('Er is een fout opgetreden bij het bewerken van het product', 'error')
@@ -440,21 +2869,29 @@ def product_verwijderen(product_id):
     try:
         cursor = conn.cursor()
 
-        # Eerst de kleurvarianten verwijderen (vanwege foreign key constraint)
-        cursor.execute("DELETE FROM product_kleuren WHERE product_id = %s", (product_id,))
-
-        # Dan het product zelf verwijderen
-        cursor.execute("DELETE FROM producten WHERE id = %s", (product_id,))
+        # De kleurvarianten gaan mee via ON DELETE CASCADE (migraties/0007); hun foto's
+        # komen nog uit de snapshot van vóór de DELETE
+        cursor.execute(
+            """
+            DELETE FROM producten p WHERE p.id = %s
+            RETURNING p.categorie_id,
+                      ARRAY(SELECT unnest(ARRAY[foto, hover_foto]) FROM product_kleuren WHERE product_id = p.id)
+            """,
+            (product_id,)
+        )
+        verwijderd = cursor.fetchone()
+        categorie_ids = [verwijderd[0]] if verwijderd else []
+        oude_fotos = verwijderd[1] if verwijderd else []
 
+        meld_catalogus_wijziging(cursor, product_id, categorie_ids)
         conn.commit()
+        invalideer_catalogus(product_id, categorie_ids)
+        ruim_afbeeldingen_op(cursor, oude_fotos)
         flash('Product succesvol verwijderd!', 'success')
     except Exception as e:
         conn.rollback()
         print(f"FOUT bij verwijderen product: {str(e)}")
         flash('Er is een fout opgetreden bij het verwijderen van het product', 'error')
-    finally:
-        if conn:
-            conn.close()
 
     return redirect(url_for('home'))
 
@@ -496,9 +2933,6 @@ def beheren():
                 print(f"Error during login: {e}")
                 flash('Er is een technische fout opgetreden.', 'error')
                 return render_template('login.html')
-            finally:
-                if conn:
-                    conn.close()
         else:
             flash('Kan geen verbinding maken met de database. Probeer het later opnieuw.', 'error')
             return render_template('login.html')
@@ -554,9 +2988,6 @@ def profiel_gebruikersnaam_bewerken():
         print(f"Fout bij bijwerken gebruikersnaam: {e}")
         return jsonify(
             {'message': 'Er is een fout opgetreden bij het bijwerken van je gebruikersnaam', 'category': 'error'})
-    finally:
-        if conn:
-            conn.close()
 
 
 @app.route('/profiel/wachtwoord/bewerken', methods=['POST'])
@@ -601,29 +3032,308 @@ def profiel_wachtwoord_bewerken():
         print(f"Fout bij bijwerken wachtwoord: {e}")
         return jsonify(
             {'message': 'Er is een fout opgetreden bij het bijwerken van je wachtwoord', 'category': 'error'})
-    finally:
-        if conn:
-            conn.close()
 
-            # Configureer static files voor uploads
+
+@app.route('/status/db-pool')
+def status_db_pool():
+    # Monitoring: gebruik en wachttijden van de connection pool van dit worker-proces
+    if not monitoring_toegestaan():
+        abort(403)
+    stats = db_pool_stats()
+    stats['replicas'] = db_replica_stats()
+    stats['pid'] = os.getpid()
+    return jsonify(stats)
+
+
+@app.route('/status/cache')
+def status_cache():
+    if not monitoring_toegestaan():
+        abort(403)
+    stats = catalogus_cache.stats()
+    stats['pagina_cache'] = pagina_cache.stats()
+    stats['pid'] = os.getpid()
+    return jsonify(stats)
+
+
+@app.route('/producten/<int:product_id>/afbeeldingen/status')
+def afbeeldingen_status(product_id):
+    if 'ingelogd' not in session or not session['ingelogd']:
+        return jsonify({'message': 'Niet ingelogd', 'category': 'error'})
+
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'message': 'Databaseverbinding mislukt', 'category': 'error'})
+
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, bestand, status, pogingen, foutmelding, aangemaakt_op, bijgewerkt_op
+        FROM afbeelding_taken
+        WHERE product_id = %s
+        ORDER BY id
+    """, (product_id,))
+    taken = [dict(taak) for taak in cursor.fetchall()]
+    return jsonify({'taken': taken, 'klaar': all(t['status'] == 'klaar' for t in taken)})
+
+
+# Uploads veranderen nooit van inhoud: nieuwe namen zijn de hash van de foto
+# (ab/cd/<hash>[-breedte].ext), oude namen waren willekeurig en eenmalig.
+UPLOAD_HASH_PATROON = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{32}(-\d+)?\.(?:jpg|webp|avif)$')
+UPLOAD_MAX_AGE = 31536000
+
+# Bytes laten versturen door de webserver (sendfile, geen gunicorn-worker bezet):
+# '' = Flask zelf, 'x-accel' = nginx, 'x-sendfile' = Apache/lighttpd. Voor nginx:
+#   location /_uploads/ { internal; alias /var/data/uploads/; }
+UPLOADS_SENDFILE = os.environ.get('UPLOADS_SENDFILE', '')
+UPLOADS_ACCEL_PREFIX = os.environ.get('UPLOADS_ACCEL_PREFIX', '/_uploads/')
+
+
+def onderhandel_afbeelding(filename):
+    # Voor een .jpg met hash-naam de kleinste variant kiezen die de browser accepteert
+    if not filename.endswith('.jpg'):
+        return filename
+    geaccepteerd = {mimetype for mimetype, kwaliteit in request.accept_mimetypes if kwaliteit > 0}
+    extensies = [f[0] for f in AFBEELDING_FORMATEN if f[0] != 'jpg' and f'image/{f[0]}' in geaccepteerd]
+    if not extensies:
+        return filename
+
+    upload_dir = app.config['UPLOAD_FOLDER']
+    varianten = [filename[:-4]]
+    if not UPLOAD_HASH_PATROON.match(filename).group(1):
+        # <basis>.jpg is de grootste variant tot 800px (zie maak_afgeleiden)
+        varianten = [f"{filename[:-4]}-{breedte}" for breedte in AFBEELDING_BREEDTES if breedte <= 800]
+    for variant in varianten:
+        if os.path.exists(os.path.join(upload_dir, variant + '.jpg')):
+            for extensie in extensies:
+                if os.path.exists(os.path.join(upload_dir, f"{variant}.{extensie}")):
+                    return f"{variant}.{extensie}"
+            break
+    return filename
 
 
 @app.route('/static/uploads/<path:filename>')  # Let op: <path:filename> i.p.v. <filename>
 def serve_uploaded_file(filename):
-    # Controleer of het bestand bestaat
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    if not os.path.exists(file_path):
+    content_addressed = bool(UPLOAD_HASH_PATROON.match(filename))
+    if content_addressed:
+        filename = onderhandel_afbeelding(filename)
+
+    # Eén stat in plaats van exists + open: genoeg voor 404, validators en 304
+    file_path = safe_join(app.config['UPLOAD_FOLDER'], filename)
+    try:
+        stat = os.stat(file_path) if file_path else None
+    except OSError:
+        stat = None
+    if not stat or not os.path.isfile(file_path):
         print(f"🚨 Bestand niet gevonden: {file_path}")  # Debug logging
         abort(404)
 
-    # Voeg caching headers toe voor betere performance
-    response = send_from_directory(
-        app.config['UPLOAD_FOLDER'],
-        filename,
-        mimetype='image/jpeg'
-    )
-    response.headers['Cache-Control'] = 'public, max-age=31536000'
+    if content_addressed:
+        # De naam ís de inhoud: sterke ETag zonder het bestand te lezen. Geen
+        # Last-Modified: maak_afgeleiden zet de mtime bij elke dedup-treffer opnieuw
+        etag = os.path.basename(filename)
+        last_modified = None
+        cache_control = f'public, max-age={UPLOAD_MAX_AGE}, immutable'
+    else:
+        etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        last_modified = stat.st_mtime
+        cache_control = f'public, max-age={UPLOAD_MAX_AGE}'
+
+    if request.if_none_match:
+        niet_gewijzigd = request.if_none_match.contains_weak(etag)
+    else:
+        niet_gewijzigd = bool(request.if_modified_since) and last_modified is not None and \
+            int(last_modified) <= request.if_modified_since.timestamp()
+
+    if niet_gewijzigd:
+        response = app.response_class(status=304)
+    elif UPLOADS_SENDFILE in ('x-accel', 'x-sendfile'):
+        response = app.response_class(mimetype=mimetypes.guess_type(filename)[0])
+        if UPLOADS_SENDFILE == 'x-accel':
+            response.headers['X-Accel-Redirect'] = UPLOADS_ACCEL_PREFIX + filename
+        else:
+            response.headers['X-Sendfile'] = file_path
+    else:
+        response = send_file(file_path, etag=False, conditional=False)
+
+    response.set_etag(etag)
+    if last_modified is None:
+        response.headers.pop('Last-Modified', None)
+    else:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = cache_control
+    if content_addressed:
+        response.vary.add('Accept')
+    if not niet_gewijzigd and UPLOADS_SENDFILE not in ('x-accel', 'x-sendfile'):
+        # Range/If-Range (206) op basis van onze eigen validators, niet de mtime
+        # die send_file zelf zou gebruiken
+        response = response.make_conditional(request, accept_ranges=True, complete_length=stat.st_size)
     return response
 
+
+# Statische export: alle publieke pagina's als <pad>/index.html plus de gebruikte
+# afbeeldingen, te serveren door elke statische webserver (ook zonder gunicorn).
+# Incrementeel via een vingerafdruk per product in <uitvoer>/.export.json.
+EXPORT_STATUS_BESTAND = '.export.json'
+
+
+def _export_producten(cursor):
+    cursor.execute(f"""
+        SELECT p.*, c.naam AS categorie_naam, k.kleuren,
+               md5(p::text || k.kleuren::text) AS vingerafdruk
+        FROM producten p
+        JOIN categorieen c ON p.categorie_id = c.id
+        JOIN LATERAL (
+            SELECT json_agg(pk ORDER BY pk.volgorde, pk.id) AS kleuren
+            FROM product_kleuren pk
+            WHERE pk.product_id = p.id AND {KLEUR_KLAAR_SQL}
+        ) k ON k.kleuren IS NOT NULL
+        ORDER BY p.gemaakt_op DESC, p.id DESC
+    """)
+    return [dict(product) for product in cursor.fetchall()]
+
+
+def _export_globaal():
+    # Alles wat op elke pagina staat: menu, templates en statische bestanden
+    h = hashlib.sha1(json.dumps([get_categorieen(), MENU_LABELS], sort_keys=True, default=str).encode())
+    for map_ in (app.template_folder, app.static_folder):
+        for pad, _ in sorted(_scan_bestanden(os.path.join(app.root_path, map_))):
+            with open(os.path.join(app.root_path, map_, pad), 'rb') as f:
+                h.update(pad.encode() + f.read())
+    return h.hexdigest()
+
+
+def _export_pad(uitvoer, url):
+    return safe_join(uitvoer, unquote(url).strip('/'), 'index.html')
+
+
+def _schrijf_export(pad, html):
+    os.makedirs(os.path.dirname(pad), exist_ok=True)
+    with open(pad + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(html)
+    os.replace(pad + '.tmp', pad)
+
+
+def _kopieer_export_afbeeldingen(uitvoer, kleuren):
+    upload_dir = app.config['UPLOAD_FOLDER']
+    aantal = 0
+    for kleur in kleuren:
+        for kolom in ('foto', 'hover_foto'):
+            bestand, varianten = kleur[kolom], kleur[f'{kolom}_varianten']
+            if not bestand:
+                continue
+            bestanden = [bestand]
+            if varianten:
+                bestanden += [f"{varianten['basis']}-{label}.{extensie}"
+                              for extensie in varianten['formaten'] for label in varianten['breedtes']]
+            for naam in bestanden:
+                doel = safe_join(uitvoer, 'static', 'uploads', naam)
+                # Uploadnamen veranderen nooit van inhoud: bestaat hij, dan klopt hij
+                if not doel or os.path.exists(doel):
+                    continue
+                os.makedirs(os.path.dirname(doel), exist_ok=True)
+                try:
+                    os.link(os.path.join(upload_dir, naam), doel)
+                except FileNotFoundError:
+                    print(f"Afbeelding ontbreekt voor export: {naam}")
+                    continue
+                except OSError:
+                    shutil.copy2(os.path.join(upload_dir, naam), doel)
+                aantal += 1
+    return aantal
+
+
+@app.cli.command('export-static')
+@click.option('--uitvoer', default='export', show_default=True, type=click.Path(file_okay=False),
+              help='Map voor de statische site.')
+@click.option('--volledig', is_flag=True, help='Alles opnieuw genereren, ook ongewijzigde pagina\'s.')
+def export_static_command(uitvoer, volledig):
+    """Genereer de publieke catalogus als statische site (incrementeel)."""
+    uitvoer = os.path.abspath(uitvoer)
+    status_pad = os.path.join(uitvoer, EXPORT_STATUS_BESTAND)
+    # Ook bij een volledige export: de vorige status zegt welke pagina's weg moeten
+    status = {}
+    if os.path.exists(status_pad):
+        with open(status_pad, encoding='utf-8') as f:
+            status = json.load(f)
+
+    if not laad_categorieen():
+        raise click.ClickException('Kon de categorieën niet laden')
+    globaal = _export_globaal()
+    volledig = volledig or status.get('globaal') != globaal
+    vorige = status.get('producten', {})
+
+    with db_verbinding() as conn:
+        producten = _export_producten(conn.cursor(cursor_factory=DictCursor))
+        conn.rollback()
+
+    huidig = {str(p['id']): {'categorie': p['categorie_naam'], 'vingerafdruk': p['vingerafdruk']}
+              for p in producten}
+    gewijzigd = [p for p in producten if volledig or vorige.get(str(p['id'])) != huidig[str(p['id'])]]
+    verdwenen = {product_id: oud for product_id, oud in vorige.items() if product_id not in huidig}
+
+    # Een overzicht moet opnieuw als er een product in komt, uit gaat of wijzigt
+    alle_categorieen = [c['naam'] for c in get_categorieen()]
+    categorieen = alle_categorieen
+    if not volledig:
+        geraakt = {p['categorie_naam'] for p in gewijzigd}
+        geraakt |= {vorige[str(p['id'])]['categorie'] for p in gewijzigd if str(p['id']) in vorige}
+        geraakt |= {oud['categorie'] for oud in verdwenen.values()}
+        categorieen = [c for c in categorieen if c in geraakt]
+
+    client = app.test_client()
+    with app.test_request_context():
+        urls = {
+            'product': {p['id']: url_for('product_detail', categorie=p['categorie_naam'], product_id=p['id'])
+                        for p in gewijzigd},
+            'oud': [url_for('product_detail', categorie=oud['categorie'], product_id=int(product_id))
+                    for product_id, oud in vorige.items()
+                    if product_id in verdwenen or oud['categorie'] != huidig[product_id]['categorie']],
+        }
+
+    if volledig:
+        shutil.copytree(app.static_folder, os.path.join(uitvoer, 'static'), dirs_exist_ok=True)
+        for endpoint in ('home', 'contact'):
+            with app.test_request_context():
+                url = url_for(endpoint)
+            _schrijf_export(_export_pad(uitvoer, url), client.get(url).get_data(as_text=True))
+
+    # Overzichten met alle producten op één pagina: een statische server kent geen ?na=
+    for naam in categorieen:
+        with app.test_request_context():
+            url = url_for('producten_per_categorie', categorie=naam)
+            html = render_template('producten.html',
+                                   producten=[p for p in producten if p['categorie_naam'] == naam],
+                                   categorie=naam, zoekterm='', volgende=None,
+                                   per_pagina=PRODUCTEN_PER_PAGINA)
+        _schrijf_export(_export_pad(uitvoer, url), html)
+
+    for naam in set(status.get('categorieen', [])) - set(alle_categorieen):
+        with app.test_request_context():
+            shutil.rmtree(os.path.dirname(_export_pad(uitvoer, url_for('producten_per_categorie', categorie=naam))),
+                          ignore_errors=True)
+
+    for url in urls['oud']:
+        shutil.rmtree(os.path.dirname(_export_pad(uitvoer, url)), ignore_errors=True)
+
+    afbeeldingen = 0
+    for product in gewijzigd:
+        url = urls['product'][product['id']]
+        response = client.get(url)
+        if response.status_code != 200:
+            print(f"Export van {url} mislukt: {response.status_code}")
+            continue
+        _schrijf_export(_export_pad(uitvoer, url), response.get_data(as_text=True))
+        afbeeldingen += _kopieer_export_afbeeldingen(uitvoer, product['kleuren'])
+
+    _schrijf_export(status_pad, json.dumps({
+        'globaal': globaal,
+        'categorieen': alle_categorieen,
+        'producten': huidig,
+        'geexporteerd_op': datetime.now().isoformat(),
+    }))
+    click.echo(f"{'Volledige' if volledig else 'Incrementele'} export naar {uitvoer}: "
+               f"{len(categorieen)} overzicht(en), {len(gewijzigd)} product(en), "
+               f"{len(verdwenen)} verwijderd, {afbeeldingen} afbeelding(en) gekopieerd.")
+
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,65 @@
+# Wall-time van save_image (serieel) tegenover save_images (process pool) voor
+# 2, 10 en 40 uploads in één request.
+#
+#   python benchmarks/afbeeldingen_batch.py [--megapixels 12] [--aantallen 2,10,40]
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import app  # noqa: E402
+
+
+def maak_foto(megapixels):
+    # Ruis over een verloop comprimeert ongeveer zoals een echte telefoonfoto
+    breedte = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    hoogte = int(breedte * 3 / 4)
+    kanalen = [Image.linear_gradient('L').resize((breedte, hoogte)),
+               Image.effect_noise((breedte, hoogte), 40),
+               Image.radial_gradient('L').resize((breedte, hoogte))]
+    buffer = io.BytesIO()
+    Image.merge('RGB', kanalen).save(buffer, 'JPEG', quality=92)
+    return buffer.getvalue()
+
+
+def uploads(data, aantal):
+    return [FileStorage(io.BytesIO(data), filename=f'foto{i}.jpg') for i in range(aantal)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--megapixels', type=float, default=12)
+    parser.add_argument('--aantallen', default='2,10,40')
+    args = parser.parse_args()
+
+    uploadmap = tempfile.mkdtemp(prefix='bench-uploads-')
+    app.app.config['UPLOAD_FOLDER'] = uploadmap
+    data = maak_foto(args.megapixels)
+
+    print(f"{args.megapixels:g} MP JPEG ({len(data) / 1e6:.1f} MB), {app.AFBEELDING_PROCESSEN} processen")
+    print(f"{'aantal':>6} {'serieel (s)':>12} {'parallel (s)':>13} {'versnelling':>12}")
+    try:
+        for aantal in (int(a) for a in args.aantallen.split(',')):
+            start = time.perf_counter()
+            for upload in uploads(data, aantal):
+                app.save_image(upload)
+            serieel = time.perf_counter() - start
+
+            start = time.perf_counter()
+            app.save_images(uploads(data, aantal))
+            parallel = time.perf_counter() - start
+
+            print(f"{aantal:>6} {serieel:>12.2f} {parallel:>13.2f} {serieel / parallel:>11.1f}x")
+    finally:
+        shutil.rmtree(uploadmap)
+
+
+if __name__ == '__main__':
+    main()
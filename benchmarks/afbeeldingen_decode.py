@@ -0,0 +1,113 @@
+# Tijd per afbeelding en piek-RSS van het decoderen en verkleinen van een
+# telefoonfoto: de oude aanpak (volledig decoderen, dan thumbnail) tegenover
+# laad_afbeelding (draft/reduce + exif_transpose). Elke variant draait in een
+# eigen proces, zodat de piek-RSS (VmHWM) alleen die variant meet.
+#
+#   python benchmarks/afbeeldingen_decode.py [--megapixels 12,24] [--herhalingen 5]
+import argparse
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import app  # noqa: E402
+
+
+def maak_foto(megapixels):
+    breedte = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    hoogte = int(breedte * 3 / 4)
+    kanalen = [Image.linear_gradient('L').resize((breedte, hoogte)),
+               Image.effect_noise((breedte, hoogte), 40),
+               Image.radial_gradient('L').resize((breedte, hoogte))]
+    exif = Image.Exif()
+    exif[0x0112] = 6  # staand gefotografeerd
+    buffer = io.BytesIO()
+    Image.merge('RGB', kanalen).save(buffer, 'JPEG', quality=92, exif=exif)
+    return buffer.getvalue()
+
+
+def voor(data, max_zijde):
+    # De pijplijn zoals save_image hem had vóór draft/reduce
+    img = Image.open(io.BytesIO(data))
+    exif = img._getexif()
+    if exif:
+        orientation = exif.get(0x0112)
+        if orientation == 3:
+            img = img.rotate(180, expand=True)
+        elif orientation == 6:
+            img = img.rotate(270, expand=True)
+        elif orientation == 7:
+            img = img.rotate(90, expand=True)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.thumbnail((max_zijde, max_zijde), Image.LANCZOS)
+    return img
+
+
+def na(data, max_zijde):
+    img = app.laad_afbeelding(io.BytesIO(data), max_zijde)
+    img.thumbnail((max_zijde, max_zijde), Image.LANCZOS)
+    return img
+
+
+def piek_rss_kb():
+    # ru_maxrss wordt op Linux over fork/exec van de ouder geërfd; VmHWM niet
+    try:
+        with open('/proc/self/status') as status:
+            for regel in status:
+                if regel.startswith('VmHWM:'):
+                    return int(regel.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def meet(variant, pad, herhalingen):
+    with open(pad, 'rb') as f:
+        data = f.read()
+    functie = {'voor': voor, 'na': na}[variant]
+    max_zijde = max(app.AFBEELDING_BREEDTES)
+
+    rss_start = piek_rss_kb()
+    start = time.perf_counter()
+    for _ in range(herhalingen):
+        functie(data, max_zijde)
+    per_afbeelding = (time.perf_counter() - start) / herhalingen
+    rss_piek = piek_rss_kb()
+    print(f"{per_afbeelding * 1000:.0f} {(rss_piek - rss_start) / 1024:.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--megapixels', default='12,24')
+    parser.add_argument('--herhalingen', type=int, default=5)
+    parser.add_argument('--variant', help=argparse.SUPPRESS)
+    parser.add_argument('--pad', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        meet(args.variant, args.pad, args.herhalingen)
+        return
+
+    print(f"{'MP':>4} {'variant':>8} {'ms/afbeelding':>14} {'extra piek-RSS (MB)':>20}")
+    for megapixels in args.megapixels.split(','):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as foto:
+            foto.write(maak_foto(float(megapixels)))
+            foto.flush()
+            for variant in ('voor', 'na'):
+                uitvoer = subprocess.run(
+                    [sys.executable, __file__, '--variant', variant, '--pad', foto.name,
+                     '--herhalingen', str(args.herhalingen)],
+                    check=True, capture_output=True, text=True
+                ).stdout.split()
+                print(f"{megapixels:>4} {variant:>8} {uitvoer[0]:>14} {uitvoer[1]:>20}")
+
+
+if __name__ == '__main__':
+    main()
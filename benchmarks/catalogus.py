@@ -0,0 +1,373 @@
+# Latency (p50/p95/p99), doorvoer en queries per request van de catalogusroutes
+# op een synthetische catalogus van 100, 1.000 en 10.000 producten. Per grootte:
+#
+#   client  de Flask test client in dit proces, met lege caches ("koud") en met
+#           gevulde caches ("warm"), plus save_image los;
+#   http    met --http ook onder load via HTTP tegen gunicorn (--workers), met
+#           --gelijktijdig verbindingen gedurende --duur seconden.
+#
+# De queries per request komen uit de Server-Timing header. De database in
+# BENCH_DATABASE_URL wordt gemigreerd en LEEGGEMAAKT; gebruik er een aparte voor.
+#
+#   BENCH_DATABASE_URL=postgresql:///liesbet_bench python benchmarks/catalogus.py \
+#       [--groottes 100,1000,10000] [--kleuren 3] [--http] [--bewaar benchmarks/baseline.json]
+#       [--vergelijk benchmarks/baseline.json] [--drempel 0.2]
+#
+# Met --vergelijk wordt elke meting naast de baseline gezet; de exitcode is 1 als
+# een p95 meer dan --drempel slechter is of een route meer queries doet.
+import argparse
+import http.client
+import io
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+if not os.environ.get('BENCH_DATABASE_URL'):
+    sys.exit('Zet BENCH_DATABASE_URL op een aparte database; die wordt leeggemaakt.')
+os.environ['DATABASE_URL'] = os.environ['BENCH_DATABASE_URL']
+os.environ['SERVER_TIMING'] = '1'
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO)
+import app  # noqa: E402
+import psycopg2  # noqa: E402
+from psycopg2.extras import Json, execute_values  # noqa: E402
+
+CATEGORIEEN = ['Oorbellen', 'Kettingen', 'Armbanden', 'Ringen', 'Moeder-Dochter']
+SOORTEN = {'Oorbellen': 'Oorbel', 'Kettingen': 'Ketting', 'Armbanden': 'Armband', 'Ringen': 'Ring',
+           'Moeder-Dochter': 'Set'}
+NAMEN = ['Luna', 'Stella', 'Flora', 'Iris', 'Nova', 'Mila', 'Sol', 'Bloem', 'Parel', 'Golf']
+KLEUREN = ['goud', 'zilver', 'rosé', 'zwart', 'wit', 'groen', 'blauw', 'rood']
+QUERIES_PATROON = re.compile(r'desc="(\d+) queries"')
+
+
+def maak_foto(breedte=1600, hoogte=1200):
+    kanalen = [Image.linear_gradient('L').resize((breedte, hoogte)),
+               Image.effect_noise((breedte, hoogte), 40),
+               Image.radial_gradient('L').resize((breedte, hoogte))]
+    buffer = io.BytesIO()
+    Image.merge('RGB', kanalen).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def vul_database(aantal, kleuren_per_product, foto, rng):
+    # Alle varianten delen één foto: de routes lezen alleen het manifest
+    resultaat = app.app.test_cli_runner().invoke(args=['migreer'])
+    if resultaat.exit_code != 0:
+        sys.exit(f"Migreren mislukt:\n{resultaat.output}")
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cursor = conn.cursor()
+    cursor.execute("TRUNCATE product_kleuren, afbeelding_taken, producten, categorieen RESTART IDENTITY CASCADE")
+    categorie_ids = [rij[0] for rij in execute_values(
+        cursor, "INSERT INTO categorieen (naam) VALUES %s RETURNING id", [(naam,) for naam in CATEGORIEEN],
+        fetch=True
+    )]
+
+    start = datetime(2024, 1, 1)
+    for begin in range(0, aantal, 1000):
+        producten = []
+        for i in range(begin, min(begin + 1000, aantal)):
+            categorie = rng.randrange(len(CATEGORIEEN))
+            naam = f"{SOORTEN[CATEGORIEEN[categorie]]} {rng.choice(NAMEN)} {i}"
+            producten.append((naam, f"{naam} in handgemaakte uitvoering.", round(rng.uniform(9, 250), 2),
+                              categorie_ids[categorie], start + timedelta(minutes=i)))
+        product_ids = execute_values(
+            cursor,
+            "INSERT INTO producten (naam, beschrijving, prijs, categorie_id, gemaakt_op) VALUES %s RETURNING id",
+            producten, page_size=len(producten), fetch=True
+        )
+        execute_values(
+            cursor,
+            """
+            INSERT INTO product_kleuren
+                (product_id, kleur_naam, foto, hover_foto, foto_varianten, hover_foto_varianten)
+            VALUES %s
+            """,
+            [(product_id, kleur, foto['bestand'], foto['bestand'], Json(foto), Json(foto))
+             for (product_id,) in product_ids for kleur in rng.sample(KLEUREN, kleuren_per_product)],
+            page_size=1000
+        )
+    cursor.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+def leeg_caches():
+    app.catalogus_cache.clear()
+    app.pagina_cache.clear()
+
+
+def paden(aantal, rng, herhalingen):
+    # Dezelfde reeks paden voor elke modus, zodat de metingen vergelijkbaar zijn
+    resultaat = {'categorie': [], 'categorie_zoeken': [], 'product_detail': [], 'zoeken': [], 'api_producten': []}
+    for _ in range(herhalingen):
+        product_id = rng.randint(1, aantal)
+        categorie = rng.choice(CATEGORIEEN)
+        resultaat['categorie'].append(f"/producten/{categorie}")
+        resultaat['categorie_zoeken'].append(f"/producten/{categorie}?q={rng.choice(NAMEN).lower()}")
+        # De categorie in het pad doet voor de detailpagina niet ter zake
+        resultaat['product_detail'].append(f"/producten/{categorie}/{product_id}")
+        resultaat['zoeken'].append(f"/zoeken?q={rng.choice(NAMEN).lower()}")
+        resultaat['api_producten'].append(f"/api/producten?categorie={categorie}")
+    return resultaat
+
+
+def samenvatting(latencies, queries, duur=None):
+    latencies = sorted(latencies)
+    percentielen = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 \
+        else latencies * 99
+    return {
+        'aantal': len(latencies),
+        'p50': percentielen[49] * 1000,
+        'p95': percentielen[94] * 1000,
+        'p99': percentielen[98] * 1000,
+        'per_seconde': len(latencies) / (duur if duur is not None else sum(latencies)),
+        'queries': statistics.mean(queries) if queries else 0,
+    }
+
+
+def queries_uit(server_timing):
+    match = QUERIES_PATROON.search(server_timing or '')
+    return int(match.group(1)) if match else 0
+
+
+def meet_client(route_paden, koud):
+    client = app.app.test_client()
+    # Eén keer vooraf: het categorie-register en de pool opwarmen
+    client.get(route_paden[0])
+    latencies, queries = [], []
+    for pad in route_paden:
+        if koud:
+            leeg_caches()
+        start = time.perf_counter()
+        response = client.get(pad)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            sys.exit(f"{pad}: status {response.status_code}")
+        queries.append(queries_uit(response.headers.get('Server-Timing')))
+    return samenvatting(latencies, queries)
+
+
+def meet_save_image(foto_data, herhalingen):
+    # Elke upload net iets anders, anders is het na de eerste een dedup-treffer
+    basis = Image.open(io.BytesIO(foto_data))
+    uploads = []
+    for i in range(herhalingen):
+        img = basis.copy()
+        img.putpixel((0, 0), (i % 256, i // 256 % 256, 0))
+        buffer = io.BytesIO()
+        img.save(buffer, 'JPEG', quality=90)
+        uploads.append(buffer.getvalue())
+
+    latencies = []
+    for data in uploads:
+        start = time.perf_counter()
+        if app.save_image(FileStorage(io.BytesIO(data), filename='foto.jpg')) is None:
+            sys.exit('save_image mislukt')
+        latencies.append(time.perf_counter() - start)
+    return samenvatting(latencies, [])
+
+
+def vrije_poort():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(workers, *opties, env=None):
+    poort = vrije_poort()
+    proces = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--bind', f'127.0.0.1:{poort}',
+         '--log-level', 'warning', *opties, 'app:app'],
+        cwd=REPO, env=env
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proces.poll() is not None:
+            sys.exit('gunicorn is niet gestart')
+        try:
+            verbinding = http.client.HTTPConnection('127.0.0.1', poort, timeout=5)
+            verbinding.request('GET', '/metrics')
+            verbinding.getresponse().read()
+            return proces, poort
+        except OSError:
+            time.sleep(0.2)
+    proces.terminate()
+    sys.exit('gunicorn reageert niet')
+
+
+def meet_http(poort, route_paden, gelijktijdig, duur):
+    latencies, queries, fouten = [], [], []
+    lock = threading.Lock()
+    einde = time.monotonic() + duur
+
+    def belast(n):
+        # Elke verbinding loopt de paden vanaf een ander punt af
+        verbinding = http.client.HTTPConnection('127.0.0.1', poort, timeout=30)
+        i = n
+        eigen_latencies, eigen_queries = [], []
+        while time.monotonic() < einde:
+            pad = route_paden[i % len(route_paden)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                verbinding.request('GET', pad)
+                response = verbinding.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException) as e:
+                verbinding.close()
+                with lock:
+                    fouten.append(str(e))
+                continue
+            eigen_latencies.append(time.perf_counter() - start)
+            if response.status != 200:
+                with lock:
+                    fouten.append(f"{pad}: status {response.status}")
+            eigen_queries.append(queries_uit(response.getheader('Server-Timing')))
+        verbinding.close()
+        with lock:
+            latencies.extend(eigen_latencies)
+            queries.extend(eigen_queries)
+
+    threads = [threading.Thread(target=belast, args=(n,)) for n in range(gelijktijdig)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if fouten:
+        print(f"  {len(fouten)} fouten, bijvoorbeeld: {fouten[0]}")
+    if not latencies:
+        sys.exit('Geen enkel request gelukt')
+    return samenvatting(latencies, queries, time.perf_counter() - start)
+
+
+def toon(sleutel, meting, baseline):
+    regel = (f"{sleutel:<40} {meting['aantal']:>6} {meting['p50']:>8.1f} {meting['p95']:>8.1f} "
+             f"{meting['p99']:>8.1f} {meting['per_seconde']:>8.0f} {meting['queries']:>8.1f}")
+    oud = baseline.get(sleutel)
+    if oud:
+        regel += f" {(meting['p95'] - oud['p95']) / oud['p95'] * 100:>+8.0f}%"
+    print(regel)
+
+
+def regressies(resultaten, baseline, drempel):
+    gevonden = []
+    for sleutel, meting in resultaten.items():
+        oud = baseline.get(sleutel)
+        if not oud:
+            continue
+        if meting['p95'] > oud['p95'] * (1 + drempel):
+            gevonden.append(f"{sleutel}: p95 {oud['p95']:.1f} -> {meting['p95']:.1f} ms")
+        # Gemiddelden: in de warme modus hangt het af van welke paden al in de cache stonden
+        if meting['queries'] >= oud['queries'] + 0.5:
+            gevonden.append(f"{sleutel}: queries {oud['queries']:.1f} -> {meting['queries']:.1f}")
+    return gevonden
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--groottes', default='100,1000,10000')
+    parser.add_argument('--kleuren', type=int, default=3, help='Kleurvarianten per product.')
+    parser.add_argument('--herhalingen', type=int, default=200, help='Requests per route en modus (client).')
+    parser.add_argument('--uploads', type=int, default=10, help='Aantal save_image-aanroepen.')
+    parser.add_argument('--http', action='store_true', help='Ook onder load via gunicorn meten.')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--gelijktijdig', type=int, default=16)
+    parser.add_argument('--duur', type=float, default=10, help='Seconden load per route (http).')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--bewaar', help='Resultaten als baseline naar dit JSON-bestand schrijven.')
+    parser.add_argument('--vergelijk', help='Vergelijken met deze baseline.')
+    parser.add_argument('--drempel', type=float, default=0.2, help='Toegestane p95-verslechtering (0.2 = 20%%).')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.vergelijk:
+        with open(args.vergelijk, encoding='utf-8') as f:
+            baseline = json.load(f)['resultaten']
+
+    uploadmap = tempfile.mkdtemp(prefix='bench-uploads-')
+    app.app.config['UPLOAD_FOLDER'] = uploadmap
+    foto_data = maak_foto()
+    foto = app.maak_afgeleiden(io.BytesIO(foto_data))
+    foto.pop('nieuw')
+
+    resultaten = {}
+    print(f"{'meting':<40} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'queries':>8}"
+          + (f" {'p95 Δ':>9}" if baseline else ''))
+    try:
+        sleutel = 'save_image'
+        resultaten[sleutel] = meet_save_image(foto_data, args.uploads)
+        toon(sleutel, resultaten[sleutel], baseline)
+
+        for aantal in (int(a) for a in args.groottes.split(',')):
+            rng = random.Random(args.seed)
+            vul_database(aantal, args.kleuren, foto, rng)
+            app.markeer_categorieen_verouderd()
+            route_paden = paden(aantal, rng, args.herhalingen)
+
+            for modus in ('koud', 'warm'):
+                leeg_caches()
+                for route, lijst in route_paden.items():
+                    sleutel = f"{aantal}/client-{modus}/{route}"
+                    resultaten[sleutel] = meet_client(lijst, koud=modus == 'koud')
+                    toon(sleutel, resultaten[sleutel], baseline)
+
+            if args.http:
+                proces, poort = start_gunicorn(args.workers)
+                try:
+                    for route, lijst in route_paden.items():
+                        sleutel = f"{aantal}/http-w{args.workers}-c{args.gelijktijdig}/{route}"
+                        resultaten[sleutel] = meet_http(poort, lijst, args.gelijktijdig, args.duur)
+                        toon(sleutel, resultaten[sleutel], baseline)
+                finally:
+                    proces.terminate()
+                    proces.wait()
+    finally:
+        app.catalogus_cache.clear()
+        shutil.rmtree(uploadmap, ignore_errors=True)
+
+    if args.bewaar:
+        with open(args.bewaar, 'w', encoding='utf-8') as f:
+            json.dump({
+                'gemeten_op': datetime.now().isoformat(timespec='seconds'),
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'cpu': os.cpu_count(),
+                'instellingen': {k: v for k, v in vars(args).items() if k not in ('bewaar', 'vergelijk')},
+                'resultaten': resultaten,
+            }, f, indent=2, sort_keys=True)
+        print(f"Baseline geschreven naar {args.bewaar}")
+
+    if baseline:
+        gevonden = regressies(resultaten, baseline, args.drempel)
+        for regel in gevonden:
+            print(f"Regressie: {regel}")
+        sys.exit(1 if gevonden else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+# Gelijktijdige verbindingen per GB geheugen: gewone gunicorn-workers (sync)
+# tegenover gevent-workers (zie GROENE_THREADS in app.py). Start gunicorn per
+# modus, zet er steeds meer gelijktijdige keep-alive verbindingen op en meet
+# doorvoer, latency, fouten en het piekgeheugen (PSS, dus gedeelde pagina's na
+# de fork niet dubbel geteld; alleen Linux) van master plus workers.
+#
+# Lokaal is alles CPU: Postgres antwoordt in microseconden en dan wint gevent
+# niets. In productie staat de database een netwerkhop verderop; daarom loopt
+# het verkeer van gunicorn naar Postgres hier via een proxy die elk pakket
+# --db-latentie seconden (round trip) vertraagt. Met --denktijd stuurt elke
+# klant de rest van zijn headers pas na zoveel seconden, zoals een trage
+# mobiele bezoeker zonder bufferende proxy ervoor. De paden zijn die van
+# benchmarks/catalogus.py plus de foto's via serve_uploaded_file. Net als
+# catalogus.py maakt dit BENCH_DATABASE_URL leeg.
+#
+#   BENCH_DATABASE_URL=postgresql:///liesbet_bench python benchmarks/gelijktijdig.py \
+#       [--modi sync:4,sync:16,gevent:4] [--gelijktijdig 16,64,256,1024] [--db-latentie 0.005]
+import argparse
+import asyncio
+import io
+import os
+import random
+import resource
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+import catalogus
+from catalogus import app, psycopg2
+
+
+def processen(pid):
+    # De master en al zijn (klein)kinderen
+    kinderen = {}
+    for naam in os.listdir('/proc'):
+        if naam.isdigit():
+            try:
+                with open(f'/proc/{naam}/stat') as f:
+                    ouder = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            kinderen.setdefault(ouder, []).append(int(naam))
+    resultaat, open_pids = [], [pid]
+    while open_pids:
+        huidig = open_pids.pop()
+        resultaat.append(huidig)
+        open_pids.extend(kinderen.get(huidig, []))
+    return resultaat
+
+
+def geheugen_mb(pid):
+    totaal = 0
+    for p in processen(pid):
+        try:
+            with open(f'/proc/{p}/smaps_rollup') as f:
+                totaal += sum(int(regel.split()[1]) for regel in f if regel.startswith('Pss:'))
+        except OSError:
+            pass
+    return totaal / 1024
+
+
+class GeheugenMeter(threading.Thread):
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.piek = geheugen_mb(pid)
+        self.stoppen = threading.Event()
+
+    def run(self):
+        while not self.stoppen.wait(0.5):
+            self.piek = max(self.piek, geheugen_mb(self.pid))
+
+    def stop(self):
+        self.stoppen.set()
+        self.join()
+        return max(self.piek, geheugen_mb(self.pid))
+
+
+class VertragendeProxy(threading.Thread):
+    # TCP-proxy naar Postgres (ook naar een Unix-socket) die elk stuk data pas na
+    # de halve round trip doorgeeft, in volgorde
+    def __init__(self, dsn, latentie):
+        super().__init__(daemon=True)
+        parameters = psycopg2.extensions.parse_dsn(dsn)
+        host = parameters.get('host', '/var/run/postgresql')
+        poort = int(parameters.get('port', 5432))
+        self.doel = (None, f'{host}/.s.PGSQL.{poort}') if host.startswith('/') else (host, poort)
+        self.vertraging = latentie / 2
+        self.poort = catalogus.vrije_poort()
+        self.dsn = psycopg2.extensions.make_dsn(dsn, host='127.0.0.1', port=self.poort)
+        self.gestart = threading.Event()
+
+    async def pomp(self, reader, writer):
+        wachtrij = asyncio.Queue()
+
+        async def schrijf():
+            while (item := await wachtrij.get()) is not None:
+                moment, data = item
+                await asyncio.sleep(moment - time.monotonic())
+                writer.write(data)
+                await writer.drain()
+            writer.close()
+
+        schrijver = asyncio.create_task(schrijf())
+        try:
+            while data := await reader.read(65536):
+                wachtrij.put_nowait((time.monotonic() + self.vertraging, data))
+        except OSError:
+            pass
+        wachtrij.put_nowait(None)
+        await schrijver
+
+    async def verbind(self, reader, writer):
+        host, pad = self.doel
+        try:
+            if host is None:
+                doel_reader, doel_writer = await asyncio.open_unix_connection(pad)
+            else:
+                doel_reader, doel_writer = await asyncio.open_connection(host, pad)
+        except OSError:
+            writer.close()
+            return
+        await asyncio.gather(self.pomp(reader, doel_writer), self.pomp(doel_reader, writer),
+                             return_exceptions=True)
+
+    async def serveer(self):
+        server = await asyncio.start_server(self.verbind, '127.0.0.1', self.poort)
+        self.gestart.set()
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        asyncio.run(self.serveer())
+
+
+async def lees_response(reader):
+    kop = await reader.readuntil(b'\r\n\r\n')
+    regels = kop.decode('latin-1').split('\r\n')
+    status = int(regels[0].split()[1])
+    headers = {}
+    for regel in regels[1:]:
+        if ':' in regel:
+            naam, waarde = regel.split(':', 1)
+            headers[naam.strip().lower()] = waarde.strip().lower()
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            grootte = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(grootte + 2)
+            if grootte == 0:
+                break
+    elif status not in (204, 304):
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection') == 'close'
+
+
+async def belast(poort, route_paden, gelijktijdig, duur, denktijd, timeout):
+    latencies, fouten = [], []
+    einde = time.monotonic() + duur
+
+    async def klant(n):
+        reader = writer = None
+        i = n
+        while time.monotonic() < einde:
+            pad = route_paden[i % len(route_paden)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', poort), timeout)
+                writer.write(f'GET {pad} HTTP/1.1\r\n'.encode())
+                await writer.drain()
+                if denktijd:
+                    await asyncio.sleep(denktijd)
+                writer.write(b'Host: localhost\r\nAccept: image/avif,image/webp,*/*\r\n\r\n')
+                status, sluiten = await asyncio.wait_for(lees_response(reader), timeout)
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                    ValueError) as e:
+                fouten.append(type(e).__name__)
+                if writer is not None:
+                    writer.close()
+                reader = writer = None
+                continue
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                fouten.append(f'status {status}')
+            if sluiten:
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(klant(n) for n in range(gelijktijdig)))
+    return latencies, fouten, time.perf_counter() - start
+
+
+def meet(poort, pid, route_paden, gelijktijdig, args):
+    meter = GeheugenMeter(pid)
+    meter.start()
+    # Eerst opwarmen (verbindingen in de pool, templates), niet meegeteld
+    asyncio.run(belast(poort, route_paden, gelijktijdig, min(2, args.duur), args.denktijd, args.timeout))
+    latencies, fouten, duur = asyncio.run(
+        belast(poort, route_paden, gelijktijdig, args.duur, args.denktijd, args.timeout)
+    )
+    piek = meter.stop()
+    aantal = len(latencies) + sum(1 for f in fouten if not f.startswith('status'))
+    if len(latencies) >= 2:
+        kwantielen = statistics.quantiles(latencies, n=100, method='inclusive')
+        p50, p95 = kwantielen[49], kwantielen[94]
+    else:
+        p50 = p95 = float('inf')
+    return {
+        'per_seconde': len(latencies) / duur,
+        'p50': p50 * 1000,
+        'p95': p95 * 1000,
+        'foutfractie': len(fouten) / aantal if aantal else 1.0,
+        'fouten': fouten,
+        'geheugen_mb': piek,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modi', default='sync:4,sync:16,gevent:4',
+                        help='Kommagescheiden <workerklasse>:<workers>.')
+    parser.add_argument('--gelijktijdig', default='16,64,256,1024')
+    parser.add_argument('--producten', type=int, default=1000)
+    parser.add_argument('--db-latentie', type=float, default=0.005, help='Round trip naar Postgres in seconden.')
+    parser.add_argument('--denktijd', type=float, default=0, help='Seconden tussen request-regel en headers.')
+    parser.add_argument('--duur', type=float, default=10, help='Seconden load per stap.')
+    parser.add_argument('--timeout', type=float, default=10, help='Client-timeout per request.')
+    parser.add_argument('--max-p95', type=float, default=2000, help='Norm voor p95 in ms.')
+    parser.add_argument('--max-fouten', type=float, default=0.01, help='Norm voor de foutfractie.')
+    parser.add_argument('--zonder-cache', action='store_true', help='Catalogus- en paginacache uitzetten.')
+    parser.add_argument('--worker-connections', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    # Duizenden sockets aan beide kanten; gunicorn erft de limiet
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    rng = random.Random(args.seed)
+    uploadmap = tempfile.mkdtemp(prefix='bench-uploads-')
+    app.app.config['UPLOAD_FOLDER'] = uploadmap
+    foto = app.maak_afgeleiden(io.BytesIO(catalogus.maak_foto()))
+    foto.pop('nieuw')
+    catalogus.vul_database(args.producten, 3, foto, rng)
+    route_paden = [pad for lijst in zip(*catalogus.paden(args.producten, rng, 200).values()) for pad in lijst]
+    # Na elke pagina vijf foto's (alle formaten en breedtes), zoals een browser die
+    # de pagina opbouwt
+    fotopaden = [f"/static/uploads/{foto['basis']}-{label}.{extensie}"
+                 for extensie in foto['formaten'] for label in foto['breedtes']]
+    route_paden = [pad for i, pagina in enumerate(route_paden)
+                   for pad in [pagina] + [fotopaden[(i * 5 + j) % len(fotopaden)] for j in range(5)]]
+
+    # De load zelf maakt queries traag; die niet allemaal loggen
+    env = dict(os.environ, UPLOAD_FOLDER=uploadmap, TRAGE_QUERY_MS='60000')
+    if args.db_latentie:
+        proxy = VertragendeProxy(env['DATABASE_URL'], args.db_latentie)
+        proxy.start()
+        proxy.gestart.wait()
+        env['DATABASE_URL'] = env['CACHE_NOTIFY_URL'] = proxy.dsn
+    if args.zonder_cache:
+        env['CACHE_MAX_ITEMS'] = env['PAGINA_CACHE_MAX_ITEMS'] = '0'
+    samenvattingen = []
+    print(f"{'modus':<12} {'verbindingen':>12} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'fouten':>7} "
+          f"{'geheugen MB':>12} {'verb./GB':>9}")
+    try:
+        for modus in args.modi.split(','):
+            klasse, workers = modus.split(':')
+            opties = ['--worker-class', klasse]
+            if klasse != 'sync':
+                opties += ['--worker-connections', str(args.worker_connections)]
+            proces, poort = catalogus.start_gunicorn(int(workers), *opties, env=env)
+            beste = None
+            try:
+                for gelijktijdig in (int(g) for g in args.gelijktijdig.split(',')):
+                    app.catalogus_cache.clear()
+                    meting = meet(poort, proces.pid, route_paden, gelijktijdig, args)
+                    per_gb = gelijktijdig / (meting['geheugen_mb'] / 1024)
+                    binnen_norm = meting['p95'] <= args.max_p95 and meting['foutfractie'] <= args.max_fouten
+                    print(f"{modus:<12} {gelijktijdig:>12} {meting['per_seconde']:>8.1f} {meting['p50']:>8.1f} "
+                          f"{meting['p95']:>8.1f} {meting['foutfractie']:>7.1%} {meting['geheugen_mb']:>12.0f} "
+                          f"{per_gb:>9.0f}" + ('' if binnen_norm else '  buiten norm'))
+                    if meting['fouten']:
+                        soorten = sorted(set(meting['fouten']), key=meting['fouten'].count, reverse=True)
+                        tellingen = ', '.join(f"{soort} ({meting['fouten'].count(soort)})" for soort in soorten[:3])
+                        print(f"{'':<12} fouten: {tellingen}")
+                    if binnen_norm:
+                        beste = (gelijktijdig, meting['geheugen_mb'], per_gb)
+            finally:
+                proces.terminate()
+                proces.wait()
+            samenvattingen.append((modus, beste))
+    finally:
+        shutil.rmtree(uploadmap, ignore_errors=True)
+
+    print(f"\nBinnen de norm (p95 <= {args.max_p95:.0f} ms, fouten <= {args.max_fouten:.0%}):")
+    for modus, beste in samenvattingen:
+        if beste:
+            print(f"  {modus:<12} {beste[0]:>5} verbindingen in {beste[1]:.0f} MB = {beste[2]:.0f} verbindingen per GB")
+        else:
+            print(f"  {modus:<12} haalt de norm bij geen enkele stap")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+# Categoriepagina's uit product_overzicht (migraties/0008) tegenover de live join
+# over producten, categorieen, product_kleuren en afbeelding_taken die er vóór
+# stond, op dezelfde synthetische catalogus als benchmarks/catalogus.py. Meet
+# de query zelf (zonder cache en rendering), plus wat de triggers kosten bij het
+# schrijven. Net als catalogus.py maakt dit BENCH_DATABASE_URL leeg.
+#
+#   BENCH_DATABASE_URL=postgresql:///liesbet_bench python benchmarks/product_overzicht.py \
+#       [--producten 10000] [--kleuren 3] [--herhalingen 200]
+import argparse
+import io
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+import catalogus
+from catalogus import app
+
+PER_PAGINA = 24
+
+LIVE_JOIN = f"""
+    SELECT p.*, c.naam AS categorie_naam,
+           k.kleuren
+    FROM producten p
+    JOIN categorieen c ON p.categorie_id = c.id
+    JOIN LATERAL (
+        SELECT json_agg(pk ORDER BY pk.id) AS kleuren
+        FROM product_kleuren pk
+        WHERE pk.product_id = p.id AND {app.KLEUR_KLAAR_SQL}
+    ) k ON k.kleuren IS NOT NULL
+    WHERE {{voorwaarden}}
+    ORDER BY p.gemaakt_op DESC, p.id DESC
+    {{limiet}}
+"""
+
+
+def live_join(cursor, categorie_id=None, zoekterm=None, na=None, limiet=None, ids=None):
+    # De oude get_producten_met_kleuren
+    voorwaarden, parameters = ["TRUE"], []
+    if categorie_id is not None:
+        voorwaarden.append("p.categorie_id = %s")
+        parameters.append(categorie_id)
+    if ids is not None:
+        voorwaarden.append("p.id = ANY(%s)")
+        parameters.append(list(ids))
+    if zoekterm:
+        voorwaarden.append("p.naam ILIKE %s")
+        parameters.append(f"%{app.escape_like(zoekterm)}%")
+    if na:
+        voorwaarden.append("(p.gemaakt_op, p.id) < (%s, %s)")
+        parameters.extend(na)
+    limiet_sql = ""
+    if limiet:
+        limiet_sql = "LIMIT %s"
+        parameters.append(limiet + 1)
+    cursor.execute(LIVE_JOIN.format(voorwaarden=' AND '.join(voorwaarden), limiet=limiet_sql), parameters)
+    return cursor.fetchall()
+
+
+def overzicht(cursor, **argumenten):
+    return app.get_producten_met_kleuren(cursor, **argumenten)[0]
+
+
+def meet(functie, cursor, argumenten_lijst):
+    tijden = []
+    for argumenten in argumenten_lijst:
+        start = time.perf_counter()
+        functie(cursor, **argumenten)
+        tijden.append(time.perf_counter() - start)
+        cursor.connection.rollback()
+    kwantielen = statistics.quantiles(tijden, n=100, method='inclusive')
+    return kwantielen[49] * 1000, kwantielen[94] * 1000
+
+
+def scenario_argumenten(cursor, rng, herhalingen):
+    cursor.execute("SELECT id FROM categorieen")
+    categorie_ids = [rij[0] for rij in cursor.fetchall()]
+    # Diepe pagina: de cursor van ongeveer het 1000e product in de categorie
+    cursor.execute("""
+        SELECT categorie_id, gemaakt_op, product_id FROM (
+            SELECT categorie_id, gemaakt_op, product_id,
+                   row_number() OVER (PARTITION BY categorie_id ORDER BY gemaakt_op DESC, product_id DESC) AS positie
+            FROM product_overzicht
+        ) o WHERE positie = LEAST(1000, (SELECT count(*) / 10 FROM product_overzicht))
+    """)
+    diep = [(categorie_id, (gemaakt_op.isoformat(), product_id)) for categorie_id, gemaakt_op, product_id in cursor.fetchall()]
+    cursor.execute("SELECT max(product_id) FROM product_overzicht")
+    hoogste = cursor.fetchone()[0]
+    cursor.connection.rollback()
+
+    scenarios = {'eerste pagina': [], 'diepe pagina': [], 'zoeken': [], 'ids': []}
+    for _ in range(herhalingen):
+        scenarios['eerste pagina'].append({'categorie_id': rng.choice(categorie_ids), 'limiet': PER_PAGINA})
+        categorie_id, na = rng.choice(diep)
+        scenarios['diepe pagina'].append({'categorie_id': categorie_id, 'na': na, 'limiet': PER_PAGINA})
+        scenarios['zoeken'].append({'categorie_id': rng.choice(categorie_ids), 'limiet': PER_PAGINA,
+                                    'zoekterm': rng.choice(catalogus.NAMEN).lower()})
+        scenarios['ids'].append({'ids': rng.sample(range(1, hoogste + 1), PER_PAGINA)})
+    return scenarios
+
+
+def meet_schrijven(cursor, rng, herhalingen):
+    # Prijs bijwerken en een kleur toevoegen, met en zonder de overzicht-triggers;
+    # alles in een transactie die wordt teruggedraaid
+    cursor.execute("SELECT max(id) FROM producten")
+    hoogste = cursor.fetchone()[0]
+    product_ids = [rng.randint(1, hoogste) for _ in range(herhalingen)]
+    resultaat = {}
+    for triggers in (False, True):
+        if not triggers:
+            cursor.execute("ALTER TABLE producten DISABLE TRIGGER producten_overzicht")
+            cursor.execute("ALTER TABLE product_kleuren DISABLE TRIGGER product_kleuren_overzicht")
+        start = time.perf_counter()
+        for product_id in product_ids:
+            cursor.execute("UPDATE producten SET prijs = prijs + 1 WHERE id = %s", (product_id,))
+        prijs = (time.perf_counter() - start) / herhalingen * 1000
+        start = time.perf_counter()
+        for product_id in product_ids:
+            cursor.execute("INSERT INTO product_kleuren (product_id, kleur_naam) VALUES (%s, 'extra')", (product_id,))
+        kleur = (time.perf_counter() - start) / herhalingen * 1000
+        cursor.connection.rollback()
+        resultaat[triggers] = (prijs, kleur)
+    return resultaat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--producten', type=int, default=10000)
+    parser.add_argument('--kleuren', type=int, default=3)
+    parser.add_argument('--herhalingen', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    uploadmap = tempfile.mkdtemp(prefix='bench-uploads-')
+    app.app.config['UPLOAD_FOLDER'] = uploadmap
+    foto = app.maak_afgeleiden(io.BytesIO(catalogus.maak_foto(400, 300)))
+    foto.pop('nieuw')
+    shutil.rmtree(uploadmap, ignore_errors=True)
+    start = time.perf_counter()
+    catalogus.vul_database(args.producten, args.kleuren, foto, rng)
+    print(f"{args.producten} producten met {args.kleuren} kleuren gevuld in {time.perf_counter() - start:.1f} s "
+          f"(inclusief het bijhouden van product_overzicht)")
+
+    conn = app.psycopg2.connect(app.DATABASE_URL, connection_factory=app.GemetenConnection,
+                                cursor_factory=app.GemetenCursor)
+    cursor = conn.cursor()
+    scenarios = scenario_argumenten(cursor, rng, args.herhalingen)
+
+    print(f"{'scenario':<16} {'live p50':>9} {'live p95':>9} {'overzicht p50':>14} {'overzicht p95':>14} {'versnelling':>12}")
+    for naam, argumenten_lijst in scenarios.items():
+        # Eén keer vooraf, zodat beide varianten met warme buffers beginnen
+        live_join(cursor, **argumenten_lijst[0])
+        overzicht(cursor, **argumenten_lijst[0])
+        conn.rollback()
+        live_p50, live_p95 = meet(live_join, cursor, argumenten_lijst)
+        overzicht_p50, overzicht_p95 = meet(overzicht, cursor, argumenten_lijst)
+        print(f"{naam:<16} {live_p50:>9.2f} {live_p95:>9.2f} {overzicht_p50:>14.2f} {overzicht_p95:>14.2f} "
+              f"{live_p50 / overzicht_p50:>11.1f}x")
+
+    schrijven = meet_schrijven(cursor, rng, args.herhalingen)
+    print(f"\n{'schrijven (ms)':<16} {'zonder triggers':>16} {'met triggers':>13}")
+    for i, naam in enumerate(('prijs bijwerken', 'kleur toevoegen')):
+        print(f"{naam:<16} {schrijven[False][i]:>16.2f} {schrijven[True][i]:>13.2f}")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+-- Basisschema van de webshop. IF NOT EXISTS, zodat een bestaande database
+-- (van vóór de migraties) deze versie zonder wijzigingen overneemt.
+
+CREATE TABLE IF NOT EXISTS categorieen (
+    id   serial PRIMARY KEY,
+    naam text NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS producten (
+    id           serial PRIMARY KEY,
+    naam         text NOT NULL,
+    beschrijving text,
+    prijs        numeric(10, 2) NOT NULL,
+    categorie_id integer NOT NULL REFERENCES categorieen (id),
+    gemaakt_op   timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS product_kleuren (
+    id         serial PRIMARY KEY,
+    product_id integer NOT NULL REFERENCES producten (id) ON DELETE CASCADE,
+    kleur_naam text NOT NULL,
+    foto       text,
+    hover_foto text
+);
+
+CREATE TABLE IF NOT EXISTS gebruikers (
+    id              serial PRIMARY KEY,
+    gebruikersnaam  text NOT NULL UNIQUE,
+    wachtwoord_hash text NOT NULL
+);
@@ -0,0 +1,14 @@
+-- Meldt wijzigingen in categorieen aan alle workers, zodat hun categorie-register
+-- (zie laad_categorieen in app.py) direct opnieuw wordt geladen.
+
+CREATE OR REPLACE FUNCTION categorieen_notify_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('categorieen_gewijzigd', '');
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS categorieen_notify ON categorieen;
+CREATE TRIGGER categorieen_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON categorieen
+    FOR EACH STATEMENT EXECUTE FUNCTION categorieen_notify_trigger();
@@ -0,0 +1,49 @@
+-- Zoeken en pagineren op /producten/<categorie>, /zoeken en /api/zoeken.
+-- De indexen staan in 0004 (CONCURRENTLY kan niet in een transactie).
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Full-text zoeken over alle categorieën (/zoeken en /api/zoeken).
+-- zoek_vector bevat naam (gewicht A), kleurnamen (B) en beschrijving (C) met
+-- Nederlandse stemming en wordt door triggers actueel gehouden.
+
+ALTER TABLE producten ADD COLUMN IF NOT EXISTS zoek_vector tsvector;
+
+CREATE OR REPLACE FUNCTION bereken_zoek_vector(p_naam text, p_beschrijving text, p_product_id integer)
+RETURNS tsvector LANGUAGE sql STABLE AS $$
+    SELECT setweight(to_tsvector('dutch', coalesce(p_naam, '')), 'A')
+        || setweight(to_tsvector('dutch', coalesce((SELECT string_agg(kleur_naam, ' ')
+                                                    FROM product_kleuren
+                                                    WHERE product_id = p_product_id), '')), 'B')
+        || setweight(to_tsvector('dutch', coalesce(p_beschrijving, '')), 'C')
+$$;
+
+CREATE OR REPLACE FUNCTION producten_zoek_vector_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.zoek_vector := bereken_zoek_vector(NEW.naam, NEW.beschrijving, NEW.id);
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS producten_zoek_vector ON producten;
+CREATE TRIGGER producten_zoek_vector
+    BEFORE INSERT OR UPDATE OF naam, beschrijving ON producten
+    FOR EACH ROW EXECUTE FUNCTION producten_zoek_vector_trigger();
+
+CREATE OR REPLACE FUNCTION product_kleuren_zoek_vector_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    v_product_id integer := CASE WHEN TG_OP = 'DELETE' THEN OLD.product_id ELSE NEW.product_id END;
+BEGIN
+    UPDATE producten
+    SET zoek_vector = bereken_zoek_vector(naam, beschrijving, id)
+    WHERE id = v_product_id;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS product_kleuren_zoek_vector ON product_kleuren;
+CREATE TRIGGER product_kleuren_zoek_vector
+    AFTER INSERT OR UPDATE OF kleur_naam OR DELETE ON product_kleuren
+    FOR EACH ROW EXECUTE FUNCTION product_kleuren_zoek_vector_trigger();
+
+UPDATE producten SET zoek_vector = bereken_zoek_vector(naam, beschrijving, id);
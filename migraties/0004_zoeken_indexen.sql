@@ -0,0 +1,19 @@
+-- migreer: zonder transactie
+-- Indexen voor de catalogus- en zoekqueries; CONCURRENTLY zodat een bestaande
+-- database tijdens het aanmaken beschrijfbaar blijft.
+
+-- Trigram-index zodat "naam ILIKE '%term%'" geen sequentiële scan meer is
+CREATE INDEX CONCURRENTLY IF NOT EXISTS producten_naam_trgm_idx
+    ON producten USING gin (naam gin_trgm_ops);
+
+-- Keyset-paginering binnen een categorie op (gemaakt_op DESC, id DESC)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS producten_categorie_gemaakt_op_idx
+    ON producten (categorie_id, gemaakt_op DESC, id DESC);
+
+-- Kleuren per product: de lateral join in de overzichten en de zoek_vector-trigger
+-- (die bij elke kleurrij opnieuw de kleurnamen van het product ophaalt)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS product_kleuren_product_id_idx
+    ON product_kleuren (product_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS producten_zoek_vector_idx
+    ON producten USING gin (zoek_vector);
@@ -0,0 +1,10 @@
+-- Manifest van de responsive afgeleiden per foto (zie save_image in app.py):
+-- {"bestand": "<basis>.jpg", "basis": "<basis>", "formaten": [...], "breedtes": {"<label>": <px>}}
+
+ALTER TABLE product_kleuren ADD COLUMN IF NOT EXISTS foto_varianten jsonb;
+ALTER TABLE product_kleuren ADD COLUMN IF NOT EXISTS hover_foto_varianten jsonb;
+
+-- Foto's zijn content-addressed (<ab>/<cd>/<hash>.jpg) en kunnen door meerdere
+-- kleurvarianten gedeeld worden; opruimen telt de verwijzingen via deze indexen.
+CREATE INDEX IF NOT EXISTS product_kleuren_foto_idx ON product_kleuren (foto);
+CREATE INDEX IF NOT EXISTS product_kleuren_hover_foto_idx ON product_kleuren (hover_foto);
@@ -0,0 +1,21 @@
+-- Wachtrij voor asynchrone beeldverwerking (AFBEELDINGEN_ASYNC=1, "flask verwerk-afbeeldingen")
+
+CREATE TABLE IF NOT EXISTS afbeelding_taken (
+    id            serial PRIMARY KEY,
+    product_id    integer NOT NULL REFERENCES producten (id) ON DELETE CASCADE,
+    bron          text NOT NULL,              -- ruwe upload in RUWE_UPLOAD_FOLDER
+    bestand       text NOT NULL,              -- <basis>.jpg na verwerking
+    vervangt      text,                       -- foto die zichtbaar blijft tot deze taak klaar is
+    status        text NOT NULL DEFAULT 'wachtend'
+                  CHECK (status IN ('wachtend', 'bezig', 'klaar', 'mislukt')),
+    pogingen      integer NOT NULL DEFAULT 0,
+    foutmelding   text,
+    aangemaakt_op timestamptz NOT NULL DEFAULT now(),
+    bijgewerkt_op timestamptz NOT NULL DEFAULT now()
+);
+
+-- Klein houden: alleen openstaande taken worden geïndexeerd
+CREATE INDEX IF NOT EXISTS afbeelding_taken_open_idx
+    ON afbeelding_taken (product_id, bestand) WHERE status <> 'klaar';
+CREATE INDEX IF NOT EXISTS afbeelding_taken_wachtrij_idx
+    ON afbeelding_taken (id) WHERE status IN ('wachtend', 'bezig');
@@ -0,0 +1,31 @@
+-- Categorienamen zijn hoofdletterongevoelig uniek: zoek_categorie zoekt ze op
+-- met casefold en /producten/<categorie> mag maar één categorie opleveren.
+CREATE UNIQUE INDEX IF NOT EXISTS categorieen_naam_uniek_idx ON categorieen (lower(naam));
+
+-- Kleurvarianten verdwijnen met hun product, zodat product_verwijderen één
+-- DELETE is. Databases van vóór 0001 hebben de foreign key zonder CASCADE (en
+-- mogelijk onder een andere naam): die worden vervangen.
+DO $$
+DECLARE
+    v_constraint text;
+BEGIN
+    FOR v_constraint IN
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = 'product_kleuren'::regclass
+          AND confrelid = 'producten'::regclass
+          AND contype = 'f'
+          AND confdeltype <> 'c'
+    LOOP
+        EXECUTE format('ALTER TABLE product_kleuren DROP CONSTRAINT %I', v_constraint);
+    END LOOP;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'product_kleuren'::regclass AND confrelid = 'producten'::regclass AND contype = 'f'
+    ) THEN
+        ALTER TABLE product_kleuren
+            ADD CONSTRAINT product_kleuren_product_id_fkey
+            FOREIGN KEY (product_id) REFERENCES producten (id) ON DELETE CASCADE;
+    END IF;
+END
+$$;
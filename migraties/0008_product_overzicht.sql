@@ -0,0 +1,118 @@
+-- Overzicht per product voor de categoriepagina's en /api/producten (zie
+-- get_producten_met_kleuren in app.py): naam, prijs, categorie en de zichtbare
+-- kleurvarianten als JSON in één rij, zodat een pagina één range scan op de
+-- index is in plaats van een join met categorieen en een lateral join over
+-- product_kleuren en afbeelding_taken.
+--
+-- Triggers houden de tabel per product bij. Een product zonder zichtbare
+-- kleurvariant (alle foto's nog in verwerking, zie KLEUR_KLAAR_SQL) staat er
+-- niet in, net als in de oude join.
+
+CREATE TABLE IF NOT EXISTS product_overzicht (
+    product_id     integer PRIMARY KEY,
+    naam           text NOT NULL,
+    beschrijving   text,
+    prijs          numeric(10, 2) NOT NULL,
+    categorie_id   integer NOT NULL,
+    categorie_naam text NOT NULL,
+    gemaakt_op     timestamptz NOT NULL,
+    kleuren        jsonb NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION ververs_product_overzicht(p_product_id integer) RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO product_overzicht
+        (product_id, naam, beschrijving, prijs, categorie_id, categorie_naam, gemaakt_op, kleuren)
+    SELECT p.id, p.naam, p.beschrijving, p.prijs, p.categorie_id, c.naam, p.gemaakt_op, k.kleuren
+    FROM producten p
+    JOIN categorieen c ON c.id = p.categorie_id
+    JOIN LATERAL (
+        SELECT jsonb_agg(to_jsonb(pk) ORDER BY pk.id) AS kleuren
+        FROM product_kleuren pk
+        WHERE pk.product_id = p.id AND NOT EXISTS (
+            SELECT 1 FROM afbeelding_taken t
+            WHERE t.status <> 'klaar' AND t.product_id = pk.product_id AND t.bestand IN (pk.foto, pk.hover_foto)
+        )
+    ) k ON k.kleuren IS NOT NULL
+    WHERE p.id = p_product_id
+    ON CONFLICT (product_id) DO UPDATE SET
+        naam = EXCLUDED.naam,
+        beschrijving = EXCLUDED.beschrijving,
+        prijs = EXCLUDED.prijs,
+        categorie_id = EXCLUDED.categorie_id,
+        categorie_naam = EXCLUDED.categorie_naam,
+        gemaakt_op = EXCLUDED.gemaakt_op,
+        kleuren = EXCLUDED.kleuren;
+
+    IF NOT FOUND THEN
+        DELETE FROM product_overzicht WHERE product_id = p_product_id;
+    END IF;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION producten_overzicht_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM ververs_product_overzicht(OLD.id);
+    END IF;
+    IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.id <> OLD.id) THEN
+        PERFORM ververs_product_overzicht(NEW.id);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+-- Voor product_kleuren en afbeelding_taken (allebei met een kolom product_id)
+CREATE OR REPLACE FUNCTION product_onderdeel_overzicht_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM ververs_product_overzicht(OLD.product_id);
+    END IF;
+    IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.product_id <> OLD.product_id) THEN
+        PERFORM ververs_product_overzicht(NEW.product_id);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION categorieen_overzicht_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE product_overzicht SET categorie_naam = NEW.naam WHERE categorie_id = NEW.id;
+    RETURN NULL;
+END
+$$;
+
+-- Alleen de kolommen die in het overzicht staan: de zoek_vector-trigger werkt
+-- producten bij na elke kleurwijziging en hoeft het overzicht niet nog eens te verversen
+DROP TRIGGER IF EXISTS producten_overzicht ON producten;
+CREATE TRIGGER producten_overzicht
+    AFTER INSERT OR DELETE OR UPDATE OF id, naam, beschrijving, prijs, categorie_id, gemaakt_op ON producten
+    FOR EACH ROW EXECUTE FUNCTION producten_overzicht_trigger();
+
+DROP TRIGGER IF EXISTS product_kleuren_overzicht ON product_kleuren;
+CREATE TRIGGER product_kleuren_overzicht
+    AFTER INSERT OR UPDATE OR DELETE ON product_kleuren
+    FOR EACH ROW EXECUTE FUNCTION product_onderdeel_overzicht_trigger();
+
+-- Een taak bepaalt of een kleurvariant al zichtbaar is; claimen (wachtend -> bezig)
+-- verandert daar niets aan, maar is goedkoop genoeg om niet apart te behandelen
+DROP TRIGGER IF EXISTS afbeelding_taken_overzicht ON afbeelding_taken;
+CREATE TRIGGER afbeelding_taken_overzicht
+    AFTER INSERT OR DELETE OR UPDATE OF product_id, bestand, status ON afbeelding_taken
+    FOR EACH ROW EXECUTE FUNCTION product_onderdeel_overzicht_trigger();
+
+DROP TRIGGER IF EXISTS categorieen_overzicht ON categorieen;
+CREATE TRIGGER categorieen_overzicht
+    AFTER UPDATE OF naam ON categorieen
+    FOR EACH ROW EXECUTE FUNCTION categorieen_overzicht_trigger();
+
+-- Keyset-paginering binnen een categorie: één range scan per pagina
+CREATE INDEX IF NOT EXISTS product_overzicht_categorie_idx
+    ON product_overzicht (categorie_id, gemaakt_op DESC, product_id DESC);
+
+-- Zoeken op naam binnen een categorie (zoals producten_naam_trgm_idx in 0004)
+CREATE INDEX IF NOT EXISTS product_overzicht_naam_trgm_idx
+    ON product_overzicht USING gin (naam gin_trgm_ops);
+
+SELECT ververs_product_overzicht(id) FROM producten;
+ANALYZE product_overzicht;
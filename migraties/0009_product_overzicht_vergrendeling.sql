@@ -0,0 +1,45 @@
+-- ververs_product_overzicht (0008) bouwt de rij uit de snapshot van zijn eigen
+-- statement. Verversen twee transacties tegelijk hetzelfde product (twee
+-- "flask verwerk-afbeeldingen"-workers die taken van één product afronden, of
+-- een taak die klaar is tijdens een bewerking in het beheer), dan overschrijft
+-- de laatste commit de rij met kleuren zonder de rijen van de andere. Daarom
+-- eerst een transactie-advisory lock per product: de tweede wacht tot de eerste
+-- gecommit is en aggregeert dan opnieuw.
+
+CREATE OR REPLACE FUNCTION ververs_product_overzicht(p_product_id integer) RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    -- Eén verversing per product tegelijk; het INSERT ... SELECT hieronder krijgt
+    -- daarna een nieuwe snapshot en ziet dus wat de vorige heeft gecommit
+    PERFORM pg_advisory_xact_lock(hashtext('product_overzicht'), p_product_id);
+
+    INSERT INTO product_overzicht
+        (product_id, naam, beschrijving, prijs, categorie_id, categorie_naam, gemaakt_op, kleuren)
+    SELECT p.id, p.naam, p.beschrijving, p.prijs, p.categorie_id, c.naam, p.gemaakt_op, k.kleuren
+    FROM producten p
+    JOIN categorieen c ON c.id = p.categorie_id
+    JOIN LATERAL (
+        SELECT jsonb_agg(to_jsonb(pk) ORDER BY pk.id) AS kleuren
+        FROM product_kleuren pk
+        WHERE pk.product_id = p.id AND NOT EXISTS (
+            SELECT 1 FROM afbeelding_taken t
+            WHERE t.status <> 'klaar' AND t.product_id = pk.product_id AND t.bestand IN (pk.foto, pk.hover_foto)
+        )
+    ) k ON k.kleuren IS NOT NULL
+    WHERE p.id = p_product_id
+    ON CONFLICT (product_id) DO UPDATE SET
+        naam = EXCLUDED.naam,
+        beschrijving = EXCLUDED.beschrijving,
+        prijs = EXCLUDED.prijs,
+        categorie_id = EXCLUDED.categorie_id,
+        categorie_naam = EXCLUDED.categorie_naam,
+        gemaakt_op = EXCLUDED.gemaakt_op,
+        kleuren = EXCLUDED.kleuren;
+
+    IF NOT FOUND THEN
+        DELETE FROM product_overzicht WHERE product_id = p_product_id;
+    END IF;
+END
+$$;
+
+-- Rijen die al door de race scheef kunnen staan
+SELECT ververs_product_overzicht(id) FROM producten;
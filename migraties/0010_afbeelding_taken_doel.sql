@@ -0,0 +1,13 @@
+-- Een afgeronde taak schreef zijn foto in elke kleurrij van het product waarvan
+-- foto of hover_foto gelijk was aan "vervangt". Dezelfde (content-addressed)
+-- foto kan in meerdere kleuren of in beide kolommen staan, en dan werden ook
+-- cellen overschreven die niet vervangen waren. Daarom onthoudt de taak nu
+-- precies welke cel hij vult. Taken van vóór deze migratie (kleur_id NULL)
+-- worden nog op de oude manier afgerond.
+ALTER TABLE afbeelding_taken
+    ADD COLUMN IF NOT EXISTS kleur_id integer REFERENCES product_kleuren (id) ON DELETE CASCADE,
+    ADD COLUMN IF NOT EXISTS kolom    text CHECK (kolom IN ('foto', 'hover_foto'));
+
+-- Voor de cascade bij het verwijderen van een kleurvariant
+CREATE INDEX IF NOT EXISTS afbeelding_taken_kleur_id_idx
+    ON afbeelding_taken (kleur_id) WHERE kleur_id IS NOT NULL;
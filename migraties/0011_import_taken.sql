@@ -0,0 +1,20 @@
+-- Wachtrij voor bulkimports uit het beheer ("flask verwerk-imports"). Een grote
+-- import duurt langer dan de gunicorn-timeout, dus het request zet de CSV en de
+-- ZIP alleen klaar in IMPORT_FOLDER en de worker doet de rest.
+
+CREATE TABLE IF NOT EXISTS import_taken (
+    id            serial PRIMARY KEY,
+    manifest      text NOT NULL,              -- CSV in IMPORT_FOLDER
+    fotos         text NOT NULL,              -- ZIP in IMPORT_FOLDER
+    status        text NOT NULL DEFAULT 'wachtend'
+                  CHECK (status IN ('wachtend', 'bezig', 'klaar', 'mislukt')),
+    producten     integer NOT NULL DEFAULT 0,
+    kleuren       integer NOT NULL DEFAULT 0,
+    fouten        jsonb NOT NULL DEFAULT '[]', -- [[regel, melding], ...]
+    foutmelding   text,
+    aangemaakt_op timestamptz NOT NULL DEFAULT now(),
+    bijgewerkt_op timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS import_taken_wachtrij_idx
+    ON import_taken (id) WHERE status = 'wachtend';
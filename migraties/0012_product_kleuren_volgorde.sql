@@ -0,0 +1,47 @@
+-- Volgorde van de kleurvarianten zoals in het bewerkformulier. Sinds
+-- werk_kleuren_bij de ids behoudt, viel die niet meer samen met de volgorde
+-- van de ids. Bestaande rijen houden hun huidige volgorde (op id).
+ALTER TABLE product_kleuren ADD COLUMN IF NOT EXISTS volgorde integer NOT NULL DEFAULT 0;
+
+UPDATE product_kleuren pk SET volgorde = r.volgorde
+FROM (
+    SELECT id, row_number() OVER (PARTITION BY product_id ORDER BY id) - 1 AS volgorde
+    FROM product_kleuren
+) r
+WHERE r.id = pk.id AND pk.volgorde <> r.volgorde;
+
+CREATE OR REPLACE FUNCTION ververs_product_overzicht(p_product_id integer) RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    -- Eén verversing per product tegelijk (zie 0009)
+    PERFORM pg_advisory_xact_lock(hashtext('product_overzicht'), p_product_id);
+
+    INSERT INTO product_overzicht
+        (product_id, naam, beschrijving, prijs, categorie_id, categorie_naam, gemaakt_op, kleuren)
+    SELECT p.id, p.naam, p.beschrijving, p.prijs, p.categorie_id, c.naam, p.gemaakt_op, k.kleuren
+    FROM producten p
+    JOIN categorieen c ON c.id = p.categorie_id
+    JOIN LATERAL (
+        SELECT jsonb_agg(to_jsonb(pk) ORDER BY pk.volgorde, pk.id) AS kleuren
+        FROM product_kleuren pk
+        WHERE pk.product_id = p.id AND NOT EXISTS (
+            SELECT 1 FROM afbeelding_taken t
+            WHERE t.status <> 'klaar' AND t.product_id = pk.product_id AND t.bestand IN (pk.foto, pk.hover_foto)
+        )
+    ) k ON k.kleuren IS NOT NULL
+    WHERE p.id = p_product_id
+    ON CONFLICT (product_id) DO UPDATE SET
+        naam = EXCLUDED.naam,
+        beschrijving = EXCLUDED.beschrijving,
+        prijs = EXCLUDED.prijs,
+        categorie_id = EXCLUDED.categorie_id,
+        categorie_naam = EXCLUDED.categorie_naam,
+        gemaakt_op = EXCLUDED.gemaakt_op,
+        kleuren = EXCLUDED.kleuren;
+
+    IF NOT FOUND THEN
+        DELETE FROM product_overzicht WHERE product_id = p_product_id;
+    END IF;
+END
+$$;
+
+SELECT ververs_product_overzicht(id) FROM producten;
@@ -0,0 +1,35 @@
+-- Rijtriggers (0008) vuren niet bij TRUNCATE: na "TRUNCATE producten ..." bleef
+-- product_overzicht staan, en met RESTART IDENTITY kwamen die rijen bij nieuwe
+-- producten met dezelfde ids terecht. Daarom per statement het overzicht opnieuw
+-- opbouwen uit wat er nog is (na een TRUNCATE van producten is dat niets).
+CREATE OR REPLACE FUNCTION herbouw_product_overzicht_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    TRUNCATE product_overzicht;
+    PERFORM ververs_product_overzicht(id) FROM producten;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS producten_overzicht_truncate ON producten;
+CREATE TRIGGER producten_overzicht_truncate
+    AFTER TRUNCATE ON producten
+    FOR EACH STATEMENT EXECUTE FUNCTION herbouw_product_overzicht_trigger();
+
+DROP TRIGGER IF EXISTS categorieen_overzicht_truncate ON categorieen;
+CREATE TRIGGER categorieen_overzicht_truncate
+    AFTER TRUNCATE ON categorieen
+    FOR EACH STATEMENT EXECUTE FUNCTION herbouw_product_overzicht_trigger();
+
+DROP TRIGGER IF EXISTS product_kleuren_overzicht_truncate ON product_kleuren;
+CREATE TRIGGER product_kleuren_overzicht_truncate
+    AFTER TRUNCATE ON product_kleuren
+    FOR EACH STATEMENT EXECUTE FUNCTION herbouw_product_overzicht_trigger();
+
+DROP TRIGGER IF EXISTS afbeelding_taken_overzicht_truncate ON afbeelding_taken;
+CREATE TRIGGER afbeelding_taken_overzicht_truncate
+    AFTER TRUNCATE ON afbeelding_taken
+    FOR EACH STATEMENT EXECUTE FUNCTION herbouw_product_overzicht_trigger();
+
+-- Wat een eerdere TRUNCATE heeft laten staan
+DELETE FROM product_overzicht o WHERE NOT EXISTS (SELECT 1 FROM producten p WHERE p.id = o.product_id);
+SELECT ververs_product_overzicht(id) FROM producten;
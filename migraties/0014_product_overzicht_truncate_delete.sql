@@ -0,0 +1,11 @@
+-- De TRUNCATE-trigger uit 0013 mislukte als product_overzicht in hetzelfde
+-- statement werd geleegd ("TRUNCATE product_overzicht, producten ..."): een
+-- tabel die het statement zelf gebruikt, kan niet nog eens getruncate worden.
+-- DELETE werkt in beide gevallen en de tabel is na zo'n TRUNCATE toch klein.
+CREATE OR REPLACE FUNCTION herbouw_product_overzicht_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM product_overzicht;
+    PERFORM ververs_product_overzicht(id) FROM producten;
+    RETURN NULL;
+END
+$$;
@@ -0,0 +1,73 @@
+# De tests draaien tegen een echte PostgreSQL in TEST_DATABASE_URL. Die database
+# wordt gemigreerd en per test LEEGGEMAAKT; gebruik er een aparte voor.
+#
+#   TEST_DATABASE_URL=postgresql:///liesbet_test python -m pytest tests
+import io
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+if os.environ.get('TEST_DATABASE_URL'):
+    os.environ['DATABASE_URL'] = os.environ['TEST_DATABASE_URL']
+    os.environ['SERVER_TIMING'] = '1'
+    os.environ.setdefault('AFBEELDINGEN_ASYNC', '0')
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def pytest_collection_modifyitems(config, items):
+    if not os.environ.get('TEST_DATABASE_URL'):
+        overslaan = pytest.mark.skip(reason='TEST_DATABASE_URL is niet gezet')
+        for item in items:
+            item.add_marker(overslaan)
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app
+    resultaat = app.app.test_cli_runner().invoke(args=['migreer'])
+    assert resultaat.exit_code == 0, resultaat.output
+    return app
+
+
+@pytest.fixture
+def db(app_module, tmp_path):
+    # Lege tabellen (ook de door triggers bijgehouden product_overzicht), lege
+    # caches en een eigen upload- en importmap per test
+    app_module.app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+    app_module.app.config['RUWE_UPLOAD_FOLDER'] = str(tmp_path / 'ruw')
+    app_module.app.config['IMPORT_FOLDER'] = str(tmp_path / 'imports')
+    with app_module.db_verbinding() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            TRUNCATE product_overzicht, product_kleuren, afbeelding_taken, import_taken, producten, categorieen
+            RESTART IDENTITY CASCADE
+            """
+        )
+        cursor.execute("SELECT count(*) FROM product_overzicht")
+        assert cursor.fetchone()[0] == 0
+        conn.commit()
+    app_module.catalogus_cache.clear()
+    app_module.pagina_cache.clear()
+    app_module.laad_categorieen(forceer=True)
+    yield app_module
+    app_module.catalogus_cache.clear()
+    app_module.pagina_cache.clear()
+
+
+@pytest.fixture
+def beheer_client(app_module):
+    client = app_module.app.test_client()
+    with client.session_transaction() as sessie:
+        sessie['ingelogd'] = True
+        sessie['gebruikersnaam'] = 'test'
+    return client
+
+
+def maak_foto(kleur, grootte=(120, 90)):
+    buffer = io.BytesIO()
+    Image.new('RGB', grootte, kleur).save(buffer, 'JPEG')
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,34 @@
+# Een invalidatie terwijl een view nog uit de database leest, mag niet worden
+# overschreven door het (verouderde) resultaat van die lezing.
+from test_producten_per_categorie import vul_categorie
+
+
+def test_set_met_oude_generatie_wordt_overgeslagen(app_module):
+    cache = app_module.LRUCache(10, 60)
+    generatie = cache.generatie
+    cache.invalideer(lambda sleutel: False)
+    cache.set('a', 1, generatie)
+    assert cache.get('a') is None
+    cache.set('a', 2, cache.generatie)
+    assert cache.get('a') == 2
+
+
+def test_invalidatie_tijdens_lezen_vult_caches_niet(db, monkeypatch):
+    vul_categorie(db, 3)
+    origineel = db.get_producten_met_kleuren
+
+    def lees_en_wijzig(cursor, categorie_id=None, **argumenten):
+        # Een andere worker commit een wijziging terwijl deze lezing loopt
+        resultaat = origineel(cursor, categorie_id, **argumenten)
+        db.invalideer_catalogus(0, [categorie_id])
+        return resultaat
+
+    monkeypatch.setattr(db, 'get_producten_met_kleuren', lees_en_wijzig)
+    assert db.app.test_client().get('/producten/Ringen').status_code == 200
+    assert db.catalogus_cache.stats()['items'] == 0
+    assert db.pagina_cache.stats()['items'] == 0
+
+    monkeypatch.setattr(db, 'get_producten_met_kleuren', origineel)
+    assert db.app.test_client().get('/producten/Ringen').status_code == 200
+    assert db.catalogus_cache.stats()['items'] == 1
+    assert db.pagina_cache.stats()['items'] == 1
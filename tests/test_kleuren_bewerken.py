@@ -0,0 +1,210 @@
+# werk_kleuren_bij vergelijkt het kleurformulier met de opgeslagen rijen en voert
+# alleen de nodige statements uit; lees_kleur_formulier levert de varianten aan.
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from conftest import maak_foto
+
+
+@pytest.fixture
+def product(db):
+    # Eén product met drie kleuren; goud en zilver delen hun hover-foto
+    with db.db_verbinding() as conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO categorieen (naam) VALUES ('Ringen') RETURNING id")
+        categorie_id = cursor.fetchone()[0]
+        cursor.execute(
+            "INSERT INTO producten (naam, beschrijving, prijs, categorie_id) VALUES ('Ring', '', 25, %s) RETURNING id",
+            (categorie_id,)
+        )
+        product_id = cursor.fetchone()[0]
+        kleur_ids = []
+        for volgorde, (kleur_naam, foto, hover_foto) in enumerate([('goud', 'goud.jpg', 'gedeeld.jpg'),
+                                                                   ('zilver', 'zilver.jpg', 'gedeeld.jpg'),
+                                                                   ('rosé', 'rose.jpg', 'rose_hover.jpg')]):
+            cursor.execute(
+                """
+                INSERT INTO product_kleuren (product_id, volgorde, kleur_naam, foto, hover_foto)
+                VALUES (%s, %s, %s, %s, %s) RETURNING id
+                """,
+                (product_id, volgorde, kleur_naam, foto, hover_foto)
+            )
+            kleur_ids.append(cursor.fetchone()[0])
+        conn.commit()
+    return product_id, kleur_ids
+
+
+def variant(kleur_id, kleur_naam, foto=None, hover_foto=None):
+    return {'id': kleur_id, 'kleur_naam': kleur_naam, 'foto': foto, 'hover_foto': hover_foto}
+
+
+def upload(kleur):
+    return FileStorage(maak_foto(kleur), filename=f'{kleur}.jpg')
+
+
+def werk_bij(app, product_id, varianten):
+    # Geeft het resultaat, de uitgevoerde statements (zonder de SELECT ... FOR
+    # UPDATE) en de rijen na afloop in weergavevolgorde terug
+    uitgevoerd = []
+
+    class OpnemendeCursor(app.GemetenCursor):
+        def execute(self, query, vars=None):
+            tekst = query.decode() if isinstance(query, bytes) else query
+            uitgevoerd.extend(deel.split(None, 1)[0].upper() for deel in tekst.split(';\n') if deel.strip())
+            return super().execute(query, vars)
+
+    with app.db_verbinding() as conn:
+        resultaat = app.werk_kleuren_bij(conn.cursor(cursor_factory=OpnemendeCursor), product_id, varianten)
+        conn.commit()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, kleur_naam, foto, hover_foto FROM product_kleuren WHERE product_id = %s ORDER BY volgorde, id",
+            (product_id,)
+        )
+        rijen = [tuple(rij) for rij in cursor.fetchall()]
+    assert uitgevoerd[0] == 'SELECT'
+    return resultaat, uitgevoerd[1:], rijen
+
+
+def test_ongewijzigd_voert_niets_uit(db, product):
+    product_id, (goud, zilver, rose) = product
+    resultaat, statements, rijen = werk_bij(db, product_id, [
+        variant(goud, 'goud'), variant(zilver, 'zilver'), variant(rose, 'rosé')
+    ])
+    assert statements == []
+    assert resultaat == set()
+    assert [rij[0] for rij in rijen] == [goud, zilver, rose]
+
+
+def test_volgorde_en_naam_wijzigen_behoudt_ids(db, product):
+    product_id, (goud, zilver, rose) = product
+    resultaat, statements, rijen = werk_bij(db, product_id, [
+        variant(rose, 'rosé'), variant(zilver, 'zilver mat'), variant(goud, 'goud')
+    ])
+    # rosé en goud wisselen van plaats, zilver krijgt een nieuwe naam
+    assert statements == ['UPDATE', 'UPDATE', 'UPDATE']
+    assert resultaat == set()
+    assert rijen == [(rose, 'rosé', 'rose.jpg', 'rose_hover.jpg'),
+                     (zilver, 'zilver mat', 'zilver.jpg', 'gedeeld.jpg'),
+                     (goud, 'goud', 'goud.jpg', 'gedeeld.jpg')]
+
+
+def test_alleen_volgorde_wijzigen(db, product):
+    product_id, (goud, zilver, rose) = product
+    resultaat, statements, rijen = werk_bij(db, product_id, [
+        variant(goud, 'goud'), variant(rose, 'rosé'), variant(zilver, 'zilver')
+    ])
+    assert statements == ['UPDATE', 'UPDATE']
+    assert [rij[0] for rij in rijen] == [goud, rose, zilver]
+
+
+def test_kleur_toevoegen(db, product):
+    product_id, (goud, zilver, rose) = product
+    resultaat, statements, rijen = werk_bij(db, product_id, [
+        variant(goud, 'goud'), variant(zilver, 'zilver'), variant(rose, 'rosé'),
+        variant(None, 'brons', upload('brown'), upload('black')),
+    ])
+    assert statements == ['INSERT']
+    assert resultaat == set()
+    assert [rij[0] for rij in rijen[:3]] == [goud, zilver, rose]
+    nieuw = rijen[3]
+    assert nieuw[0] > rose and nieuw[1] == 'brons'
+    assert nieuw[2] and nieuw[3] and nieuw[2] != nieuw[3]
+
+
+def test_kleur_verwijderen_geeft_ongebruikte_fotos(db, product):
+    product_id, (goud, zilver, rose) = product
+    resultaat, statements, rijen = werk_bij(db, product_id, [variant(goud, 'goud'), variant(rose, 'rosé')])
+    # rosé schuift een plaats op
+    assert statements == ['DELETE', 'UPDATE']
+    # De hover-foto van zilver wordt nog door goud gebruikt
+    assert resultaat == {'zilver.jpg'}
+    assert [rij[0] for rij in rijen] == [goud, rose]
+
+
+def test_foto_vervangen(db, product):
+    product_id, (goud, zilver, rose) = product
+    resultaat, statements, rijen = werk_bij(db, product_id, [
+        variant(goud, 'goud', hover_foto=upload('green')), variant(zilver, 'zilver'),
+        variant(rose, 'rosé', foto=upload('pink')),
+    ])
+    assert statements == ['UPDATE', 'UPDATE']
+    # gedeeld.jpg blijft bij zilver in gebruik
+    assert resultaat == {'rose.jpg'}
+    assert [rij[0] for rij in rijen] == [goud, zilver, rose]
+    assert rijen[0][2] == 'goud.jpg' and rijen[0][3] not in ('gedeeld.jpg', None)
+    assert rijen[1][2:] == ('zilver.jpg', 'gedeeld.jpg')
+    assert rijen[2][2] not in ('rose.jpg', None) and rijen[2][3] == 'rose_hover.jpg'
+
+
+def test_alles_tegelijk_in_een_round_trip(db, product):
+    product_id, (goud, zilver, rose) = product
+    resultaat, statements, rijen = werk_bij(db, product_id, [
+        variant(zilver, 'zilver', foto=upload('gray')), variant(None, 'brons', upload('brown'), upload('black')),
+        variant(goud, 'goud'),
+    ])
+    assert statements == ['DELETE', 'UPDATE', 'UPDATE', 'INSERT']
+    assert resultaat == {'zilver.jpg', 'rose.jpg', 'rose_hover.jpg'}
+    assert [rij[0] for rij in rijen[::2]] == [zilver, goud] and rijen[1][1] == 'brons'
+
+
+def test_onbekend_of_dubbel_id_wordt_nieuwe_kleur(db, product):
+    product_id, (goud, zilver, rose) = product
+    resultaat, statements, rijen = werk_bij(db, product_id, [
+        variant(goud, 'goud'), variant(goud, 'goud kopie', upload('yellow'), upload('orange')),
+        variant(zilver, 'zilver'), variant(rose, 'rosé'),
+    ])
+    assert statements == ['UPDATE', 'UPDATE', 'INSERT']
+    assert [rij[1] for rij in rijen] == ['goud', 'goud kopie', 'zilver', 'rosé']
+
+
+def test_lees_kleur_formulier(db):
+    data = {
+        'kleur_id[]': ['12', '', 'abc', ''],
+        'kleur_naam[]': ['goud', 'brons', 'zilver', '  '],
+        'kleur_foto[]': [(maak_foto('yellow'), ''), (maak_foto('brown'), 'brons.jpg'),
+                         (maak_foto('gray'), ''), (maak_foto('white'), 'leeg.jpg')],
+        'kleur_hover_foto[]': [(maak_foto('orange'), 'goud_hover.jpg')],
+    }
+    with db.app.test_request_context(method='POST', data=data, content_type='multipart/form-data'):
+        varianten = db.lees_kleur_formulier()
+
+    # Lege naam (de sjabloonrij) overgeslagen, ongeldig id wordt een nieuwe kleur,
+    # een leeg bestandsveld is geen upload
+    assert [(v['id'], v['kleur_naam']) for v in varianten] == [(12, 'goud'), (None, 'brons'), (None, 'zilver')]
+    assert varianten[0]['foto'] is None and varianten[0]['hover_foto'].filename == 'goud_hover.jpg'
+    assert varianten[1]['foto'].filename == 'brons.jpg' and varianten[1]['hover_foto'] is None
+    assert varianten[2]['foto'] is None and varianten[2]['hover_foto'] is None
+
+
+@pytest.mark.parametrize('foto, hover_foto', [(True, False), (False, True), (False, False)])
+def test_nieuwe_kleur_zonder_beide_fotos_geweigerd(db, product, foto, hover_foto):
+    product_id, (goud, zilver, rose) = product
+    with pytest.raises(ValueError):
+        werk_bij(db, product_id, [
+            variant(goud, 'goud'), variant(zilver, 'zilver'), variant(rose, 'rosé'),
+            variant(None, 'brons', upload('brown') if foto else None, upload('black') if hover_foto else None),
+        ])
+    with db.db_verbinding() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT count(*) FROM product_kleuren WHERE product_id = %s", (product_id,))
+        assert cursor.fetchone()[0] == 3
+
+
+def test_bewerken_met_onvolledige_nieuwe_kleur_wijzigt_niets(db, product, beheer_client):
+    product_id, (goud, zilver, rose) = product
+    response = beheer_client.post(f'/producten/bewerken/{product_id}', data={
+        'naam': 'Ring gewijzigd', 'beschrijving': 'x', 'prijs': '25', 'categorie_id': '1',
+        'kleur_id[]': [str(goud), str(zilver), str(rose), ''],
+        'kleur_naam[]': ['goud', 'zilver', 'rosé', 'brons'],
+        'kleur_foto[]': [(maak_foto('white'), ''), (maak_foto('white'), ''), (maak_foto('white'), ''),
+                         (maak_foto('brown'), 'brons.jpg')],
+        'kleur_hover_foto[]': [(maak_foto('white'), '') for _ in range(4)],
+    }, content_type='multipart/form-data')
+    assert response.status_code == 302 and response.headers['Location'].endswith(f'/producten/bewerken/{product_id}')
+    with db.db_verbinding() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT naam FROM producten WHERE id = %s", (product_id,))
+        assert cursor.fetchone()[0] == 'Ring'
+        cursor.execute("SELECT count(*) FROM product_kleuren WHERE product_id = %s", (product_id,))
+        assert cursor.fetchone()[0] == 3
@@ -0,0 +1,79 @@
+# De categoriepagina haalt producten en kleuren in een vast aantal queries op,
+# hoe groot de catalogus ook is: geen query per product of per kleur (N+1).
+import re
+
+from psycopg2.extras import Json, execute_values
+
+from conftest import maak_foto
+
+QUERIES_PATROON = re.compile(r'desc="(\d+) queries"')
+
+
+def vul_categorie(app, aantal, kleuren_per_product=3):
+    foto = app.maak_afgeleiden(maak_foto('gold'))
+    foto.pop('nieuw')
+    with app.db_verbinding() as conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO categorieen (naam) VALUES ('Ringen') ON CONFLICT DO NOTHING")
+        cursor.execute("SELECT id FROM categorieen WHERE naam = 'Ringen'")
+        categorie_id = cursor.fetchone()[0]
+        product_ids = execute_values(
+            cursor, "INSERT INTO producten (naam, beschrijving, prijs, categorie_id) VALUES %s RETURNING id",
+            [(f"Ring {i}", "Handgemaakt.", 25, categorie_id) for i in range(aantal)], fetch=True
+        )
+        execute_values(
+            cursor,
+            """
+            INSERT INTO product_kleuren
+                (product_id, kleur_naam, foto, hover_foto, foto_varianten, hover_foto_varianten)
+            VALUES %s
+            """,
+            [(product_id, f"kleur {k}", foto['bestand'], foto['bestand'], Json(foto), Json(foto))
+             for (product_id,) in product_ids for k in range(kleuren_per_product)]
+        )
+        conn.commit()
+    app.laad_categorieen(forceer=True)
+
+
+def aantal_kaarten(html):
+    return html.count('class="product-card ')
+
+
+def queries_voor_pagina(app, pad):
+    # Koud: zonder catalogus- en paginacache, anders telt alleen de cache-treffer
+    app.catalogus_cache.clear()
+    app.pagina_cache.clear()
+    response = app.app.test_client().get(pad)
+    assert response.status_code == 200
+    match = QUERIES_PATROON.search(response.headers.get('Server-Timing', ''))
+    assert match, response.headers.get('Server-Timing')
+    return int(match.group(1)), response.get_data(as_text=True)
+
+
+def test_aantal_queries_groeit_niet_met_catalogus(db):
+    aantal = 8
+    pad = f"/producten/Ringen?per_pagina={db.MAX_PRODUCTEN_PER_PAGINA}"
+
+    vul_categorie(db, aantal)
+    klein, html = queries_voor_pagina(db, pad)
+    assert aantal_kaarten(html) == aantal
+
+    # Tien keer zoveel producten, allemaal nog op dezelfde pagina
+    vul_categorie(db, 9 * aantal)
+    groot, html = queries_voor_pagina(db, pad)
+    assert aantal_kaarten(html) == 10 * aantal
+
+    assert groot == klein
+
+
+def test_volgende_pagina_zelfde_aantal_queries(db):
+    vul_categorie(db, 30)
+    eerste, html = queries_voor_pagina(db, "/producten/Ringen?per_pagina=10")
+    assert aantal_kaarten(html) == 10
+    with db.app.test_request_context():
+        cursor = db.get_db_connection().cursor()
+        _, volgende = db.get_producten_met_kleuren(cursor, db.zoek_categorie('Ringen')['id'], limiet=10)
+    assert volgende
+    tweede, html = queries_voor_pagina(db, f"/producten/Ringen?per_pagina=10&na={volgende}")
+    assert aantal_kaarten(html) == 10
+    assert tweede == eerste